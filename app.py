@@ -1,12 +1,58 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context
 from investment_master.core import InvestmentMaster
 from investment_master.scraper import ArticleScraper
+from investment_master.quote_refresher import QuoteRefresher
+from investment_master.enrichment import enrich_all, ENRICH_DEADLINE
+from investment_master.batch_valuation import MODELS as BATCH_MODELS, PR_UNDERVALUED, PR_OVERVALUED
+from investment_master.valuation_bands import BAND_WINDOWS
+from investment_master.rankings import RANKING_METRICS
+from investment_master.portfolio_summary import summarize_portfolio
+from investment_master.valuation_history import DailyValuationJob, SNAPSHOT_MODELS
+from concurrent.futures import ThreadPoolExecutor, wait
+from investment_master.monte_carlo import (
+    DEFAULT_PARAMS as MONTE_CARLO_PARAMS,
+    DEFAULT_PATHS as MONTE_CARLO_DEFAULT_PATHS,
+    MAX_PATHS as MONTE_CARLO_MAX_PATHS
+)
+import numpy as np
+import hashlib
+import math
+import os
+import threading
 import traceback
-import requests
+import time
+import json
 
 app = Flask(__name__)
 master = InvestmentMaster()
 
+# Background quote refresher: portfolio endpoints read from its in-memory snapshot
+quote_refresher = QuoteRefresher(
+    master.tracked_tickers,
+    valuator=master.valuator,
+    store=master.valuator.fundamentals.store,
+    provider=master.market_data,
+    revaluator=master.revaluator,
+    rankings=master.rankings
+)
+quote_refresher.start()
+
+# Once per trading day, persist every model's output for all tracked tickers
+valuation_job = DailyValuationJob(master.tracked_tickers, master.valuator, master.valuation_history)
+valuation_job.start()
+
+# Optional scheduled universe refresh (UNIVERSE_REFRESH_AT), resumes from its checkpoint
+master.universe_refresh.start()
+
+# SSE quote stream: heartbeat interval, and how long one connection is held
+# before the browser's EventSource reconnects (frees the worker thread)
+STREAM_HEARTBEAT = 15
+STREAM_MAX_DURATION = 300
+# Each open stream holds one worker thread (gunicorn --threads 8 in the Dockerfile);
+# cap streams per process so a few open tabs can't starve ordinary requests
+STREAM_MAX_CONNECTIONS = int(os.environ.get("STREAM_MAX_CONNECTIONS", 4))
+_stream_slots = threading.BoundedSemaphore(STREAM_MAX_CONNECTIONS)
+
 # Translation Dictionaries
 SECTOR_MAP = {
     "Financial Services": "金融服务",
@@ -36,115 +82,120 @@ INDUSTRY_MAP = {
     "Auto Manufacturers": "汽车制造"
 }
 
-def get_cn_stock_info(ticker):
+def get_cn_stock_info(ticker, quotes=None):
     """
     Fetch Chinese name from Sina Finance API for A-shares.
     Fallback to local portfolio.json data if API fails.
+    `quotes` is an optional batch already resolved by the quote refresher;
+    when given, no extra HTTP request is made for this ticker.
     """
-    cn_name = None
-    day_change_percent = 0.0
-    
-    # 1. Try Sina API first
-    try:
-        # Convert Ticker format: 600036.SS -> sh600036
-        sina_code = ""
-        if ticker.endswith('.SS'):
-            sina_code = "sh" + ticker.split('.')[0]
-        elif ticker.endswith('.SZ'):
-            sina_code = "sz" + ticker.split('.')[0]
-        
-        if sina_code:
-            url = f"http://hq.sinajs.cn/list={sina_code}"
-            headers = {'Referer': 'https://finance.sina.com.cn'}
-            response = requests.get(url, headers=headers, timeout=2) # Short timeout
-            
-            if response.status_code == 200:
-                content = response.text
-                # Format: var hq_str_sh600036="招商银行,open,pre_close,current,high,low,..."
-                if '="' in content:
-                    data_str = content.split('="')[1]
-                    data_parts = data_str.split(',')
-                    if len(data_parts) > 3:
-                        cn_name = data_parts[0]
-                        pre_close = float(data_parts[2])
-                        current = float(data_parts[3])
-                        if pre_close > 0:
-                            day_change_percent = (current - pre_close) / pre_close * 100
-                        
-                        return {
-                            "name": cn_name,
-                            "current_price": current,
-                            "pre_close": pre_close,
-                            "day_change_percent": day_change_percent
-                        }
-    except Exception as e:
-        print(f"Error fetching CN info for {ticker} from Sina: {e}")
+    # 1. Try Sina API first (served from the refresher snapshot when warm)
+    if quotes is None:
+        quotes = quote_refresher.get_quotes([ticker])
+    if ticker in quotes:
+        quote = quotes[ticker]
+        if quote.get('name'):
+            return quote
+        # yfinance fallback quotes (US/HK) carry no Sina name
+        return {**quote, "name": stored_name(ticker)}
 
     # 2. Fallback to local portfolio data
+    name = stored_name(ticker)
+    if name:
+        return {
+            "name": name,
+            # We can't get real-time price from local file, so return None for those
+            "current_price": None,
+            "pre_close": None,
+            "day_change_percent": None
+        }
+    return None
+
+def stored_name(ticker):
+    """
+    Name saved with a holding in portfolio.json, or None.
+    """
     try:
-        portfolio_data = master.portfolio_manager.load_data()
-        
-        # Check holdings
-        for h in portfolio_data.get('holdings', []):
-            if h.get('ticker') == ticker and h.get('name'):
-                return {
-                    "name": h['name'],
-                    # We can't get real-time price from local file, so return None for those
-                    "current_price": None, 
-                    "pre_close": None,
-                    "day_change_percent": None
-                }
-                
-        # Check watchlist
-        for w in portfolio_data.get('watchlist', []):
-            if w.get('ticker') == ticker and w.get('name'):
-                 return {
-                    "name": w['name'],
-                    "current_price": None,
-                    "pre_close": None,
-                    "day_change_percent": None
-                }
+        return master.portfolio.get_holding_name(ticker)
     except Exception as e:
         print(f"Error fetching CN info from local file: {e}")
-
     return None
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+# Query parameters that override model assumptions: name -> (model, keyword argument, type)
+MODEL_PARAM_ARGS = {
+    "tang_pe": ("tang", "rational_pe", float),
+    "tang_years": ("tang", "years", int),
+    "tang_haircut": ("tang", "leverage_haircut", float),
+    "pb_divisor": ("pb_roe", "divisor", float),
+    "pr_low": ("pr", "undervalued", float),
+    "pr_high": ("pr", "overvalued", float)
+}
+
+def parse_model_params(args):
+    """
+    Collect model overrides from the query string into {model: {kwarg: value}}.
+    Raises ValueError for malformed or out-of-range values.
+    """
+    params = {"tang": {}, "pb_roe": {}, "pr": {}}
+    for name, (model, kwarg, cast) in MODEL_PARAM_ARGS.items():
+        raw = args.get(name)
+        if raw is None or raw == '':
+            continue
+        value = cast(raw)
+        # nan/inf pass every comparison below and would end up in the JSON
+        if not math.isfinite(value) or value <= 0:
+            raise ValueError(f"{name} must be positive")
+        params[model][kwarg] = value
+
+    if params["tang"].get("leverage_haircut", 1) > 1:
+        raise ValueError("tang_haircut must be in (0, 1]")
+    if params["tang"].get("years", 1) > 30:
+        raise ValueError("tang_years must be <= 30")
+    pr = params["pr"]
+    if pr.get("undervalued", PR_UNDERVALUED) >= pr.get("overvalued", PR_OVERVALUED):
+        raise ValueError("pr_low must be below pr_high")
+    return params
+
 @app.route('/api/analyze/<ticker>')
 def analyze_stock(ticker):
+    """
+    Run every valuation model on one ticker.
+    Model assumptions can be overridden per request (see MODEL_PARAM_ARGS), e.g.
+    ?tang_pe=20&tang_years=5&pb_divisor=8&pr_low=0.5&pr_high=1.2
+    Results are memoized per (fundamentals snapshot, parameter set), so re-tuning never refetches data.
+    """
+    try:
+        model_params = parse_model_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter: {e}"}), 400
+
     try:
         # 1. Normalize Ticker
         normalized_ticker = master._normalize_ticker(ticker)
         
-        # 2. Get Basic Info & PE
-        pe_data = master.valuator.calculate_pe(normalized_ticker)
-        current_price = master.valuator.get_current_price(normalized_ticker)
-        
-        # 3. Valuation Models
-        # Need to pass 'info' if possible to save API calls, but calculate_pb_roe fetches it internally if not provided.
-        # Let's optimize slightly by fetching info once if we can, but for now let's stick to the methods.
-        
-        # We can try to get the 'info' dictionary from yfinance once to share, 
-        # but the current Valuator methods might not all accept it.
-        # calculate_pb_roe accepts info. calculate_pr accepts info.
-        
-        import yfinance as yf
-        stock = yf.Ticker(normalized_ticker)
+        # 2. Fetch the fundamentals snapshot once and share it across all models.
+        # On failure stop here: every model would otherwise retry the fetch itself
         try:
-            info = stock.info
-        except:
-            info = {}
+            info = master.valuator.get_info(normalized_ticker)
+        except Exception as e:
+            print(f"Error fetching info for {normalized_ticker}: {e}")
+            return jsonify({"error": f"Failed to fetch fundamentals for {normalized_ticker}: {e}"}), 502
 
-        pb_data = master.valuator.calculate_pb_roe(normalized_ticker, info=info)
-        pr_data = master.valuator.calculate_pr(normalized_ticker, info=info)
-        dcf_data = master.valuator.calculate_dcf(normalized_ticker) # Assuming signature
+        pe_data = master.valuator.calculate_pe(normalized_ticker, info=info)
+        current_price = master.valuator.get_current_price(normalized_ticker, info=info)
+        
+        # 3. Valuation Models
+        pb_data = master.valuator.calculate_pb_roe(normalized_ticker, info=info, **model_params["pb_roe"])
+        pr_data = master.valuator.calculate_pr(normalized_ticker, info=info, **model_params["pr"])
+        dcf_data = master.valuator.calculate_dcf(normalized_ticker, info=info)
         graham_data = master.valuator.calculate_graham(normalized_ticker, info=info)
         peg_data = master.valuator.calculate_peg(normalized_ticker, info=info)
         ddm_data = master.valuator.calculate_ddm(normalized_ticker, info=info)
-        tang_data = master.valuator.calculate_tang(normalized_ticker, info=info)
+        tang_data = master.valuator.calculate_tang(normalized_ticker, info=info, **model_params["tang"])
         
         # Determine Name and Translations
         cn_info = get_cn_stock_info(normalized_ticker)
@@ -172,7 +223,8 @@ def analyze_stock(ticker):
             "graham_data": graham_data,
             "peg_data": peg_data,
             "ddm_data": ddm_data,
-            "tang_data": tang_data
+            "tang_data": tang_data,
+            "parameters": model_params
         }
         
         return jsonify(result)
@@ -181,6 +233,269 @@ def analyze_stock(ticker):
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+DCF_SENSITIVITY_DEFAULTS = {
+    "wacc": "0.06:0.14:17",
+    "growth": "0:0.15:16",
+    "terminal_growth": "0:0.04:5"
+}
+# Upper bound on wacc x growth x terminal_growth cells per request
+DCF_SENSITIVITY_MAX_CELLS = 200000
+
+def parse_range(spec):
+    """
+    Parse either 'start:stop:num' (inclusive, evenly spaced) or a comma-separated list of values.
+    """
+    if ':' in spec:
+        start, stop, num = spec.split(':')
+        num = int(num)
+        if num < 1:
+            raise ValueError("num must be >= 1")
+        return [round(v, 6) for v in np.linspace(float(start), float(stop), num).tolist()]
+    return [float(v) for v in spec.split(',') if v.strip()]
+
+@app.route('/api/analyze/<ticker>/dcf_sensitivity')
+def dcf_sensitivity(ticker):
+    """
+    Fair value per share over a WACC x growth x terminal growth grid, for the heatmap.
+    Ranges: ?wacc=0.06:0.14:50&growth=0:0.15:50&terminal_growth=0,0.01,0.02&years=5
+    """
+    try:
+        ranges = {name: parse_range(request.args.get(name) or default)
+                  for name, default in DCF_SENSITIVITY_DEFAULTS.items()}
+        years = int(request.args.get('years', 5))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid range: {e}"}), 400
+
+    if not all(ranges.values()) or years < 1:
+        return jsonify({"error": "Ranges must not be empty and years must be >= 1"}), 400
+    cells = len(ranges["wacc"]) * len(ranges["growth"]) * len(ranges["terminal_growth"])
+    if cells > DCF_SENSITIVITY_MAX_CELLS:
+        return jsonify({"error": f"Grid too large ({cells} cells, max {DCF_SENSITIVITY_MAX_CELLS})"}), 400
+
+    normalized_ticker = master._normalize_ticker(ticker)
+    result = master.valuator.calculate_dcf_sensitivity(
+        normalized_ticker, ranges["wacc"], ranges["growth"], ranges["terminal_growth"], years=years
+    )
+    if "error" in result:
+        return jsonify(result), 404
+    return jsonify(result)
+
+@app.route('/api/analyze/<ticker>/dcf_monte_carlo')
+def dcf_monte_carlo(ticker):
+    """
+    Monte Carlo DCF: fair value percentiles and a histogram.
+    Optional: paths, seed, growth_mean, growth_sd, wacc_mean, wacc_sd, margin_sd, terminal_growth, years
+    """
+    try:
+        paths = min(int(request.args.get('paths', MONTE_CARLO_DEFAULT_PATHS)), MONTE_CARLO_MAX_PATHS)
+        seed = int(request.args.get('seed', 42))
+        params = {}
+        for name in MONTE_CARLO_PARAMS:
+            if request.args.get(name) is not None:
+                params[name] = int(request.args[name]) if name == 'years' else float(request.args[name])
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter: {e}"}), 400
+    if paths < 100 or params.get('years', 1) < 1:
+        return jsonify({"error": "paths must be >= 100 and years >= 1"}), 400
+
+    normalized_ticker = master._normalize_ticker(ticker)
+    result = master.valuator.calculate_dcf_monte_carlo(normalized_ticker, paths=paths, seed=seed, **params)
+    if "error" in result:
+        return jsonify(result), 404
+    return jsonify(result)
+
+@app.route('/api/valuation/batch')
+def get_batch_valuation():
+    """
+    Value many tickers in one vectorized pass: ?tickers=600036,00700&models=pr,pb_roe
+    """
+    raw_tickers = [t for t in request.args.get('tickers', '').split(',') if t.strip()]
+    if not raw_tickers:
+        return jsonify({"error": "tickers is required"}), 400
+    models = [m for m in request.args.get('models', '').split(',') if m.strip()] or None
+    if models:
+        unknown = [m for m in models if m not in BATCH_MODELS]
+        if unknown:
+            return jsonify({"error": f"Unknown models: {', '.join(unknown)}"}), 400
+
+    tickers = list(dict.fromkeys(master._normalize_ticker(t.strip()) for t in raw_tickers))
+    return jsonify(master.valuator.value_batch(tickers, models=models))
+
+# Band summaries may sync years of history and fetch statements per ticker; they get
+# their own small pool so a bands page load can't starve holdings/watchlist enrichment
+BANDS_WORKERS = int(os.environ.get("BANDS_WORKERS", 2))
+_bands_executor = ThreadPoolExecutor(max_workers=BANDS_WORKERS, thread_name_prefix="bands")
+
+@app.route('/api/valuation/bands')
+def get_valuation_bands_summary():
+    """
+    Where today's PE/PB/PR sit within each ticker's own 3/5/10-year history.
+    Defaults to the whole watchlist; ?tickers=a,b overrides.
+    """
+    raw_tickers = [t.strip() for t in request.args.get('tickers', '').split(',') if t.strip()]
+    if not raw_tickers:
+        raw_tickers = [t if isinstance(t, str) else t.get('ticker') for t in master.portfolio.get_watchlist()]
+    tickers = list(dict.fromkeys(master._normalize_ticker(t) for t in raw_tickers if t))
+
+    deadline = time.time() + ENRICH_DEADLINE
+    results = enrich_all(
+        tickers,
+        master.bands.summary,
+        lambda t: {"ticker": t, "status": "pending"},
+        deadline=deadline,
+        executor=_bands_executor
+    )
+    return jsonify(results)
+
+@app.route('/api/valuation/bands/<ticker>')
+def get_valuation_bands(ticker):
+    """
+    Rolling percentile bands (P10/P50/P90) of PE/PB/PR for charting: ?window=3y&step=5
+    """
+    window = request.args.get('window', '3y')
+    if window not in BAND_WINDOWS:
+        return jsonify({"error": f"window must be one of {', '.join(BAND_WINDOWS)}"}), 400
+    try:
+        step = max(1, int(request.args.get('step', 5)))
+    except ValueError:
+        return jsonify({"error": "step must be an integer"}), 400
+
+    result = master.bands.bands(master._normalize_ticker(ticker), window=window, step=step)
+    if "error" in result:
+        return jsonify(result), 404
+    return jsonify(result)
+
+@app.route('/api/valuation/history/<ticker>')
+def get_valuation_history(ticker):
+    """
+    Daily valuation snapshots for one model: ?model=pr&start=2024-01-01&end=2024-12-31
+    With ?field=pr_value (dotted paths allowed, e.g. result.fair_value_per_share)
+    only that value is returned per day, ready for a trend chart.
+    """
+    if master.valuation_history is None:
+        return jsonify({"error": "Valuation history is disabled"}), 404
+    model = request.args.get('model', 'pr')
+    if model not in SNAPSHOT_MODELS:
+        return jsonify({"error": f"model must be one of {', '.join(SNAPSHOT_MODELS)}"}), 400
+
+    normalized_ticker = master._normalize_ticker(ticker)
+    points = master.valuation_history.query(
+        normalized_ticker, model, request.args.get('start'), request.args.get('end')
+    )
+    field = request.args.get('field')
+    if field:
+        for point in points:
+            value = point.pop("data")
+            for key in field.split('.'):
+                value = value.get(key) if isinstance(value, dict) else None
+            point["value"] = value
+    return jsonify({"ticker": normalized_ticker, "model": model, "field": field, "points": points})
+
+@app.route('/api/valuation/snapshot', methods=['POST'])
+def run_valuation_snapshot():
+    """
+    Take today's snapshot now instead of waiting for the scheduled run (idempotent).
+    """
+    if master.valuation_history is None:
+        return jsonify({"error": "Valuation history is disabled"}), 404
+    return jsonify(valuation_job.run())
+
+# Numeric screener filters: min_<column> / max_<column> over the universe table columns
+SCREENER_LIMIT = 200
+
+@app.route('/api/screener')
+def screener():
+    """
+    Screen the local A-share/HK fundamentals table, e.g.
+    ?min_roe=0.15&max_pe=20&min_dividend_yield=0.03&sort=pr&limit=50
+    or with an expression:
+    ?q=pr_2 < 0.6 and dividend_yield > 0.04 and sector == "Financial Services"&sort=dividend_yield&order=desc
+    ROE, payout ratio and dividend yield are fractions (0.15 = 15%).
+    """
+    criteria = {}
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 0), SCREENER_LIMIT)
+        sort = request.args.get('sort') or None
+        descending = request.args.get('order') == 'desc'
+        expr = request.args.get('q', '').strip()
+        if expr:
+            rows = master.universe.query(expr, sort=sort, descending=descending, limit=limit)
+        else:
+            for key, value in request.args.items():
+                if key.startswith(('min_', 'max_')):
+                    criteria[key] = float(value)
+            rows = master.universe.screen(criteria, sort=sort, descending=descending, limit=limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"total": len(master.universe), "count": len(rows), "results": rows})
+
+RANKINGS_LIMIT = 200
+
+@app.route('/api/rankings/<metric>')
+def get_rankings(metric):
+    """
+    Top-N tracked tickers by a valuation metric, e.g. /api/rankings/pr?limit=20.
+    Read straight from the sorted indexes kept up to date by the quote refresher.
+    """
+    if metric not in RANKING_METRICS:
+        return jsonify({"error": f"metric must be one of {', '.join(RANKING_METRICS)}"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 0), RANKINGS_LIMIT)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    return jsonify(master.rankings.top(metric, limit))
+
+@app.route('/api/valuation/memo_stats')
+def valuation_memo_stats():
+    return jsonify(master.valuator.memo.stats())
+
+# History syncs run on a small background pool; a request waits at most
+# HISTORY_SYNC_DEADLINE seconds (a first sync pulls 10 years) and otherwise
+# answers from the local store while the sync carries on
+HISTORY_SYNC_DEADLINE = float(os.environ.get("HISTORY_SYNC_DEADLINE", 3))
+_history_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-sync")
+_history_syncs = {}
+_history_syncs_lock = threading.Lock()
+
+def _sync_history(ticker):
+    try:
+        master.history.sync(ticker, master.market_data)
+    except Exception as e:
+        print(f"Error syncing history for {ticker}: {e}")
+    finally:
+        with _history_syncs_lock:
+            _history_syncs.pop(ticker, None)
+
+def start_history_sync(ticker):
+    """Start (or join) the background sync for ticker and return its future."""
+    with _history_syncs_lock:
+        future = _history_syncs.get(ticker)
+        if future is None:
+            future = _history_executor.submit(_sync_history, ticker)
+            _history_syncs[ticker] = future
+        return future
+
+@app.route('/api/history/<ticker>')
+def get_history(ticker):
+    """
+    Daily OHLCV + dividends from the local history store (?start=YYYY-MM-DD&end=YYYY-MM-DD).
+    Syncs incrementally from upstream first when the local copy is out of date;
+    "syncing" is true when the sync missed the deadline and is still running.
+    """
+    normalized_ticker = master._normalize_ticker(ticker)
+    done, _ = wait([start_history_sync(normalized_ticker)], timeout=HISTORY_SYNC_DEADLINE)
+
+    try:
+        history = master.history.read(normalized_ticker, request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid date: {e}"}), 400
+
+    result = {"ticker": normalized_ticker, "syncing": not done, "date": [str(d) for d in history['date']]}
+    for column, values in history.items():
+        if column != 'date':
+            result[column] = values.tolist()
+    return jsonify(result)
+
 @app.route('/api/system/articles', methods=['GET'])
 def get_articles():
     return jsonify(master.system_manager.get_articles())
@@ -276,110 +591,184 @@ def delete_journal_entry(entry_id):
 
 # --- Portfolio API ---
 
-@app.route('/api/portfolio/holdings', methods=['GET'])
-def get_holdings():
-    holdings = master.portfolio.get_holdings()
-    # Enrich with current market data
-    enriched_holdings = []
-    for h in holdings:
-        raw_ticker = h['ticker']
-        # Normalize ticker for API calls (e.g. 513180 -> 513180.SS)
-        ticker = master._normalize_ticker(raw_ticker)
-        
-        try:
-            if ticker == 'CASH':
-                current_price = 1.0
-                name = '现金 (CNY)'
-                market_value = h['shares'] # For Cash, shares stores the amount
-                cost_basis = h['cost']
-                # Usually cash gain is 0 unless tracking currency. 
-                # Or user might input cost as original deposit amount and shares as current balance.
-                # Let's assume shares = current balance, cost = original principle.
-                gain = market_value - cost_basis
-                gain_percent = (gain / cost_basis) * 100 if cost_basis > 0 else 0
-                
-                enriched_holdings.append({
-                    "ticker": "CASH",
-                    "name": name,
-                    "shares": h['shares'],
-                    "cost": h['cost'],
-                    "current_price": 1.0,
-                    "market_value": round(market_value, 2),
-                    "gain": round(gain, 2),
-                    "gain_percent": round(gain_percent, 2),
-                    "day_change_percent": 0,
-                    "group_id": h.get("group_id", "default"),
-                    "note": h.get("note", "")
-                })
-                continue
-
-            # Try to get info from Sina first (faster for A-shares)
-            cn_info = get_cn_stock_info(ticker)
-            day_change_percent = 0
+def enrich_holding(h, quotes):
+    """
+    Enrich a single holding with current market data.
+    `quotes` is the batch of Sina quotes already resolved for the request.
+    """
+    raw_ticker = h['ticker']
+    # Normalize ticker for API calls (e.g. 513180 -> 513180.SS)
+    ticker = master._normalize_ticker(raw_ticker)
+    
+    try:
+        if ticker == 'CASH':
+            current_price = 1.0
+            name = '现金 (CNY)'
+            market_value = h['shares'] # For Cash, shares stores the amount
+            cost_basis = h['cost']
+            # Usually cash gain is 0 unless tracking currency. 
+            # Or user might input cost as original deposit amount and shares as current balance.
+            # Let's assume shares = current balance, cost = original principle.
+            gain = market_value - cost_basis
+            gain_percent = (gain / cost_basis) * 100 if cost_basis > 0 else 0
             
-            if cn_info:
-                name = cn_info['name']
-                current_price = cn_info.get('current_price')
-                day_change_percent = cn_info.get('day_change_percent', 0)
-                # Fallback to yfinance if Sina price is 0 (suspended or error)
-                if current_price == 0:
-                     current_price = master.valuator.get_current_price(ticker)
-                     # Recalculate change percent if we have pre_close
-                     if current_price and cn_info.get('pre_close') and cn_info['pre_close'] > 0:
-                         day_change_percent = (current_price - cn_info['pre_close']) / cn_info['pre_close'] * 100
-            else:
-                name = raw_ticker
-                current_price = master.valuator.get_current_price(ticker)
+            return {
+                "ticker": "CASH",
+                "name": name,
+                "shares": h['shares'],
+                "cost": h['cost'],
+                "current_price": 1.0,
+                "market_value": round(market_value, 2),
+                "gain": round(gain, 2),
+                "gain_percent": round(gain_percent, 2),
+                "day_change_percent": 0,
+                "group_id": h.get("group_id", "default"),
+                "note": h.get("note", "")
+            }
+
+        # Try to get info from Sina first (faster for A-shares)
+        cn_info = get_cn_stock_info(ticker, quotes)
+        day_change_percent = 0
+        
+        if cn_info:
+            name = cn_info.get('name') or raw_ticker
+            current_price = cn_info.get('current_price')
+            day_change_percent = cn_info.get('day_change_percent', 0)
+            # Fallback to yfinance if Sina price is 0 (suspended or error)
+            if current_price == 0:
+                 current_price = master.valuator.get_current_price(ticker)
+                 # Recalculate change percent if we have pre_close
+                 if current_price and cn_info.get('pre_close') and cn_info['pre_close'] > 0:
+                     day_change_percent = (current_price - cn_info['pre_close']) / cn_info['pre_close'] * 100
+        else:
+            name = raw_ticker
+            current_price = master.valuator.get_current_price(ticker)
+        
+        if current_price is not None:
+            # Calculate market value and gain
+            market_value = current_price * h['shares']
+            cost_basis = h['cost'] * h['shares']
+            gain = market_value - cost_basis
+            gain_percent = (gain / cost_basis) * 100 if cost_basis > 0 else 0
             
-            if current_price is not None:
-                # Calculate market value and gain
-                market_value = current_price * h['shares']
-                cost_basis = h['cost'] * h['shares']
-                gain = market_value - cost_basis
-                gain_percent = (gain / cost_basis) * 100 if cost_basis > 0 else 0
-                
-                # Calculate Day Gain
-                day_gain = 0
-                if cn_info and cn_info.get('pre_close'):
-                     day_gain = (current_price - cn_info['pre_close']) * h['shares']
-                elif day_change_percent != 0:
-                     # Estimate if we only have percent (fallback)
-                     pre_c = current_price / (1 + day_change_percent/100)
-                     day_gain = (current_price - pre_c) * h['shares']
-
-                enriched_holdings.append({
-                    "ticker": raw_ticker, # Keep original ticker for display/id consistency
-                    "name": name,
-                    "shares": h['shares'],
-                    "cost": h['cost'],
-                    "current_price": current_price,
-                    "market_value": round(market_value, 2),
-                    "gain": round(gain, 2),
-                    "gain_percent": round(gain_percent, 2),
-                    "day_change_percent": round(day_change_percent, 2),
-                    "day_gain": round(day_gain, 2),
-                    "group_id": h.get("group_id", "default"),
-                    "note": h.get("note", "")
-                })
-            else:
-                # Price fetch failed
-                enriched_holdings.append({
-                    **h,
-                    "name": name,
-                    "current_price": "N/A",
-                    "market_value": 0,
-                    "gain": 0,
-                    "gain_percent": 0,
-                    "group_id": h.get("group_id", "default"),
-                    "note": h.get("note", "")
-                })
+            # Calculate Day Gain
+            day_gain = 0
+            if cn_info and cn_info.get('pre_close'):
+                 day_gain = (current_price - cn_info['pre_close']) * h['shares']
+            elif day_change_percent != 0:
+                 # Estimate if we only have percent (fallback)
+                 pre_c = current_price / (1 + day_change_percent/100)
+                 day_gain = (current_price - pre_c) * h['shares']
+
+            return {
+                "ticker": raw_ticker, # Keep original ticker for display/id consistency
+                "name": name,
+                "shares": h['shares'],
+                "cost": h['cost'],
+                "current_price": current_price,
+                "market_value": round(market_value, 2),
+                "gain": round(gain, 2),
+                "gain_percent": round(gain_percent, 2),
+                "day_change_percent": round(day_change_percent, 2),
+                "day_gain": round(day_gain, 2),
+                "group_id": h.get("group_id", "default"),
+                "note": h.get("note", "")
+            }
+        else:
+            # Price fetch failed
+            return {
+                **h,
+                "name": name,
+                "current_price": "N/A",
+                "market_value": 0,
+                "gain": 0,
+                "gain_percent": 0,
+                "group_id": h.get("group_id", "default"),
+                "note": h.get("note", "")
+            }
 
-        except Exception as e:
-            print(f"Error enriching holding {raw_ticker}: {e}")
-            enriched_holdings.append(h) # Return basic data if fetch fails
-            
+    except Exception as e:
+        print(f"Error enriching holding {raw_ticker}: {e}")
+        return h # Return basic data if fetch fails
+        
+
+def pending_holding(h, quotes):
+    """
+    Placeholder for a holding whose enrichment missed the request deadline.
+    Uses the batched Sina quote when we have one so the row still shows a price.
+    """
+    raw_ticker = h['ticker']
+    quote = quotes.get(master._normalize_ticker(raw_ticker)) or {}
+    current_price = quote.get('current_price') or "N/A"
+    market_value = current_price * h['shares'] if current_price != "N/A" else 0
+    return {
+        **h,
+        "name": quote.get('name') or h.get('name') or raw_ticker,
+        "current_price": current_price,
+        "market_value": round(market_value, 2),
+        "gain": 0,
+        "gain_percent": 0,
+        "day_change_percent": round(quote.get('day_change_percent') or 0, 2),
+        "group_id": h.get("group_id", "default"),
+        "note": h.get("note", ""),
+        "status": "pending"
+    }
+
+@app.route('/api/portfolio/holdings', methods=['GET'])
+def get_holdings():
+    deadline = time.time() + ENRICH_DEADLINE
+    holdings = master.portfolio.get_holdings()
+    # Read quotes from the refresher snapshot (one batched Sina request for any misses)
+    quotes = quote_refresher.get_quotes([master._normalize_ticker(h['ticker']) for h in holdings])
+    # Enrich with current market data, fanned out across the shared pool
+    enriched_holdings = enrich_all(
+        holdings,
+        lambda h: enrich_holding(h, quotes),
+        lambda h: pending_holding(h, quotes),
+        deadline
+    )
     return jsonify(enriched_holdings)
 
+# Last /api/portfolio/summary payload, keyed by quote snapshot version + portfolio contents
+_summary_cache = {"key": None, "value": None}
+_summary_lock = threading.Lock()
+
+@app.route('/api/portfolio/summary', methods=['GET'])
+def get_portfolio_summary():
+    """
+    Enriched holdings plus per-group and total market value, cost, gain,
+    day gain and weight, aggregated server-side in one vectorized pass.
+    Recomputed only when the quote snapshot or the portfolio changes.
+    """
+    holdings = master.portfolio.get_holdings()
+    groups = master.portfolio.get_groups()
+    fingerprint = hashlib.blake2b(
+        json.dumps([holdings, groups], sort_keys=True, default=str).encode('utf-8'), digest_size=16
+    ).hexdigest()
+    key = (quote_refresher.version, fingerprint)
+    with _summary_lock:
+        if _summary_cache["key"] == key:
+            return jsonify(_summary_cache["value"])
+
+    deadline = time.time() + ENRICH_DEADLINE
+    quotes = quote_refresher.get_quotes([master._normalize_ticker(h['ticker']) for h in holdings])
+    enriched_holdings = enrich_all(
+        holdings,
+        lambda h: enrich_holding(h, quotes),
+        lambda h: pending_holding(h, quotes),
+        deadline
+    )
+    summary = summarize_portfolio(enriched_holdings, groups)
+    summary["quote_version"] = quote_refresher.version
+
+    # Rows that missed the deadline are placeholders; don't pin them in the cache
+    if not any(h.get("status") == "pending" for h in enriched_holdings):
+        with _summary_lock:
+            # get_quotes may have bumped the version while filling misses
+            _summary_cache["key"] = (summary["quote_version"], fingerprint)
+            _summary_cache["value"] = summary
+    return jsonify(summary)
+
 @app.route('/api/portfolio/groups', methods=['GET'])
 def get_groups():
     return jsonify(master.portfolio.get_groups())
@@ -466,47 +855,125 @@ def remove_holding(ticker):
         return jsonify({"status": "success"})
     return jsonify({"error": "Failed to remove holding"}), 500
 
-@app.route('/api/portfolio/watchlist', methods=['GET'])
-def get_watchlist():
-    watchlist = master.portfolio.get_watchlist()
-    enriched_watchlist = []
-    for raw_ticker in watchlist:
-        # Normalize ticker for API calls
-        ticker = master._normalize_ticker(raw_ticker)
-        try:
-            # We need PE, Dividend, Change
-            pe_data = master.valuator.calculate_pe(ticker)
+def enrich_watchlist_item(raw_ticker, quotes):
+    """
+    Enrich a single watchlist ticker with price, PE, dividend yield and day change.
+    """
+    # Normalize ticker for API calls
+    ticker = master._normalize_ticker(raw_ticker)
+    try:
+        # We need PE, Dividend, Change
+        pe_data = master.valuator.calculate_pe(ticker)
+        cn_info = get_cn_stock_info(ticker, quotes)
+        name = (cn_info.get('name') if cn_info else None) or raw_ticker
+        current_price = cn_info.get('current_price') if cn_info else None
+        if not current_price:
             current_price = master.valuator.get_current_price(ticker)
-            cn_info = get_cn_stock_info(ticker)
-            name = cn_info['name'] if cn_info else raw_ticker
-            
-            # Safe access to pe_data which might be None
-            if pe_data is None:
-                pe_data = {}
-            
-            # Determine change percent (prioritize Sina)
-            change_percent = pe_data.get('change_percent', 0)
-            if cn_info and 'day_change_percent' in cn_info:
-                change_percent = cn_info['day_change_percent']
+        
+        # Safe access to pe_data which might be None
+        if pe_data is None:
+            pe_data = {}
+        
+        # Determine change percent (prioritize Sina)
+        change_percent = pe_data.get('change_percent', 0)
+        if cn_info and 'day_change_percent' in cn_info:
+            change_percent = cn_info['day_change_percent']
+
+        # Convert change_percent to decimal for consistency with dividend_yield in frontend
+        # Sina returns percentage (e.g. 1.5 for 1.5%), but frontend watchlist expects decimal (0.015)
+        change_percent_decimal = change_percent / 100.0
+
+        return {
+            "ticker": raw_ticker,
+            "name": name,
+            "price": current_price if current_price is not None else "N/A",
+            "pe": pe_data.get('trailing_pe') or '--',
+            "dividend_yield": pe_data.get('dividend_yield') or 0,
+            "change_percent": round(change_percent_decimal, 4)
+        }
+    except Exception as e:
+        print(f"Error enriching watchlist {raw_ticker}: {e}")
+        return {"ticker": raw_ticker}
 
-            # Convert change_percent to decimal for consistency with dividend_yield in frontend
-            # Sina returns percentage (e.g. 1.5 for 1.5%), but frontend watchlist expects decimal (0.015)
-            change_percent_decimal = change_percent / 100.0
+def pending_watchlist_item(raw_ticker, quotes):
+    """
+    Placeholder for a watchlist ticker whose enrichment missed the request deadline.
+    """
+    quote = quotes.get(master._normalize_ticker(raw_ticker)) or {}
+    return {
+        "ticker": raw_ticker,
+        "name": quote.get('name') or raw_ticker,
+        "price": quote.get('current_price') or "N/A",
+        "pe": '--',
+        "dividend_yield": 0,
+        "change_percent": round((quote.get('day_change_percent') or 0) / 100.0, 4),
+        "status": "pending"
+    }
 
-            enriched_watchlist.append({
-                "ticker": raw_ticker,
-                "name": name,
-                "price": current_price if current_price is not None else "N/A",
-                "pe": pe_data.get('trailing_pe') or '--',
-                "dividend_yield": pe_data.get('dividend_yield') or 0,
-                "change_percent": round(change_percent_decimal, 4)
-            })
-        except Exception as e:
-            print(f"Error enriching watchlist {raw_ticker}: {e}")
-            enriched_watchlist.append({"ticker": raw_ticker})
-            
+@app.route('/api/portfolio/watchlist', methods=['GET'])
+def get_watchlist():
+    deadline = time.time() + ENRICH_DEADLINE
+    watchlist = master.portfolio.get_watchlist()
+    quotes = quote_refresher.get_quotes([master._normalize_ticker(t) for t in watchlist])
+    enriched_watchlist = enrich_all(
+        watchlist,
+        lambda t: enrich_watchlist_item(t, quotes),
+        lambda t: pending_watchlist_item(t, quotes),
+        deadline
+    )
     return jsonify(enriched_watchlist)
 
+@app.route('/api/stream/quotes')
+def stream_quotes():
+    """
+    Server-Sent Events stream of quote ticks for the subscribed tickers (?tickers=a,b,c).
+    Each event only carries tickers whose price or day change moved since the previous event,
+    together with the price-dependent valuation outputs (PE, PR, margins, signals) when available.
+    """
+    raw_tickers = [t.strip() for t in request.args.get('tickers', '').split(',') if t.strip()]
+    if not raw_tickers:
+        return jsonify({"error": "tickers is required"}), 400
+    # normalized ticker -> ticker as the client knows it
+    subscriptions = {master._normalize_ticker(t): t for t in raw_tickers}
+    if not _stream_slots.acquire(blocking=False):
+        # The page keeps its loaded values; live ticks resume on the next load
+        return jsonify({"error": "Too many open quote streams"}), 503, {"Retry-After": str(STREAM_HEARTBEAT)}
+
+    def generate():
+        yield "retry: 3000\n\n"
+        sent = {}
+        version = -1
+        started = time.time()
+        while time.time() - started < STREAM_MAX_DURATION:
+            version, snapshot = quote_refresher.wait_for_update(version, timeout=STREAM_HEARTBEAT)
+            changes = {}
+            for ticker, client_ticker in subscriptions.items():
+                quote = snapshot.get(ticker)
+                if not quote or not quote.get('current_price'):
+                    continue
+                tick = {
+                    "price": quote['current_price'],
+                    "day_change_percent": round(quote.get('day_change_percent') or 0, 2)
+                }
+                if quote.get('valuation'):
+                    tick["valuation"] = quote['valuation']
+                if sent.get(ticker) != tick:
+                    sent[ticker] = tick
+                    changes[client_ticker] = tick
+            if changes:
+                yield f"data: {json.dumps(changes)}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Runs when the response is closed, whether or not the generator was ever consumed
+    response.call_on_close(_stream_slots.release)
+    return response
+
 @app.route('/api/portfolio/watchlist', methods=['POST'])
 def add_watchlist():
     data = request.json
@@ -1 +1,2 @@
 from .core import InvestmentMaster
+from .fundamentals import FundamentalsCache
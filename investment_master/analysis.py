@@ -1,8 +1,8 @@
-import yfinance as yf
+from .market_data import get_market_data_provider
 
 class Analyzer:
-    def __init__(self):
-        pass
+    def __init__(self, provider=None):
+        self.provider = provider or get_market_data_provider()
 
     def generate_report(self, target):
         """
@@ -10,8 +10,7 @@ class Analyzer:
         """
         # 尝试获取真实数据
         try:
-            stock = yf.Ticker(target)
-            info = stock.info
+            info = self.provider.get_info(target)
             name = info.get('longName', target)
             sector = info.get('sector', '未知')
             industry = info.get('industry', '未知')
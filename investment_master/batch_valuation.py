@@ -0,0 +1,313 @@
+import numpy as np
+
+# 批量估值用到的全部 info 字段，每个字段对应一列 float64，缺失 (None/非数值) 记为 NaN
+FIELDS = (
+    'currentPrice', 'previousClose', 'trailingPE', 'forwardPE', 'trailingEps',
+    'earningsGrowth', 'revenueGrowth', 'pegRatio', 'priceToBook', 'returnOnEquity',
+    'bookValue', 'payoutRatio', 'dividendRate', 'trailingAnnualDividendRate', 'dividendYield',
+    'netIncomeToCommon', 'sharesOutstanding', 'debtToEquity', 'freeCashflow', 'marketCap'
+)
+
+# 每个模型每个 ticker 一个错误码，对应单只估值时返回的 {"error": ...}
+ERROR_NONE = 0
+ERROR_MISSING_DATA = 1    # 缺少必要字段
+ERROR_NOT_APPLICABLE = 2  # 数据齐全但模型不适用 (例如增长率 <= 0 时的 PEG、无分红的 DDM)
+ERROR_INVALID = 3         # 计算结果非有限值 (除零等)
+
+ERROR_MESSAGES = {
+    ERROR_NONE: None,
+    ERROR_MISSING_DATA: "缺少必要数据",
+    ERROR_NOT_APPLICABLE: "不适用该模型",
+    ERROR_INVALID: "计算结果无效"
+}
+
+# 估值信号: 1 低估, 0 合理, -1 高估
+SIGNAL_UNDERVALUED = 1
+SIGNAL_FAIR = 0
+SIGNAL_OVERVALUED = -1
+
+# 与 Valuator 单只估值保持一致的模型假设
+DDM_COST_OF_EQUITY = 0.09
+DDM_GROWTH = 0.03
+DCF_GROWTH = 0.05
+DCF_WACC = 0.10
+DCF_TERMINAL_GROWTH = 0.02
+DCF_YEARS = 5
+# PR / PEG 的买卖阈值 (低于 undervalued 为低估，高于 overvalued 为高估)
+PR_UNDERVALUED = 0.6
+PR_OVERVALUED = 1.0
+PEG_UNDERVALUED = 0.8
+PEG_OVERVALUED = 1.5
+
+def _to_float(value):
+    if value is None or isinstance(value, bool):
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def build_table(infos):
+    """
+    把 N 个 info 字典转成列式表 {field: float64 数组}，缺失值为 NaN。
+    """
+    n = len(infos)
+    table = {}
+    for field in FIELDS:
+        column = np.empty(n)
+        for i, info in enumerate(infos):
+            column[i] = _to_float((info or {}).get(field))
+        table[field] = column
+    return table
+
+def _truthy(x):
+    # 与单只估值里 `if not value` 的判断一致: NaN 和 0 都算缺失
+    return np.isfinite(x) & (x != 0)
+
+def _first_truthy(*columns):
+    result = np.full(columns[0].shape, np.nan)
+    for column in reversed(columns):
+        result = np.where(_truthy(column), column, result)
+    return result
+
+def _errors(n, *conditions):
+    """
+    按顺序应用 (mask, code)，靠前的错误优先。
+    """
+    errors = np.zeros(n, dtype=np.int8)
+    for mask, code in reversed(conditions):
+        errors = np.where(mask, code, errors).astype(np.int8)
+    return errors
+
+def _finalize(values, errors):
+    """
+    有错误的位置统一置为 NaN；计算结果非有限的记为 ERROR_INVALID。
+    """
+    ok = errors == ERROR_NONE
+    invalid = ok & ~np.all([np.isfinite(v) for v in values.values()], axis=0)
+    errors = np.where(invalid, ERROR_INVALID, errors).astype(np.int8)
+    bad = errors != ERROR_NONE
+    for key, v in values.items():
+        if v.dtype.kind == 'f':
+            values[key] = np.where(bad, np.nan, v)
+    return values, errors
+
+def _price(t):
+    return _first_truthy(t['currentPrice'], t['previousClose'])
+
+def _growth(t):
+    # earningsGrowth 优先，其次 revenueGrowth，都没有时为 0
+    g = _first_truthy(t['earningsGrowth'], t['revenueGrowth'])
+    return np.where(np.isnan(g), 0.0, g)
+
+def best_dividend_yield(t, price=None):
+    """
+    对应 Valuator._get_best_dividend_yield: TTM 股息率与数据源股息率取较大者，<= 0 时为 NaN。
+    """
+    price = _price(t) if price is None else price
+    has_price = _truthy(price)
+    safe_price = np.where(has_price, price, 1.0)
+    t_yield = np.where(_truthy(t['trailingAnnualDividendRate']), t['trailingAnnualDividendRate'] / safe_price, 0.0)
+    raw = t['dividendYield']
+    d_yield = np.where(_truthy(raw), np.where(raw > 1, raw / 100.0, raw), 0.0)
+    best = np.maximum(t_yield, d_yield)
+    return np.where(has_price & (best > 0), best, np.nan)
+
+def graham(t):
+    n = len(t['trailingEps'])
+    eps = t['trailingEps']
+    g = np.clip(_growth(t) * 100, 0, 25)
+    with np.errstate(all='ignore'):
+        intrinsic_value = eps * (8.5 + 2 * g)
+        intrinsic_value_adj = intrinsic_value * 4.4 / 4.5
+    errors = _errors(n, (~_truthy(eps), ERROR_MISSING_DATA))
+    return _finalize({
+        "eps": eps,
+        "growth_rate": g,
+        "intrinsic_value": intrinsic_value,
+        "intrinsic_value_adj": intrinsic_value_adj
+    }, errors)
+
+def peg(t):
+    pe = _first_truthy(t['trailingPE'], t['forwardPE'])
+    n = len(pe)
+    peg_ratio = t['pegRatio']
+    has_peg = _truthy(peg_ratio)
+    manual_growth = _growth(t) * 100
+    with np.errstate(all='ignore'):
+        growth_rate = np.where(has_peg, pe / peg_ratio, manual_growth)
+        value = np.where(has_peg, peg_ratio, pe / manual_growth)
+    signal = np.where(value < PEG_UNDERVALUED, SIGNAL_UNDERVALUED,
+                      np.where(value > PEG_OVERVALUED, SIGNAL_OVERVALUED, SIGNAL_FAIR)).astype(np.int8)
+    errors = _errors(n,
+        (~_truthy(pe), ERROR_MISSING_DATA),
+        (~has_peg & (manual_growth <= 0), ERROR_NOT_APPLICABLE))
+    return _finalize({
+        "pe": pe,
+        "growth_rate": growth_rate,
+        "peg": value,
+        "signal": signal
+    }, errors)
+
+def ddm(t):
+    price = _price(t)
+    d_yield = best_dividend_yield(t, price)
+    dividend_rate = np.where(_truthy(t['dividendRate']), t['dividendRate'], price * d_yield)
+    n = len(dividend_rate)
+    r, g = DDM_COST_OF_EQUITY, DDM_GROWTH
+    intrinsic_value = dividend_rate * (1 + g) / (r - g)
+    errors = _errors(n, (~_truthy(dividend_rate), ERROR_NOT_APPLICABLE))
+    return _finalize({
+        "dividend_rate": dividend_rate,
+        "intrinsic_value": intrinsic_value
+    }, errors)
+
+def tang(t, rational_pe=25, years=3, leverage_haircut=0.7):
+    shares = t['sharesOutstanding']
+    n = len(shares)
+    eps_income = np.where(_truthy(t['trailingEps']) & _truthy(shares), t['trailingEps'] * shares, np.nan)
+    net_income = _first_truthy(t['netIncomeToCommon'], eps_income)
+    g = np.clip(_growth(t), 0, 0.25)
+    future_profit = net_income * (1 + g) ** years
+    future_market_cap = future_profit * rational_pe
+    dte = t['debtToEquity']
+    is_high_leverage = _truthy(dte) & (dte > 100)
+    buy_point_cap = np.where(is_high_leverage, future_market_cap / 2 * leverage_haircut, future_market_cap / 2)
+    with np.errstate(all='ignore'):
+        buy_price = buy_point_cap / shares
+        sell_price = net_income * 50 / shares
+    errors = _errors(n,
+        (~_truthy(net_income), ERROR_MISSING_DATA),
+        (~_truthy(shares), ERROR_MISSING_DATA))
+    return _finalize({
+        "current_profit": net_income,
+        "growth_rate": g,
+        "future_profit": future_profit,
+        "future_market_cap": future_market_cap,
+        "buy_price": buy_price,
+        "sell_price": sell_price,
+        "is_high_leverage": is_high_leverage
+    }, errors)
+
+def pb_roe(t, divisor=7.0):
+    roe = t['returnOnEquity']
+    bps = t['bookValue']
+    price = _price(t)
+    n = len(roe)
+    target_pb = roe * 100 / divisor
+    fair_value = target_pb * bps
+    with np.errstate(all='ignore'):
+        margin = (fair_value - price) / fair_value * 100
+    errors = _errors(n, (~(_truthy(roe) & _truthy(bps) & _truthy(price)), ERROR_MISSING_DATA))
+    return _finalize({
+        "target_pb": target_pb,
+        "fair_value": fair_value,
+        "margin": margin,
+        "buy_price_low": target_pb * 0.7 * bps,
+        "buy_price_high": target_pb * 0.8 * bps,
+        "sell_price_low": target_pb * 1.2 * bps,
+        "sell_price_high": target_pb * 1.3 * bps
+    }, errors)
+
+def pr(t, undervalued=PR_UNDERVALUED, overvalued=PR_OVERVALUED):
+    pe = t['trailingPE']
+    roe = t['returnOnEquity']
+    pb = t['priceToBook']
+    dpr = t['payoutRatio']
+    n = len(pe)
+    roe_val = roe * 100
+    with np.errstate(all='ignore'):
+        pr1 = pe / roe_val
+        # 分红率缺失时 N=1；>= 50% 为 1，<= 25% 为 2，中间为 0.5 / dpr
+        n_factor = np.where(np.isnan(dpr), 1.0,
+                            np.where(dpr >= 0.50, 1.0, np.where(dpr <= 0.25, 2.0, 0.50 / dpr)))
+        pr2 = n_factor * pr1
+        pr3 = np.where(_truthy(pb), pb / (roe_val * roe), 0.0)
+    signal = np.where(pr2 < undervalued, SIGNAL_UNDERVALUED,
+                      np.where(pr2 > overvalued, SIGNAL_OVERVALUED, SIGNAL_FAIR)).astype(np.int8)
+    errors = _errors(n, (~(_truthy(pe) & _truthy(roe)), ERROR_MISSING_DATA))
+    return _finalize({
+        "n_factor": n_factor,
+        "pr_value": pr2,
+        "pr_1": pr1,
+        "pr_2": pr2,
+        "pr_3": pr3,
+        "signal": signal
+    }, errors)
+
+def dcf_fair_value(fcf, shares, growth_rate=DCF_GROWTH, wacc=DCF_WACC, terminal_growth=DCF_TERMINAL_GROWTH, years=DCF_YEARS):
+    """
+    DCF 每股价值的闭式解，所有参数都可以是可广播的数组。
+    预测期现值是等比数列: sum_{i=1..n} fcf * q^i, q = (1+g)/(1+wacc)
+    终值: fcf * (1+g)^n * (1+tg) / (wacc - tg) / (1+wacc)^n
+    wacc <= tg 时模型无意义，结果为 NaN。
+    """
+    fcf = np.asarray(fcf, dtype=float)
+    g = np.asarray(growth_rate, dtype=float)
+    w = np.asarray(wacc, dtype=float)
+    tg = np.asarray(terminal_growth, dtype=float)
+    with np.errstate(all='ignore'):
+        q = (1 + g) / (1 + w)
+        annuity = np.where(np.isclose(q, 1.0), years, q * (1 - q ** years) / (1 - q))
+        terminal_pv = q ** years * (1 + tg) / (w - tg)
+        value = fcf * (annuity + terminal_pv) / shares
+    return np.where(w > tg, value, np.nan)
+
+def dcf(t, growth_rate=DCF_GROWTH, wacc=DCF_WACC, terminal_growth=DCF_TERMINAL_GROWTH, years=DCF_YEARS):
+    fcf = _first_truthy(t['freeCashflow'], t['marketCap'] * 0.03)
+    n = len(fcf)
+    shares = t['sharesOutstanding']
+    fair_value = dcf_fair_value(fcf, shares, growth_rate, wacc, terminal_growth, years)
+    errors = _errors(n,
+        (~_truthy(fcf), ERROR_MISSING_DATA),
+        (~_truthy(shares), ERROR_MISSING_DATA))
+    return _finalize({
+        "initial_fcf": fcf,
+        "fair_value_per_share": fair_value
+    }, errors)
+
+MODELS = {
+    "graham": graham,
+    "peg": peg,
+    "ddm": ddm,
+    "tang": tang,
+    "pb_roe": pb_roe,
+    "pr": pr,
+    "dcf": dcf
+}
+
+def value_batch(infos, models=None):
+    """
+    对 N 个 ticker 的 info 一次性计算所有模型。
+    返回 {model: {"values": {字段: 长度 N 的数组}, "errors": 长度 N 的 int8 错误码}}，
+    错误码为 ERROR_*，出错位置的数值为 NaN。
+    """
+    table = infos if isinstance(infos, dict) else build_table(infos)
+    results = {}
+    for name in models or MODELS:
+        values, errors = MODELS[name](table)
+        results[name] = {"values": values, "errors": errors}
+    return results
+
+def to_records(tickers, results):
+    """
+    把批量结果转成 {ticker: {model: {...} 或 {"error": ...}}}，便于 JSON 输出。
+    """
+    records = {ticker: {} for ticker in tickers}
+    for name, result in results.items():
+        errors = result["errors"]
+        for i, ticker in enumerate(tickers):
+            code = int(errors[i])
+            if code != ERROR_NONE:
+                records[ticker][name] = {"error": ERROR_MESSAGES[code], "error_code": code}
+                continue
+            records[ticker][name] = {key: _to_json(v[i]) for key, v in result["values"].items()}
+    return records
+
+def _to_json(value):
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    value = float(value)
+    return round(value, 3) if np.isfinite(value) else None
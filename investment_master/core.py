@@ -4,12 +4,28 @@ from .analysis import Analyzer
 from .portfolio_manager import PortfolioManager
 from .system_manager import SystemManager
 from .journal_manager import JournalManager
+from .market_data import get_market_data_provider
+from .history_store import HistoryStore
+from .revaluation import IncrementalValuator
+from .rankings import Rankings
+from .valuation_bands import ValuationBands
+from .valuation_history import get_valuation_history_store
+from .universe import UniverseTable, UniverseRefreshJob
 
 class InvestmentMaster:
     def __init__(self):
-        # self.selector = StockSelector()
-        self.valuator = Valuator()
-        # self.analyzer = Analyzer()
+        self.market_data = get_market_data_provider()
+        self.universe = UniverseTable()
+        self.selector = StockSelector(self.market_data, universe=self.universe)
+        # 全市场刷新时持仓和自选优先
+        self.universe_refresh = UniverseRefreshJob(self.universe, provider=self.market_data, priority=self.tracked_tickers)
+        self.valuator = Valuator(provider=self.market_data)
+        self.revaluator = IncrementalValuator(self.valuator)
+        self.rankings = Rankings()
+        self.history = HistoryStore()
+        self.bands = ValuationBands(self.history, self.market_data)
+        self.valuation_history = get_valuation_history_store()
+        self.analyzer = Analyzer(self.market_data)
         self.portfolio = PortfolioManager()
         self.system_manager = SystemManager()
         self.journal_manager = JournalManager()
@@ -53,6 +69,24 @@ class InvestmentMaster:
             
         return ticker
 
+    def tracked_tickers(self):
+        """
+        返回所有持仓和自选股的标准化代码 (去重，不含现金)
+        """
+        raw = [h['ticker'] for h in self.portfolio.get_holdings()] + list(self.portfolio.get_watchlist())
+        tickers = []
+        for t in raw:
+            ticker = self._normalize_ticker(t)
+            if ticker != 'CASH' and ticker not in tickers:
+                tickers.append(ticker)
+        return tickers
+
+    def refresh_universe(self, with_info=True, restart=False):
+        """
+        刷新本地全市场基本面表，上次中断时从检查点继续。
+        """
+        return self.universe_refresh.run(with_info=with_info, restart=restart)
+
     def run_stock_selection(self):
         print("\n--- 启动选股助手 ---")
         # 这里可以交互式获取用户输入，例如市场、板块、指标
@@ -62,8 +96,22 @@ class InvestmentMaster:
             'min_roe': 15
         }
         print(f"默认筛选标准: {criteria}")
+
+        expr = input("请输入筛选表达式 (例如 pr_2 < 0.6 and dividend_yield > 0.04，留空使用默认标准): ").strip()
+        if expr:
+            try:
+                results = self.selector.select(expr, sort='pr', limit=50)
+            except ValueError as e:
+                print(f"表达式无效: {e}")
+                return
+            print("筛选结果:")
+            if not results:
+                print("没有找到符合条件的股票。")
+            for stock in results:
+                print(f"- {stock}")
+            return
         
-        tickers_input = input("请输入要筛选的股票代码列表 (逗号分隔，留空使用模拟数据): ")
+        tickers_input = input("请输入要筛选的股票代码列表 (逗号分隔，留空筛选本地全市场股票池): ")
         if tickers_input.strip():
             tickers = [self._normalize_ticker(t) for t in tickers_input.split(',')]
         else:
@@ -85,10 +133,18 @@ class InvestmentMaster:
         ticker = self._normalize_ticker(ticker)
         
         print(f"正在获取 {ticker} 数据...")
-        price = self.valuator.get_current_price(ticker)
-        pe_data = self.valuator.calculate_pe(ticker)
-        dcf_data = self.valuator.calculate_dcf(ticker)
-        pb_data = self.valuator.calculate_pb_roe(ticker)
+        # 只获取一次基本面快照，所有估值模型共享
+        try:
+            info = self.valuator.get_info(ticker)
+        except Exception as e:
+            # 取数失败时直接结束，否则每个模型都会各自重新请求一次
+            print(f"获取 {ticker} 基本面数据失败: {e}")
+            return
+
+        price = self.valuator.get_current_price(ticker, info=info)
+        pe_data = self.valuator.calculate_pe(ticker, info=info)
+        dcf_data = self.valuator.calculate_dcf(ticker, info=info)
+        pb_data = self.valuator.calculate_pb_roe(ticker, info=info)
         
         print(f"\n====== 估值报告: {ticker} ======")
         print(f"当前市场价格: {price}")
@@ -200,9 +256,7 @@ class InvestmentMaster:
              print("\n[DCF 分析] 无法获取足够数据进行计算")
 
         # 6. 市赚率 (PR) 分析
-        # info 可能在前面的步骤中未定义（如果 dcf_data 计算失败或者直接跳过），这里重新获取或确保 info 存在
-        # 但 calculate_pr 内部会处理 info=None 的情况
-        pr_data = self.valuator.calculate_pr(ticker, info if 'info' in locals() else None)
+        pr_data = self.valuator.calculate_pr(ticker, info=info)
         if pr_data and "error" not in pr_data:
             print("\n[市赚率 (PR) 估值分析]")
             print(f"  1. 计算规则说明:")
@@ -0,0 +1,38 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+ENRICH_WORKERS = int(os.environ.get("ENRICH_WORKERS", 8))
+# Overall budget for one portfolio request, in seconds
+ENRICH_DEADLINE = float(os.environ.get("ENRICH_DEADLINE", 5))
+
+# Shared bounded pool: slow upstreams can never pile up more than ENRICH_WORKERS threads
+_executor = ThreadPoolExecutor(max_workers=ENRICH_WORKERS, thread_name_prefix="enrich")
+
+def enrich_all(items, enrich, pending, deadline=None, executor=None):
+    """
+    Run enrich(item) for every item concurrently and return results in input order.
+    Items that have not finished by `deadline` (absolute time.time() value) are
+    returned as pending(item) instead of holding up the whole response.
+    Slow, heavy jobs should pass their own `executor` so they can't occupy the shared pool.
+    """
+    if deadline is None:
+        deadline = time.time() + ENRICH_DEADLINE
+    executor = executor or _executor
+
+    futures = [executor.submit(enrich, item) for item in items]
+    done, _ = wait(futures, timeout=max(0, deadline - time.time()))
+
+    results = []
+    for item, future in zip(items, futures):
+        if future in done:
+            try:
+                results.append(future.result())
+                continue
+            except Exception as e:
+                print(f"Error enriching {item}: {e}")
+        else:
+            # Don't start work nobody is waiting for anymore
+            future.cancel()
+        results.append(pending(item))
+    return results
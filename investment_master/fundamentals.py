@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from .fundamentals_store import QUOTE_TTL
+from .market_data import get_market_data_provider
+from .singleflight import SingleFlight
+
+class FundamentalsCache:
+    """
+    每个 ticker 的基本面快照 (info) 缓存，数据来自 MarketDataProvider。
+    同一刷新窗口 (TTL) 内，所有估值模型共享同一份 info，每个 ticker 只请求一次上游。
+    配置了 store (FundamentalsStore) 时，内存未命中会先读磁盘缓存，
+    只有字段过期且拿到刷新租约的 worker 才会请求上游。
+    """
+    def __init__(self, ttl=None, store=None, wait_timeout=5, provider=None):
+        if ttl is None:
+            ttl = float(os.environ.get("FUNDAMENTALS_TTL", 300))
+        if store is not None:
+            # 内存层不能比磁盘上最短的字段过期时间更久
+            ttl = min(ttl, QUOTE_TTL)
+        self.ttl = ttl
+        self.store = store
+        self.provider = provider or get_market_data_provider()
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._entries = {}  # ticker -> (fetched_at, info)
+        self._inflight = SingleFlight()
+
+    def get(self, ticker):
+        """
+        返回 ticker 的基本面快照，过期或不存在时从上游重新获取。
+        上游异常直接抛出，由调用方决定如何降级。
+        """
+        with self._lock:
+            entry = self._entries.get(ticker)
+        if entry and time.time() - entry[0] < self.ttl:
+            return entry[1]
+
+        # 同一 ticker 的并发未命中合并为一次加载
+        return self._inflight.do(ticker, self._load, ticker)
+
+    def _load(self, ticker):
+        if self.store is None:
+            info = self._fetch(ticker)
+        else:
+            info = self._get_from_store(ticker)
+        self.put(ticker, info)
+        return info
+
+    def _get_from_store(self, ticker):
+        info, stale_fields = self.store.load(ticker)
+        if info and not stale_fields:
+            return info
+
+        deadline = time.time() + self.wait_timeout
+        while not self.store.acquire_refresh(ticker):
+            # 其他 worker 正在刷新: 有旧数据先用旧数据，否则等它写回
+            if info:
+                return info
+            if time.time() > deadline:
+                break
+            time.sleep(0.1)
+            info, stale_fields = self.store.load(ticker)
+            if info and not stale_fields:
+                return info
+
+        try:
+            fresh = self._fetch(ticker)
+        except Exception as e:
+            if info:
+                print(f"刷新 {ticker} 基本面失败，使用本地缓存: {e}")
+                return info
+            raise
+        finally:
+            self.store.release_refresh(ticker)
+
+        self.store.save_snapshot(ticker, fresh)
+        return fresh
+
+    def peek(self, ticker):
+        """
+        只读内存中已有的快照 (即使已过期)，不会触发上游请求；没有时返回 None。
+        """
+        with self._lock:
+            entry = self._entries.get(ticker)
+        return entry[1] if entry else None
+
+    def put(self, ticker, info):
+        with self._lock:
+            self._entries[ticker] = (time.time(), info)
+
+    def invalidate(self, ticker=None):
+        with self._lock:
+            if ticker is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(ticker, None)
+
+    def _fetch(self, ticker):
+        return self.provider.get_info(ticker)
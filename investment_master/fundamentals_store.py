@@ -0,0 +1,188 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 按字段的过期规则 (秒)
+QUOTE_TTL = float(os.environ.get("MARKET_CACHE_QUOTE_TTL", 60))
+DAILY_TTL = 24 * 3600
+WEEKLY_TTL = 7 * 24 * 3600
+
+# 行情字段: 秒级过期。只包含 save_quotes 会用 Sina 行情刷新的字段，
+# 其余盘中字段 (open, volume, bid ...) 没有人读取，按天过期，避免每分钟为它们重新请求 yfinance
+QUOTE_FIELDS = {'currentPrice', 'previousClose'}
+# 公司概况字段: 一周过期
+PROFILE_FIELDS = {
+    'longBusinessSummary', 'longName', 'shortName', 'sector', 'industry',
+    'website', 'country', 'city', 'address1', 'phone', 'fullTimeEmployees',
+    'companyOfficers', 'exchange', 'currency', 'quoteType'
+}
+# 其余字段 (returnOnEquity, bookValue, trailingEps ...) 按天过期
+
+# 完整快照标记: 只写过行情字段的 ticker 不算有基本面缓存
+SNAPSHOT_FIELD = '__snapshot__'
+
+def field_ttl(field):
+    if field in QUOTE_FIELDS:
+        return QUOTE_TTL
+    if field in PROFILE_FIELDS:
+        return WEEKLY_TTL
+    return DAILY_TTL
+
+class FundamentalsStore:
+    """
+    基于 SQLite (WAL) 的本地基本面/行情缓存。
+    同一台机器上的所有 gunicorn worker 共享同一个文件，重启后缓存仍然有效。
+    每个字段单独记录获取时间，按 field_ttl 判断是否过期。
+    """
+    def __init__(self, db_path='data/market_cache.db'):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+
+    def _conn(self):
+        # sqlite3 连接不能跨线程共享，每个线程一个连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS fields ("
+            "ticker TEXT NOT NULL, field TEXT NOT NULL, value TEXT, fetched_at REAL NOT NULL, "
+            "PRIMARY KEY (ticker, field))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS refresh_leases ("
+            "ticker TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def load(self, ticker):
+        """
+        读取 ticker 的全部缓存字段。
+        返回 (info, stale_fields)；从未完整获取过基本面时 info 为空字典。
+        """
+        now = time.time()
+        rows = self._conn().execute(
+            "SELECT field, value, fetched_at FROM fields WHERE ticker = ?", (ticker,)
+        ).fetchall()
+
+        info = {}
+        stale_fields = set()
+        has_snapshot = False
+        for field, value, fetched_at in rows:
+            if field == SNAPSHOT_FIELD:
+                has_snapshot = True
+            else:
+                info[field] = json.loads(value)
+            if now - fetched_at > field_ttl(field):
+                stale_fields.add(field)
+
+        if not has_snapshot:
+            # 只有行情字段，没有基本面，等同于没有缓存
+            return {}, {SNAPSHOT_FIELD}
+        return info, stale_fields
+
+    def save(self, ticker, fields):
+        """
+        写入 (部分) 字段，只刷新给出字段的获取时间。
+        """
+        now = time.time()
+        self._write([(ticker, k, json.dumps(v, ensure_ascii=False, default=str), now) for k, v in fields.items()])
+
+    def save_snapshot(self, ticker, info):
+        """
+        写入一次完整的上游快照 (yfinance info)，并记录完整快照标记。
+        快照替换 ticker 的全部字段: 上游不再返回的字段 (例如亏损后的 trailingPE) 在同一事务中删除，
+        否则旧值会一直留在缓存里，并且因为过期而让每次读取都重新请求上游。
+        """
+        now = time.time()
+        fields = {**info, SNAPSHOT_FIELD: True}
+        self._write([(ticker, k, json.dumps(v, ensure_ascii=False, default=str), now) for k, v in fields.items()],
+                    replace=ticker)
+
+    def save_quotes(self, quotes):
+        """
+        把 Sina 批量行情 ({ticker: quote}) 写入行情字段，避免为刷新价格去请求 yfinance。
+        """
+        now = time.time()
+        rows = []
+        for ticker, quote in quotes.items():
+            if quote.get('current_price'):
+                rows.append((ticker, 'currentPrice', json.dumps(quote['current_price']), now))
+            if quote.get('pre_close'):
+                rows.append((ticker, 'previousClose', json.dumps(quote['pre_close']), now))
+        self._write(rows)
+
+    def _write(self, rows, replace=None):
+        """
+        replace 为 ticker 时先删除它的全部字段，写入的 rows 成为该 ticker 的完整内容。
+        """
+        if not rows:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if replace is not None:
+                conn.execute("DELETE FROM fields WHERE ticker = ?", (replace,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO fields (ticker, field, value, fetched_at) VALUES (?, ?, ?, ?)", rows
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire_refresh(self, ticker, lease_seconds=30):
+        """
+        尝试获取 ticker 的刷新租约。同一时间只有一个 worker 能拿到，
+        拿到的 worker 负责请求上游并写回缓存。
+        """
+        owner = f"{os.getpid()}:{threading.get_ident()}"
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT owner, expires_at FROM refresh_leases WHERE ticker = ?", (ticker,)
+            ).fetchone()
+            if row and row[1] > now and row[0] != owner:
+                conn.execute("COMMIT")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO refresh_leases (ticker, owner, expires_at) VALUES (?, ?, ?)",
+                (ticker, owner, now + lease_seconds)
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release_refresh(self, ticker):
+        owner = f"{os.getpid()}:{threading.get_ident()}"
+        self._conn().execute(
+            "DELETE FROM refresh_leases WHERE ticker = ? AND owner = ?", (ticker, owner)
+        )
+
+def get_fundamentals_store():
+    """
+    MARKET_CACHE_PATH 指定缓存文件位置；设置为空字符串可关闭磁盘缓存。
+    """
+    db_path = os.environ.get("MARKET_CACHE_PATH", "data/market_cache.db")
+    if not db_path:
+        return None
+    try:
+        return FundamentalsStore(db_path)
+    except Exception as e:
+        print(f"Error opening market cache {db_path}: {e}")
+        return None
@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+import numpy as np
+from .schedule import market_now
+
+try:
+    import fcntl
+except ImportError:  # Windows: 退化为进程内锁
+    fcntl = None
+
+COLUMNS = ('open', 'high', 'low', 'close', 'volume', 'dividends')
+DATE_DTYPE = 'datetime64[D]'
+VALUE_DTYPE = np.float64
+# 首次同步拉取的年数
+DEFAULT_HISTORY_YEARS = 10
+# 两次增量同步之间的最短间隔 (秒)
+SYNC_INTERVAL = 6 * 3600
+
+class HistoryStore:
+    """
+    本地日线历史 (OHLCV + 分红) 存储。
+    每个 ticker 一个目录，每列一个追加写的定长二进制文件 (date.bin, open.bin ...)，
+    meta.json 记录已提交的行数。读取通过 np.memmap 按日期区间零拷贝切片，
+    不需要为每个 ticker 常驻 pandas DataFrame。
+    """
+    def __init__(self, root=None):
+        self.root = root or os.environ.get("HISTORY_DIR", "data/history")
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._maps = {}  # ticker -> (rows, {column: memmap})
+
+    def _dir(self, ticker):
+        return os.path.join(self.root, ticker.replace('/', '_'))
+
+    def _meta_path(self, ticker):
+        return os.path.join(self._dir(ticker), 'meta.json')
+
+    def _column_path(self, ticker, column):
+        return os.path.join(self._dir(ticker), f'{column}.bin')
+
+    def load_meta(self, ticker):
+        path = self._meta_path(ticker)
+        if not os.path.exists(path):
+            return {"rows": 0, "last_date": None, "synced_at": 0}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_meta(self, ticker, meta):
+        path = self._meta_path(ticker)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def _columns(self, ticker):
+        """
+        返回 (rows, {column: memmap})。meta 中的行数才算已提交，文件尾部多余的字节忽略。
+        """
+        meta = self.load_meta(ticker)
+        rows = meta["rows"]
+        with self._lock:
+            cached = self._maps.get(ticker)
+            if cached and cached[0] == rows:
+                return cached
+        maps = {}
+        if rows:
+            maps['date'] = np.memmap(self._column_path(ticker, 'date'), dtype=DATE_DTYPE, mode='r', shape=(rows,))
+            for column in COLUMNS:
+                maps[column] = np.memmap(self._column_path(ticker, column), dtype=VALUE_DTYPE, mode='r', shape=(rows,))
+        with self._lock:
+            self._maps[ticker] = (rows, maps)
+        return rows, maps
+
+    def read(self, ticker, start=None, end=None):
+        """
+        读取 [start, end] 日期区间的数据，返回 {column: ndarray}，数组是 memmap 的切片视图。
+        start/end 可以是 'YYYY-MM-DD' 字符串、date 或 datetime64。
+        """
+        rows, maps = self._columns(ticker)
+        if not rows:
+            empty = {'date': np.array([], dtype=DATE_DTYPE)}
+            empty.update({c: np.array([], dtype=VALUE_DTYPE) for c in COLUMNS})
+            return empty
+
+        dates = maps['date']
+        lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, 'D'), side='left'))
+        hi = rows if end is None else int(np.searchsorted(dates, np.datetime64(end, 'D'), side='right'))
+        return {column: array[lo:hi] for column, array in maps.items()}
+
+    def append(self, ticker, history):
+        """
+        追加新数据。history 为 {'date': datetime64[D] 数组, 'open': ..., ...}，
+        只写入晚于已有最后日期的行。返回新增行数。
+        """
+        dates = np.asarray(history.get('date', []), dtype=DATE_DTYPE)
+        if not len(dates):
+            return 0
+
+        meta = self.load_meta(ticker)
+        order = np.argsort(dates, kind='stable')
+        dates = dates[order]
+        keep = np.ones(len(dates), dtype=bool)
+        keep[1:] = dates[1:] != dates[:-1]
+        if meta["last_date"]:
+            keep &= dates > np.datetime64(meta["last_date"], 'D')
+        if not keep.any():
+            return 0
+
+        os.makedirs(self._dir(ticker), exist_ok=True)
+        rows = meta["rows"]
+        new_columns = {'date': dates[keep]}
+        for column in COLUMNS:
+            values = np.asarray(history.get(column, np.zeros(len(order))), dtype=VALUE_DTYPE)[order]
+            new_columns[column] = values[keep]
+
+        for column, values in new_columns.items():
+            path = self._column_path(ticker, column)
+            with open(path, 'ab') as f:
+                # 上次写入中途崩溃时，先截掉未提交的尾部
+                f.truncate(rows * values.dtype.itemsize)
+                f.write(values.tobytes())
+
+        added = int(keep.sum())
+        meta.update({"rows": rows + added, "last_date": str(new_columns['date'][-1])})
+        self._save_meta(ticker, meta)
+        return added
+
+    def sync(self, ticker, provider, force=False):
+        """
+        增量同步: 只向 provider 请求上次同步之后的交易日。返回新增行数。
+        只保存今天之前的日线: 盘中拉到的当日数据还会变化，而下次同步从 last_date 的下一天开始，
+        写入后就不会再被修正。
+        """
+        with self._file_lock(ticker):
+            meta = self.load_meta(ticker)
+            if not force and time.time() - meta.get("synced_at", 0) < SYNC_INTERVAL:
+                return 0
+
+            # 交易日按交易所时区划分，服务器时区不同时也不会把当天未收盘的 K 线写进去
+            today = market_now().date()
+            if meta["last_date"]:
+                start = date.fromisoformat(meta["last_date"]) + timedelta(days=1)
+            else:
+                start = today - timedelta(days=365 * DEFAULT_HISTORY_YEARS)
+            if start >= today:
+                added = 0
+            else:
+                history = provider.get_history(ticker, start=start.isoformat())
+                if len(history.get('date', [])):
+                    complete = np.asarray(history['date'], dtype=DATE_DTYPE) < np.datetime64(today, 'D')
+                    history = {k: np.asarray(v)[complete] for k, v in history.items()}
+                added = self.append(ticker, history)
+
+            meta = self.load_meta(ticker)
+            meta["synced_at"] = time.time()
+            os.makedirs(self._dir(ticker), exist_ok=True)
+            self._save_meta(ticker, meta)
+            return added
+
+    def _file_lock(self, ticker):
+        return _TickerLock(os.path.join(self.root, ticker.replace('/', '_') + '.lock'), self._write_lock)
+
+class _TickerLock:
+    """
+    跨进程的 ticker 级写锁 (fcntl)，保证多个 worker 不会重复追加同一段数据。
+    """
+    def __init__(self, path, fallback_lock):
+        self.path = path
+        self.fallback_lock = fallback_lock
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is None:
+            self.fallback_lock.acquire()
+            return self
+        self._file = open(self.path, 'a')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is None:
+            self.fallback_lock.release()
+            return
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
@@ -0,0 +1,50 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Number of per-host pools kept alive, and connections kept per host
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 10))
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 20))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", 2))
+HTTP_BACKOFF = float(os.environ.get("HTTP_BACKOFF", 0.3))
+
+_sessions = {}  # retries -> session
+_session_lock = threading.Lock()
+
+def get_session(retries=HTTP_RETRIES):
+    """
+    Shared keep-alive session for all outbound HTTP traffic.
+    Repeated calls to the same host (hq.sinajs.cn, image CDNs...) reuse pooled
+    connections instead of paying a TCP/TLS handshake every time.
+    Latency-sensitive callers with short timeouts pass retries=0 so a slow
+    upstream costs one timeout, not one per retry plus backoff.
+    """
+    session = _sessions.get(retries)
+    if session is None:
+        with _session_lock:
+            session = _sessions.get(retries)
+            if session is None:
+                session = _sessions[retries] = _build_session(retries)
+    return session
+
+def _build_session(retries):
+    if retries:
+        max_retries = Retry(
+            total=retries,
+            backoff_factor=HTTP_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD'])
+        )
+    else:
+        max_retries = 0
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=max_retries
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
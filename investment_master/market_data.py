@@ -0,0 +1,303 @@
+import json
+import os
+import random
+import time
+import numpy as np
+import yfinance as yf
+from .quotes import fetch_sina_quotes
+from .resilience import NegativeCache, CircuitBreaker, CircuitOpenError, is_upstream_error
+
+class MarketDataProvider:
+    """
+    行情/基本面数据源接口。
+    get_info 返回 yfinance info 风格的字典；
+    get_quotes 返回 {ticker: {"name", "current_price", "pre_close", "day_change_percent"}}，
+    无法报价的 ticker 不出现在结果中。
+    cacheable 为 False 时，调用方不应在它前面加磁盘缓存 (FundamentalsStore)。
+    """
+    cacheable = True
+
+    def get_info(self, ticker):
+        raise NotImplementedError
+
+    def get_quotes(self, tickers):
+        raise NotImplementedError
+
+    def get_history(self, ticker, start=None):
+        """
+        日线历史，返回 {'date': datetime64[D] 数组, 'open', 'high', 'low', 'close', 'volume', 'dividends'}。
+        """
+        raise NotImplementedError
+
+    def get_reported_fundamentals(self, ticker):
+        """
+        历年财报数据，按报告期升序: {'date': 报告期末 datetime64[D] 数组, 'eps', 'bvps', 'roe'}。
+        """
+        raise NotImplementedError
+
+def _history_from_frame(df):
+    if df is None or df.empty:
+        return {}
+    index = df.index
+    if getattr(index, 'tz', None) is not None:
+        index = index.tz_localize(None)
+    history = {'date': index.values.astype('datetime64[D]')}
+    for column in ('Open', 'High', 'Low', 'Close', 'Volume', 'Dividends'):
+        if column in df:
+            history[column.lower()] = df[column].to_numpy(dtype=float)
+        else:
+            history[column.lower()] = np.zeros(len(df))
+    return history
+
+def _statement_row(frame, *names):
+    for name in names:
+        if frame is not None and name in frame.index:
+            return frame.loc[name]
+    return None
+
+def _reported_from_statements(income, balance):
+    """
+    把 yfinance 的年报利润表/资产负债表 (列为报告期) 转成按报告期升序的数组。
+    """
+    if income is None or income.empty:
+        return {}
+    eps = _statement_row(income, 'Diluted EPS', 'Basic EPS')
+    net_income = _statement_row(income, 'Net Income Common Stockholders', 'Net Income')
+    equity = _statement_row(balance, 'Common Stock Equity', 'Stockholders Equity')
+    shares = _statement_row(balance, 'Ordinary Shares Number', 'Share Issued')
+
+    periods = sorted(income.columns)
+    def column(row, period):
+        if row is None or period not in row.index:
+            return np.nan
+        value = row[period]
+        return float(value) if value == value else np.nan
+
+    eps_values = np.array([column(eps, p) for p in periods])
+    equity_values = np.array([column(equity, p) for p in periods])
+    shares_values = np.array([column(shares, p) for p in periods])
+    income_values = np.array([column(net_income, p) for p in periods])
+    with np.errstate(all='ignore'):
+        bvps = equity_values / shares_values
+        roe = income_values / equity_values
+    return {
+        'date': np.array([np.datetime64(p.date(), 'D') for p in periods]),
+        'eps': eps_values,
+        'bvps': bvps,
+        'roe': roe
+    }
+
+class YFinanceProvider(MarketDataProvider):
+    """
+    yfinance 基本面。无法解析的代码进入负缓存按退避跳过；
+    连续的上游故障 (网络、5xx、429) 触发熔断，期间直接抛 CircuitOpenError。
+    单个代码的错误只进负缓存，几只坏代码不会断开所有 ticker 共用的熔断器。
+    """
+    def __init__(self, negative_cache=None, breaker=None):
+        self.negative_cache = negative_cache or NegativeCache()
+        self.breaker = breaker or CircuitBreaker('yfinance', is_failure=is_upstream_error)
+
+    def get_info(self, ticker):
+        if self.negative_cache.is_blocked(ticker):
+            return {}
+        try:
+            info = self.breaker.call(self._fetch_info, ticker)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            # 上游故障交给熔断器，不屏蔽这只代码
+            if not is_upstream_error(e):
+                self.negative_cache.record_failure(ticker)
+            raise
+
+        if not self._is_resolved(info):
+            self.negative_cache.record_failure(ticker)
+            return {}
+        self.negative_cache.record_success(ticker)
+        return info
+
+    def _fetch_info(self, ticker):
+        return yf.Ticker(ticker).info or {}
+
+    def get_history(self, ticker, start=None):
+        if self.negative_cache.is_blocked(ticker):
+            return {}
+        df = self.breaker.call(yf.Ticker(ticker).history, start=start, auto_adjust=False, actions=True)
+        return _history_from_frame(df)
+
+    def get_reported_fundamentals(self, ticker):
+        if self.negative_cache.is_blocked(ticker):
+            return {}
+        t = yf.Ticker(ticker)
+        income = self.breaker.call(lambda: t.income_stmt)
+        balance = self.breaker.call(lambda: t.balance_sheet)
+        return _reported_from_statements(income, balance)
+
+    def _is_resolved(self, info):
+        # 不认识的代码 yfinance 往往只返回一两个空字段
+        return any(info.get(k) is not None for k in ('quoteType', 'currentPrice', 'previousClose', 'regularMarketPrice'))
+
+    def get_quotes(self, tickers):
+        quotes = {}
+        for ticker in tickers:
+            try:
+                info = self.get_info(ticker)
+            except Exception as e:
+                print(f"获取 {ticker} 行情失败: {e}")
+                continue
+            price = info.get('currentPrice') or info.get('previousClose')
+            if not price:
+                continue
+            pre_close = info.get('previousClose')
+            day_change_percent = 0.0
+            if pre_close:
+                day_change_percent = (price - pre_close) / pre_close * 100
+            quotes[ticker] = {
+                "name": info.get('shortName') or ticker,
+                "current_price": price,
+                "pre_close": pre_close,
+                "day_change_percent": day_change_percent
+            }
+        return quotes
+
+class SinaProvider(MarketDataProvider):
+    """
+    新浪行情，只提供 A 股批量报价，没有基本面数据。
+    """
+    def get_info(self, ticker):
+        raise NotImplementedError("Sina 数据源不提供基本面数据")
+
+    def get_quotes(self, tickers):
+        return fetch_sina_quotes(tickers)
+
+class LiveProvider(MarketDataProvider):
+    """
+    线上默认组合: 基本面来自 yfinance，行情来自新浪批量接口。
+    """
+    def __init__(self, info_source=None, quote_source=None):
+        self.info_source = info_source or YFinanceProvider()
+        self.quote_source = quote_source or SinaProvider()
+
+    def get_info(self, ticker):
+        return self.info_source.get_info(ticker)
+
+    def get_quotes(self, tickers):
+        return self.quote_source.get_quotes(tickers)
+
+    def get_history(self, ticker, start=None):
+        return self.info_source.get_history(ticker, start=start)
+
+    def get_reported_fundamentals(self, ticker):
+        return self.info_source.get_reported_fundamentals(ticker)
+
+class ReplayProvider(MarketDataProvider):
+    """
+    录制/回放数据源，用于离线、可重复的基准测试和压测。
+    record=True 时透传给 upstream 并把响应写入 fixture_dir；
+    否则只从 fixture_dir 读取，缺失的 ticker 视为无数据。
+    latency/jitter (秒) 用于模拟上游延迟，seed 保证延迟序列可复现。
+    不使用磁盘缓存: 回放结果只取决于录制文件，录制时每次请求都会到达 upstream 并写入文件。
+    """
+    cacheable = False
+
+    def __init__(self, fixture_dir, upstream=None, record=False, latency=0.0, jitter=0.0, seed=0):
+        self.fixture_dir = fixture_dir
+        self.upstream = upstream
+        self.record = record
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        if record and upstream is None:
+            raise ValueError("record 模式需要 upstream 数据源")
+
+    def _path(self, kind, ticker):
+        return os.path.join(self.fixture_dir, kind, ticker.replace('/', '_') + '.json')
+
+    def _read(self, kind, ticker):
+        path = self._path(kind, ticker)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write(self, kind, ticker, data):
+        path = self._path(kind, ticker)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False, default=str)
+
+    def _sleep(self):
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def get_info(self, ticker):
+        if self.record:
+            info = self.upstream.get_info(ticker)
+            self._write('info', ticker, info)
+            return info
+        self._sleep()
+        return self._read('info', ticker) or {}
+
+    def get_quotes(self, tickers):
+        if self.record:
+            quotes = self.upstream.get_quotes(tickers)
+            for ticker, quote in quotes.items():
+                self._write('quotes', ticker, quote)
+            return quotes
+        self._sleep()
+        quotes = {}
+        for ticker in tickers:
+            quote = self._read('quotes', ticker)
+            if quote:
+                quotes[ticker] = quote
+        return quotes
+
+    def get_history(self, ticker, start=None):
+        if self.record:
+            history = self.upstream.get_history(ticker, start=start)
+            self._write('history', ticker, _arrays_to_json(history))
+            return history
+        self._sleep()
+        recorded = self._read('history', ticker)
+        if not recorded:
+            return {}
+        history = _arrays_from_json(recorded)
+        if start:
+            mask = history['date'] >= np.datetime64(start, 'D')
+            history = {k: values[mask] for k, values in history.items()}
+        return history
+
+    def get_reported_fundamentals(self, ticker):
+        if self.record:
+            reported = self.upstream.get_reported_fundamentals(ticker)
+            self._write('reported', ticker, _arrays_to_json(reported))
+            return reported
+        self._sleep()
+        recorded = self._read('reported', ticker)
+        return _arrays_from_json(recorded) if recorded else {}
+
+def _arrays_to_json(arrays):
+    return {k: [str(v) for v in values] if k == 'date' else [None if v != v else float(v) for v in values]
+            for k, values in arrays.items()}
+
+def _arrays_from_json(data):
+    return {k: np.asarray(values, dtype='datetime64[D]' if k == 'date' else float) for k, values in data.items()}
+
+def get_market_data_provider():
+    """
+    MARKET_DATA_PROVIDER: live (默认) / record / replay
+    MARKET_DATA_FIXTURES: 录制文件目录，默认 data/fixtures
+    MARKET_DATA_LATENCY_MS / MARKET_DATA_JITTER_MS: 回放时注入的延迟
+    """
+    mode = os.environ.get("MARKET_DATA_PROVIDER", "live")
+    if mode not in ("record", "replay"):
+        return LiveProvider()
+
+    fixture_dir = os.environ.get("MARKET_DATA_FIXTURES", "data/fixtures")
+    latency = float(os.environ.get("MARKET_DATA_LATENCY_MS", 0)) / 1000.0
+    jitter = float(os.environ.get("MARKET_DATA_JITTER_MS", 0)) / 1000.0
+    print(f"Using {mode} market data provider ({fixture_dir})")
+    if mode == "record":
+        return ReplayProvider(fixture_dir, upstream=LiveProvider(), record=True)
+    return ReplayProvider(fixture_dir, latency=latency, jitter=jitter)
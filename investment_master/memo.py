@@ -0,0 +1,129 @@
+import copy
+import functools
+import hashlib
+import inspect
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+# 估值结果缓存的条目上限 (所有模型共用)
+MEMO_SIZE = int(os.environ.get("VALUATION_MEMO_SIZE", 2048))
+# 估值结果缓存的内存上限 (按结果结构估算的字节数)，单条超过上限 1/8 的结果不缓存
+MEMO_BYTES = int(os.environ.get("VALUATION_MEMO_BYTES", 32 * 1024 * 1024))
+
+# 区分 "字段不存在" 和 "字段为 None" (例如 info.get('sharesOutstanding', 1) 的默认值)
+_MISSING = '<missing>'
+
+class ModelMemo:
+    """
+    估值模型结果的 LRU 缓存。
+    key 是模型名 + 该模型读取的 info 字段值 + 模型参数的哈希，
+    同一份输入无论来自哪只股票、哪个请求都只计算一次；输入字段变化时自然失效。
+    写入时复制一次，命中时直接返回缓存的对象 (多个请求共享)，调用方不能修改返回的结果。
+    同时按条目数和估算字节数淘汰最久未用的条目。
+    """
+    def __init__(self, maxsize=MEMO_SIZE, maxbytes=MEMO_BYTES):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def fingerprint(model, info, fields, args=(), kwargs=None):
+        inputs = [(f, info.get(f, _MISSING)) for f in fields]
+        # ndarray 的 repr 会省略中间元素，先转成完整列表
+        args = [_plain(a) for a in args]
+        params = (args, sorted((k, _plain(v)) for k, v in (kwargs or {}).items()))
+        return hashlib.blake2b(repr((model, inputs, params)).encode('utf-8'), digest_size=16).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key][0]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        size = _approx_size(value)
+        if size > self.maxbytes // 8:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            while len(self._entries) > self.maxsize or self.nbytes > self.maxbytes:
+                self.nbytes -= self._entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "bytes": self.nbytes,
+                "maxbytes": self.maxbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None
+            }
+
+def _approx_size(value):
+    """
+    估算结果占用的字节数 (容器本身加上元素)，数组按 nbytes 计
+    """
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_approx_size(k) + _approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_approx_size(v) for v in value)
+    if hasattr(value, 'nbytes'):
+        return value.nbytes
+    return sys.getsizeof(value)
+
+def _plain(value):
+    if isinstance(value, dict):
+        return sorted((k, _plain(v)) for k, v in value.items())
+    return value.tolist() if hasattr(value, 'tolist') else value
+
+def memoize_model(*fields):
+    """
+    Valuator 方法装饰器: 方法需要有 ticker 和 info 参数，调用方式 (位置或关键字) 与原方法一致。
+    fields 列出该模型读取的全部 info 字段，只有这些字段或参数变化时才重新计算。
+    参数按原方法签名补齐默认值后参与哈希，显式传入默认值和省略该参数命中同一条缓存。
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            try:
+                arguments['info'] = self.get_info(arguments['ticker'], arguments['info'])
+            except Exception as e:
+                # 取数失败直接返回错误，不缓存，也不再让模型重复取数
+                return {"error": f"获取基本面数据失败: {e}"}
+
+            params = {k: v for k, v in arguments.items() if k not in ('self', 'ticker', 'info')}
+            key = ModelMemo.fingerprint(method.__name__, arguments['info'], fields, kwargs=params)
+            found, result = self.memo.get(key)
+            if found:
+                return result
+            result = method(*bound.args, **bound.kwargs)
+            self.memo.put(key, result)
+            return result
+        return wrapper
+    return decorator
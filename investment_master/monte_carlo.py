@@ -0,0 +1,75 @@
+from functools import lru_cache
+import numpy as np
+from .batch_valuation import dcf_fair_value
+
+# 默认分布假设: 增长率、WACC 为正态分布，FCF 利润率按相对波动扰动
+DEFAULT_PARAMS = {
+    "growth_mean": 0.05,
+    "growth_sd": 0.02,
+    "wacc_mean": 0.10,
+    "wacc_sd": 0.01,
+    "margin_sd": 0.20,
+    "terminal_growth": 0.02,
+    "years": 5
+}
+DEFAULT_PATHS = 100000
+# 单次模拟的路径上限，限制每个请求的 CPU / 内存开销
+MAX_PATHS = 1000000
+DEFAULT_BINS = 40
+PERCENTILES = (5, 25, 50, 75, 95)
+# WACC 至少比永续增长率高这么多，避免终值分母接近 0 时爆炸
+MIN_SPREAD = 0.01
+QUANTILE_GRID = np.linspace(0, 1, 1001)
+
+def simulate_dcf(fcf, shares, revenue=None, paths=DEFAULT_PATHS, seed=42, bins=DEFAULT_BINS, **params):
+    """
+    蒙特卡洛 DCF。同一组输入 (fcf, shares, revenue, 参数, 路径数, 种子) 的结果会被缓存，
+    返回的是副本，调用方可以随意修改。
+    """
+    merged = dict(DEFAULT_PARAMS)
+    merged.update(params)
+    result = _simulate(
+        float(fcf), float(shares), float(revenue) if revenue else None,
+        int(min(paths, MAX_PATHS)), int(seed), int(bins),
+        tuple(sorted(merged.items()))
+    )
+    return dict(result, histogram=dict(result["histogram"]), percentiles=dict(result["percentiles"]))
+
+def cache_info():
+    return _simulate.cache_info()
+
+@lru_cache(maxsize=256)
+def _simulate(fcf, shares, revenue, paths, seed, bins, params):
+    p = dict(params)
+    rng = np.random.default_rng(seed)
+
+    growth = rng.normal(p["growth_mean"], p["growth_sd"], paths)
+    wacc = np.maximum(rng.normal(p["wacc_mean"], p["wacc_sd"], paths), p["terminal_growth"] + MIN_SPREAD)
+    # FCF = 收入 x FCF 利润率；利润率按相对波动抽样，等价于对起始 FCF 做同比例扰动
+    margin_shock = np.maximum(1 + rng.normal(0, p["margin_sd"], paths), 0)
+    fair_values = dcf_fair_value(fcf * margin_shock, shares, growth, wacc, p["terminal_growth"], p["years"])
+
+    percentile_values = np.percentile(fair_values, PERCENTILES)
+    # 直方图只覆盖 P1-P99，避免少数极端路径把分箱拉得过宽
+    low, high = np.percentile(fair_values, (1, 99))
+    counts, edges = np.histogram(fair_values, bins=bins, range=(low, high))
+
+    return {
+        "parameters": dict(p, initial_fcf=fcf, shares_outstanding=shares, paths=paths, seed=seed,
+                           fcf_margin=round(fcf / revenue, 4) if revenue else None),
+        "mean": round(float(fair_values.mean()), 2),
+        "std": round(float(fair_values.std()), 2),
+        "percentiles": {f"p{q}": round(float(v), 2) for q, v in zip(PERCENTILES, percentile_values)},
+        "histogram": {
+            "counts": counts.tolist(),
+            "bin_edges": np.round(edges, 2).tolist()
+        },
+        # 千分位分布，用于估算任意价格下被高估的概率，不缓存全部路径
+        "_quantiles": np.percentile(fair_values, QUANTILE_GRID * 100)
+    }
+
+def probability_below(result, price):
+    """
+    公允价值低于 price 的路径占比 (即以 price 买入被高估的概率)。
+    """
+    return float(np.interp(price, result["_quantiles"], QUANTILE_GRID))
@@ -1,196 +1,324 @@
-import json
+import copy
 import os
+import threading
+import uuid
 from .storage import get_storage
 
+DEFAULT_GROUP = {"id": "default", "name": "默认分组"}
+
+def _base_code(ticker):
+    # 600036.SS -> 600036，用于不带后缀的代码匹配
+    return ticker.split('.')[0]
+
 class PortfolioManager:
-    def __init__(self, data_file='data/portfolio.json'):
-        self.storage = get_storage(data_file)
+    """
+    持仓、分组和自选股。
+    数据在内存中常驻，并按 (ticker, group_id)、基础代码 (不含后缀) 和分组建立索引；
+    迁移只在加载时执行一次，每次修改直接写回存储。
+    文档带有 revision 字段，每次写入加一；其他进程 (例如命令行) 写入后，下次读写前自动重新加载:
+    文件存储比较修改时间，其他存储 (MongoDB) 比较 revision。
+    """
+    def __init__(self, data_file='data/portfolio.json', storage=None):
+        self.storage = storage or get_storage(data_file)
+        self._lock = threading.RLock()
+        self._mtime = None
+        self._revision = None
+        self._load()
         # Ensure initial structure if empty
-        data = self.load_data()
-        if not data.get("holdings") and not data.get("watchlist"):
-             self.ensure_initial_data()
+        if not self._data["holdings"] and not self._data["watchlist"]:
+            self.ensure_initial_data()
 
     def ensure_initial_data(self):
-         initial_data = {
-            "holdings": [],
-            "watchlist": [],
-            "groups": [{"id": "default", "name": "默认分组"}]
-         }
-         self.save_data(initial_data)
-
-    def load_data(self):
-        """Load portfolio data from storage."""
-        data = self.storage.load()
-        if not data:
-            return {
-                "holdings": [], 
+        with self._lock:
+            self._data = {
+                "holdings": [],
                 "watchlist": [],
-                "groups": [{"id": "default", "name": "默认分组"}]
+                "groups": [dict(DEFAULT_GROUP)]
             }
-            
+            self._reindex()
+            self._save()
+
+    def _file_mtime(self):
+        path = getattr(self.storage, 'file_path', None)
+        if not path:
+            return None
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def _load(self):
+        with self._lock:
+            self._mtime = self._file_mtime()
+            data = self.storage.load() or {}
+            self._data = data
+            self._revision = data.get("revision")
+            if self._migrate(data):
+                self._save()
+            self._reindex()
+
+    def _migrate(self, data):
+        """
+        旧数据格式迁移，返回是否有改动。
+        """
+        migrated = False
+        for key in ("holdings", "watchlist"):
+            if key not in data:
+                data[key] = []
+                migrated = True
         # Migration: Ensure groups exist
-        if "groups" not in data:
-            data["groups"] = [{"id": "default", "name": "默认分组"}]
-        
+        if not data.get("groups"):
+            data["groups"] = [dict(DEFAULT_GROUP)]
+            migrated = True
+
         # Always ensure holdings have group_id and handle cost key migration
-        migrated = False
-        for h in data.get("holdings", []):
-            if "group_id" not in h:
+        for h in data["holdings"]:
+            if not h.get("group_id"):
                 h["group_id"] = "default"
                 migrated = True
             # Migrate cost_basis -> cost
             if "cost_basis" in h and "cost" not in h:
                 h["cost"] = h.pop("cost_basis")
                 migrated = True
-        
-        if migrated: 
-            self.save_data(data)
-            
-        return data
+
+        # 自选股统一为代码字符串 (早期版本可能写入了 {"ticker", "name"})
+        watchlist = []
+        for item in data["watchlist"]:
+            ticker = item.get("ticker") if isinstance(item, dict) else item
+            if isinstance(item, dict):
+                migrated = True
+            if ticker and ticker not in watchlist:
+                watchlist.append(ticker)
+            elif ticker:
+                migrated = True
+        data["watchlist"] = watchlist
+        return migrated
+
+    def _reindex(self):
+        self._by_key = {}    # (ticker, group_id) -> holding
+        self._by_base = {}   # 基础代码 -> [holding]，保持列表顺序
+        self._by_group = {}  # group_id -> [holding]
+        for h in self._data["holdings"]:
+            self._index(h)
+        self._groups = {g["id"]: g for g in self._data["groups"]}
+        self._watchlist = set(self._data["watchlist"])
+
+    def _index(self, h):
+        self._by_key[(h["ticker"], h["group_id"])] = h
+        self._by_base.setdefault(_base_code(h["ticker"]), []).append(h)
+        self._by_group.setdefault(h["group_id"], []).append(h)
+
+    def _unindex(self, h):
+        self._by_key.pop((h["ticker"], h["group_id"]), None)
+        for index, key in ((self._by_base, _base_code(h["ticker"])), (self._by_group, h["group_id"])):
+            items = index.get(key, [])
+            items[:] = [x for x in items if x is not h]
+            if not items:
+                index.pop(key, None)
+
+    def _refresh(self):
+        if getattr(self.storage, 'file_path', None):
+            if self._file_mtime() != self._mtime:
+                self._load()
+        elif self.storage.revision() != self._revision:
+            self._load()
+
+    def load_data(self):
+        """Return a copy of the portfolio document (reloaded if another process changed it)."""
+        with self._lock:
+            self._refresh()
+            return copy.deepcopy(self._data)
 
     def save_data(self, data):
-        """Save portfolio data to storage."""
-        self.storage.save(data)
+        """Replace the whole portfolio document and write it to storage."""
+        with self._lock:
+            self._data = copy.deepcopy(data)
+            data = self._data
+            self._migrate(data)
+            self._reindex()
+            self._save()
+
+    def _save(self):
+        self._revision = (self._revision or 0) + 1
+        self._data["revision"] = self._revision
+        self.storage.save(self._data)
+        self._mtime = self._file_mtime()
 
     def get_holdings(self):
-        return self.load_data().get("holdings", [])
-        
+        with self._lock:
+            self._refresh()
+            return [dict(h) for h in self._data["holdings"]]
+
     def get_groups(self):
-        return self.load_data().get("groups", [])
+        with self._lock:
+            self._refresh()
+            return [dict(g) for g in self._data["groups"]]
 
     def get_watchlist(self):
-        return self.load_data().get("watchlist", [])
+        with self._lock:
+            self._refresh()
+            return list(self._data["watchlist"])
+
+    def get_holding_name(self, ticker):
+        """持仓中保存的名称 (按 ticker 精确匹配，取列表中第一个有名称的)，没有时返回 None"""
+        with self._lock:
+            self._refresh()
+            for h in self._by_base.get(_base_code(ticker), []):
+                if h["ticker"] == ticker and h.get("name"):
+                    return h["name"]
+            return None
 
     def add_group(self, name):
-        data = self.load_data()
-        import uuid
-        group_id = str(uuid.uuid4())
-        data["groups"].append({"id": group_id, "name": name})
-        self.save_data(data)
-        return group_id
+        with self._lock:
+            self._refresh()
+            group_id = str(uuid.uuid4())
+            group = {"id": group_id, "name": name}
+            self._data["groups"].append(group)
+            self._groups[group_id] = group
+            self._save()
+            return group_id
 
     def rename_group(self, group_id, new_name):
-        data = self.load_data()
-        for g in data["groups"]:
-            if g["id"] == group_id:
-                g["name"] = new_name
-                self.save_data(data)
-                return True
-        return False
+        with self._lock:
+            self._refresh()
+            group = self._groups.get(group_id)
+            if group is None:
+                return False
+            group["name"] = new_name
+            self._save()
+            return True
 
     def delete_group(self, group_id):
         if group_id == 'default':
             return False # Cannot delete default
-        
-        data = self.load_data()
-        # Remove group
-        data["groups"] = [g for g in data["groups"] if g["id"] != group_id]
-        
-        # Move items to default
-        for h in data["holdings"]:
-            if h.get("group_id") == group_id:
-                h["group_id"] = "default"
-                
-        self.save_data(data)
-        return True
-        
+
+        with self._lock:
+            self._refresh()
+            # Remove group
+            self._data["groups"] = [g for g in self._data["groups"] if g["id"] != group_id]
+            self._groups.pop(group_id, None)
+
+            # Move items to default
+            for h in list(self._by_group.get(group_id, [])):
+                self._regroup(h, "default")
+
+            self._save()
+            return True
+
     def reorder_groups(self, group_ids):
-        data = self.load_data()
-        # Sort groups based on the provided ID list order
-        # group_ids is a list of ids in desired order
-        
-        # Create a map for current groups
-        group_map = {g["id"]: g for g in data["groups"]}
-        
-        new_groups = []
-        for gid in group_ids:
-            if gid in group_map:
-                new_groups.append(group_map[gid])
-                
-        # Append any groups that were missing in the input list (safety)
-        existing_ids = set(group_ids)
-        for g in data["groups"]:
-            if g["id"] not in existing_ids:
-                new_groups.append(g)
-                
-        data["groups"] = new_groups
-        self.save_data(data)
-        return True
+        with self._lock:
+            self._refresh()
+            # Sort groups based on the provided ID list order
+            new_groups = [self._groups[gid] for gid in dict.fromkeys(group_ids) if gid in self._groups]
+
+            # Append any groups that were missing in the input list (safety)
+            existing_ids = set(group_ids)
+            new_groups += [g for g in self._data["groups"] if g["id"] not in existing_ids]
+
+            self._data["groups"] = new_groups
+            self._save()
+            return True
+
+    @staticmethod
+    def _merge_into(h, shares, cost):
+        # Weighted average cost
+        total_shares = h["shares"] + shares
+        total_cost = h["shares"] * h.get("cost", 0) + shares * cost
+        h["shares"] = total_shares
+        h["cost"] = total_cost / total_shares if total_shares else cost
+
+    def _regroup(self, h, group_id):
+        """
+        把持仓移到 group_id；目标分组已有同一代码时合并股数和成本。
+        """
+        if h["group_id"] == group_id:
+            return
+        existing = self._by_key.get((h["ticker"], group_id))
+        if existing is not None:
+            self._merge_into(existing, h["shares"], h.get("cost", 0))
+            self._unindex(h)
+            self._data["holdings"] = [x for x in self._data["holdings"] if x is not h]
+            return
+        # 基础代码不变，只更新 (ticker, group_id) 和分组索引，保持列表中的位置
+        self._by_key.pop((h["ticker"], h["group_id"]), None)
+        old_group = self._by_group.get(h["group_id"], [])
+        old_group[:] = [x for x in old_group if x is not h]
+        if not old_group:
+            self._by_group.pop(h["group_id"], None)
+        h["group_id"] = group_id
+        self._by_key[(h["ticker"], group_id)] = h
+        self._by_group.setdefault(group_id, []).append(h)
 
     def add_holding(self, ticker, shares, cost, group_id='default', note=None, name=None):
-        data = self.load_data()
-        # Check if already exists in this group
-        for h in data["holdings"]:
-            if h["ticker"] == ticker and h.get("group_id", "default") == group_id:
-                h["shares"] += shares
-                # Weighted average cost
-                # Ensure we use 'cost' key (load_data should have migrated it, but be safe)
-                current_cost = h.get("cost", 0)
-                total_cost = (h["shares"] - shares) * current_cost + shares * cost
-                h["cost"] = total_cost / h["shares"]
+        group_id = group_id or 'default'
+        with self._lock:
+            self._refresh()
+            # Check if already exists in this group
+            h = self._by_key.get((ticker, group_id))
+            if h is not None:
+                self._merge_into(h, shares, cost)
                 if name:
                     h["name"] = name # Update name if provided
                 if note is not None:
                     h["note"] = note
-                self.save_data(data)
+                self._save()
                 return True
-        
-        data["holdings"].append({
-            "ticker": ticker,
-            "shares": shares,
-            "cost": cost,
-            "group_id": group_id,
-            "name": name, # Save name
-            "note": note or ""
-        })
-        self.save_data(data)
-        return True
+
+            h = {
+                "ticker": ticker,
+                "shares": shares,
+                "cost": cost,
+                "group_id": group_id,
+                "name": name, # Save name
+                "note": note or ""
+            }
+            self._data["holdings"].append(h)
+            self._index(h)
+            self._save()
+            return True
 
     def move_holding(self, ticker, target_group_id):
-        data = self.load_data()
-        target_base = ticker.split('.')[0]
-        print(f"DEBUG: Manager moving {ticker} (base: {target_base}) to {target_group_id}")
-        for item in data["holdings"]:
-            current_ticker = item["ticker"]
-            current_base = current_ticker.split('.')[0]
-            if current_ticker == ticker or current_base == target_base:
-                print(f"DEBUG: Found match {current_ticker}, updating group_id to {target_group_id}")
-                item["group_id"] = target_group_id
-                self.save_data(data)
-                return True
-        print("DEBUG: No match found in holdings")
-        return False
+        with self._lock:
+            self._refresh()
+            # Match by exact ticker or base code (frontend may send either), first in list order
+            matches = self._by_base.get(_base_code(ticker))
+            if not matches:
+                print(f"No holding matches {ticker}")
+                return False
+            self._regroup(matches[0], target_group_id)
+            self._save()
+            return True
 
     def remove_holding(self, ticker):
-        data = self.load_data()
-        # Remove by exact match or base match
-        target_base = ticker.split('.')[0]
-        data["holdings"] = [
-            h for h in data["holdings"] 
-            if h["ticker"] != ticker and h["ticker"].split('.')[0] != target_base
-        ]
-        self.save_data(data)
-        return True
+        with self._lock:
+            self._refresh()
+            # Remove by exact match or base match
+            matches = list(self._by_base.get(_base_code(ticker), []))
+            if not matches:
+                return True
+            for h in matches:
+                self._unindex(h)
+            removed = {id(h) for h in matches}
+            self._data["holdings"] = [h for h in self._data["holdings"] if id(h) not in removed]
+            self._save()
+            return True
 
     def add_to_watchlist(self, ticker, name=None):
-        data = self.load_data()
-        for item in data["watchlist"]:
-            if item["ticker"] == ticker:
-                if name:
-                    item["name"] = name # Update name
-                    self.save_data(data)
+        # 自选股只保存代码，名称由行情接口提供
+        with self._lock:
+            self._refresh()
+            if ticker in self._watchlist:
                 return True # Already in watchlist
-        
-        data["watchlist"].append({
-            "ticker": ticker,
-            "name": name # Save name
-        })
-        self.save_data(data)
-        return True
+            self._data["watchlist"].append(ticker)
+            self._watchlist.add(ticker)
+            self._save()
+            return True
 
     def remove_from_watchlist(self, ticker):
-        data = self.load_data()
-        if ticker in data["watchlist"]:
-            data["watchlist"].remove(ticker)
-            self.save_data(data)
-        return True
+        with self._lock:
+            self._refresh()
+            if ticker in self._watchlist:
+                self._data["watchlist"].remove(ticker)
+                self._watchlist.discard(ticker)
+                self._save()
+            return True
@@ -0,0 +1,90 @@
+import numpy as np
+
+def _number(value):
+    # 价格获取失败的持仓 current_price 为 "N/A"
+    return float(value) if isinstance(value, (int, float)) else np.nan
+
+def _round(values):
+    return [round(float(v), 2) for v in values]
+
+def summarize_portfolio(holdings, groups):
+    """
+    对已补全行情的持仓做一次向量化汇总 (np.bincount 按分组求和):
+    每个分组和全部持仓的市值、成本、浮动盈亏、当日盈亏和占比，持仓行附带 weight (占总市值 %)。
+    分组顺序与 groups 一致；持仓引用了不存在的分组时追加在最后。
+    """
+    group_ids = [g['id'] for g in groups]
+    names = {g['id']: g.get('name', g['id']) for g in groups}
+    index = {gid: i for i, gid in enumerate(group_ids)}
+    for h in holdings:
+        gid = h.get('group_id') or 'default'
+        if gid not in index:
+            index[gid] = len(group_ids)
+            group_ids.append(gid)
+
+    n = len(holdings)
+    codes = np.fromiter((index[h.get('group_id') or 'default'] for h in holdings), dtype=np.intp, count=n)
+    price = np.fromiter((_number(h.get('current_price')) for h in holdings), dtype=float, count=n)
+    shares = np.fromiter((_number(h.get('shares')) for h in holdings), dtype=float, count=n)
+    cost = np.fromiter((_number(h.get('cost')) for h in holdings), dtype=float, count=n)
+    market_value = np.fromiter((_number(h.get('market_value')) for h in holdings), dtype=float, count=n)
+    day_gain = np.fromiter((_number(h.get('day_gain')) for h in holdings), dtype=float, count=n)
+    is_cash = np.fromiter((h.get('ticker') == 'CASH' for h in holdings), dtype=bool, count=n)
+
+    priced = ~np.isnan(price)
+    market_value = np.nan_to_num(market_value)
+    day_gain = np.nan_to_num(day_gain)
+    # 现金的 cost 是本金总额，股票的 cost 是每股成本；没有价格的持仓不计入成本和盈亏
+    cost_basis = np.where(priced, np.nan_to_num(np.where(is_cash, cost, cost * shares)), 0.0)
+    gain = np.where(priced, market_value - cost_basis, 0.0)
+
+    m = len(group_ids)
+    sums = {
+        "market_value": np.bincount(codes, weights=market_value, minlength=m),
+        "cost": np.bincount(codes, weights=cost_basis, minlength=m),
+        "gain": np.bincount(codes, weights=gain, minlength=m),
+        "day_gain": np.bincount(codes, weights=day_gain, minlength=m)
+    }
+    counts = np.bincount(codes, minlength=m)
+    total_value = market_value.sum()
+
+    with np.errstate(all='ignore'):
+        scale = 100.0 / total_value if total_value > 0 else 0.0
+        group_gain_percent = np.where(sums["cost"] > 0, sums["gain"] / sums["cost"] * 100, 0.0)
+        previous_value = sums["market_value"] - sums["day_gain"]
+        group_day_percent = np.where(previous_value > 0, sums["day_gain"] / previous_value * 100, 0.0)
+
+    group_values = {k: _round(v) for k, v in sums.items()}
+    group_weight = _round(sums["market_value"] * scale)
+    group_gain_percent = _round(group_gain_percent)
+    group_day_percent = _round(group_day_percent)
+    result_groups = [{
+        "id": gid,
+        "name": names.get(gid, gid),
+        "count": int(counts[i]),
+        "market_value": group_values["market_value"][i],
+        "cost": group_values["cost"][i],
+        "gain": group_values["gain"][i],
+        "gain_percent": group_gain_percent[i],
+        "day_gain": group_values["day_gain"][i],
+        "day_gain_percent": group_day_percent[i],
+        "weight": group_weight[i]
+    } for i, gid in enumerate(group_ids)]
+
+    total_cost = cost_basis.sum()
+    total_gain = gain.sum()
+    total_day_gain = day_gain.sum()
+    previous_total = total_value - total_day_gain
+    total = {
+        "market_value": round(float(total_value), 2),
+        "cost": round(float(total_cost), 2),
+        "gain": round(float(total_gain), 2),
+        "gain_percent": round(float(total_gain / total_cost * 100), 2) if total_cost > 0 else 0,
+        "day_gain": round(float(total_day_gain), 2),
+        "day_gain_percent": round(float(total_day_gain / previous_total * 100), 2) if previous_total > 0 else 0,
+        "count": n
+    }
+
+    weights = _round(market_value * scale)
+    rows = [{**h, "weight": weights[i]} for i, h in enumerate(holdings)]
+    return {"total": total, "groups": result_groups, "holdings": rows}
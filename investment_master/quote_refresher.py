@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from .market_data import get_market_data_provider
+from .schedule import market_now
+
+# 轮询间隔 (秒)，设置为 0 关闭后台刷新
+QUOTE_REFRESH_INTERVAL = float(os.environ.get("QUOTE_REFRESH_INTERVAL", 15))
+
+class QuoteRefresher:
+    """
+    后台行情刷新器。
+    按固定间隔批量拉取所有持仓和自选股的行情，在内存中保存带时间戳的最新快照。
+    请求处理只读快照，上游请求量只取决于轮询间隔，与打开的页面数量无关。
+    """
+    def __init__(self, get_tickers, valuator=None, store=None, interval=None, provider=None, revaluator=None, rankings=None):
+        self.get_tickers = get_tickers
+        self.provider = provider or get_market_data_provider()
+        self.valuator = valuator
+        # IncrementalValuator: 每轮只重算价格相关的估值输出，结果随行情一起放进快照
+        self.revaluator = revaluator
+        # Rankings: 用每轮的增量估值结果更新排行索引
+        self.rankings = rankings
+        self.store = store
+        self.interval = QUOTE_REFRESH_INTERVAL if interval is None else interval
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._snapshot = {}  # ticker -> quote + updated_at
+        self._version = 0  # 每次快照合并后递增，供推送流判断是否有新数据
+        self._stop = threading.Event()
+        self._thread = None
+        self._warm_thread = None
+        self._warmed_on = None  # 上次预热的交易所日期，跨日后重新预热
+
+    def start(self):
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="quote-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.warm_if_due()
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Quote refresh failed: {e}")
+            self._stop.wait(self.interval)
+
+    def warm_if_due(self):
+        """
+        每个交易日在后台预热一次 (启动时和跨日后)，让 base 跟上基本面快照的更新；
+        已在预热或今天已预热过时返回 None，否则返回预热线程。
+        """
+        if self.revaluator is None:
+            return None
+        today = market_now().date()
+        if self._warmed_on == today or (self._warm_thread and self._warm_thread.is_alive()):
+            return None
+        self._warmed_on = today
+        self._warm_thread = threading.Thread(target=self.warm, name="valuation-warmup", daemon=True)
+        self._warm_thread.start()
+        return self._warm_thread
+
+    def warm(self, tickers=None):
+        """
+        为跟踪的 ticker 加载基本面并建立增量估值的 base，返回成功建立的数量。
+        base 只使用内存中已有的快照；不预热的话，排行里只有已被其他请求查询过基本面的股票。
+        """
+        tickers = self.get_tickers() if tickers is None else tickers
+        warmed = 0
+        for ticker in tickers:
+            if self._stop.is_set():
+                break
+            try:
+                info = self.revaluator.valuator.fundamentals.get(ticker)
+                if self.revaluator.base(ticker, info=info) is not None:
+                    warmed += 1
+            except Exception as e:
+                print(f"Valuation warm-up failed for {ticker}: {e}")
+        return warmed
+
+    def refresh(self, tickers=None, fallback=True):
+        """
+        拉取一轮行情并合并进快照，返回本轮拿到的行情。
+        tickers 为空时刷新全部跟踪的 ticker，并清理已不再跟踪的快照。
+        """
+        full_round = tickers is None
+        if full_round:
+            tickers = self.get_tickers()
+
+        quotes = self.provider.get_quotes(tickers)
+        if self.store is not None and quotes:
+            try:
+                self.store.save_quotes(quotes)
+            except Exception as e:
+                print(f"Error caching quotes: {e}")
+
+        if fallback:
+            for ticker in tickers:
+                quote = quotes.get(ticker)
+                if quote and quote.get('current_price'):
+                    continue
+                fallback_quote = self._fallback_quote(ticker, quote)
+                if fallback_quote:
+                    quotes[ticker] = fallback_quote
+
+        valuations = {}
+        if self.revaluator is not None:
+            valuations = self.revaluator.update_prices(quotes)
+        if self.rankings is not None:
+            if valuations:
+                self.rankings.update(valuations, {t: q.get('name') for t, q in quotes.items()})
+            if full_round:
+                self.rankings.retain(tickers)
+
+        now = time.time()
+        with self._lock:
+            if full_round:
+                tracked = set(tickers)
+                self._snapshot = {t: q for t, q in self._snapshot.items() if t in tracked}
+            for ticker, quote in quotes.items():
+                self._snapshot[ticker] = {**quote, "updated_at": now}
+                if ticker in valuations:
+                    self._snapshot[ticker]["valuation"] = valuations[ticker]
+            if quotes:
+                self._version += 1
+                self._changed.notify_all()
+        return quotes
+
+    def _fallback_quote(self, ticker, quote):
+        # Sina 没有行情 (非 A 股) 或价格为 0 (停牌) 时回退到 yfinance
+        if self.valuator is None:
+            return None
+        price = self.valuator.get_current_price(ticker)
+        if price is None:
+            return None
+
+        quote = quote or {}
+        name = quote.get('name')
+        if not name:
+            # 基本面快照已被 get_current_price 缓存，这里不会再请求上游
+            info = self.valuator.fundamentals.peek(ticker) or {}
+            name = info.get('longName') or info.get('shortName')
+        pre_close = quote.get('pre_close')
+        day_change_percent = quote.get('day_change_percent') or 0
+        if pre_close and pre_close > 0:
+            day_change_percent = (price - pre_close) / pre_close * 100
+        return {
+            "name": name,
+            "current_price": price,
+            "pre_close": pre_close,
+            "day_change_percent": day_change_percent
+        }
+
+    def get_quotes(self, tickers):
+        """
+        从快照读取行情。快照里还没有的 ticker (例如刚添加) 当场用一次批量行情请求补齐，
+        yfinance 回退留给调用方的并发补全流程。
+        """
+        with self._lock:
+            result = {t: self._snapshot[t] for t in tickers if t in self._snapshot}
+        missing = [t for t in tickers if t not in result]
+        if missing:
+            result.update(self.refresh(missing, fallback=False))
+        return result
+
+    @property
+    def version(self):
+        with self._lock:
+            return self._version
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._snapshot)
+
+    def wait_for_update(self, version, timeout=None):
+        """
+        阻塞直到快照版本超过 version 或超时，返回 (当前版本, 快照)。
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._version > version, timeout)
+            return self._version, dict(self._snapshot)
@@ -0,0 +1,147 @@
+from .http_client import get_session
+from .resilience import CircuitBreaker
+from .singleflight import SingleFlight
+
+SINA_QUOTE_URL = "http://hq.sinajs.cn/list="
+# Paginated market listing: price, PE, PB and market cap for every symbol of a node (hs_a = all A-shares)
+SINA_LISTING_URL = "http://vip.stock.finance.sina.com.cn/quotes_service/api/json_v2.php/Market_Center.getHQNodeData"
+SINA_LISTING_PAGE_SIZE = 100
+SINA_HEADERS = {'Referer': 'https://finance.sina.com.cn'}
+# Sina accepts a comma-separated code list; keep each URL comfortably short
+SINA_BATCH_SIZE = 100
+
+# Concurrent requests for the same code list share one in-flight HTTP call
+_sina_flight = SingleFlight()
+# Stop calling Sina for a while after consecutive failures; callers fall back to local data
+sina_breaker = CircuitBreaker('sina', failure_threshold=3, reset_timeout=30)
+
+def to_sina_code(ticker):
+    """
+    Convert ticker format: 600036.SS -> sh600036, 000001.SZ -> sz000001.
+    Returns None for tickers Sina does not quote.
+    """
+    if ticker.endswith('.SS'):
+        return "sh" + ticker.split('.')[0]
+    if ticker.endswith('.SZ'):
+        return "sz" + ticker.split('.')[0]
+    return None
+
+def parse_sina_response(content):
+    """
+    Parse a multi-line Sina quote response into {sina_code: quote}.
+    Each line looks like: var hq_str_sh600036="招商银行,open,pre_close,current,high,low,...";
+    Unknown codes come back as an empty string and are skipped.
+    """
+    quotes = {}
+    for line in content.splitlines():
+        if 'hq_str_' not in line or '="' not in line:
+            continue
+        code = line.split('hq_str_')[1].split('=')[0]
+        data_str = line.split('="')[1].rsplit('"', 1)[0]
+        data_parts = data_str.split(',')
+        if len(data_parts) <= 3:
+            continue
+        try:
+            pre_close = float(data_parts[2])
+            current = float(data_parts[3])
+        except ValueError:
+            continue
+
+        day_change_percent = 0.0
+        if pre_close > 0:
+            day_change_percent = (current - pre_close) / pre_close * 100
+
+        quotes[code] = {
+            "name": data_parts[0],
+            "current_price": current,
+            "pre_close": pre_close,
+            "day_change_percent": day_change_percent
+        }
+    return quotes
+
+def fetch_sina_quotes(tickers, timeout=2, batch_size=SINA_BATCH_SIZE):
+    """
+    Resolve a whole set of tickers with as few Sina requests as possible.
+    Returns {ticker: quote} for every ticker Sina could quote.
+    """
+    code_to_tickers = {}
+    for ticker in tickers:
+        code = to_sina_code(ticker)
+        if code:
+            code_to_tickers.setdefault(code, []).append(ticker)
+
+    codes = list(code_to_tickers)
+    results = {}
+    for i in range(0, len(codes), batch_size):
+        chunk = codes[i:i + batch_size]
+        if not sina_breaker.allow():
+            # Fail fast while Sina is down instead of waiting out the timeout again
+            break
+        try:
+            chunk_quotes = _sina_flight.do(",".join(chunk), _fetch_sina_chunk, chunk, timeout)
+            sina_breaker.record_success()
+            for code, quote in chunk_quotes.items():
+                for ticker in code_to_tickers.get(code, []):
+                    results[ticker] = quote
+        except Exception as e:
+            sina_breaker.record_failure()
+            print(f"Error fetching Sina quotes for {len(chunk)} codes: {e}")
+
+    return results
+
+def _fetch_sina_chunk(codes, timeout):
+    url = SINA_QUOTE_URL + ",".join(codes)
+    # No retries: the breaker and the next refresh round handle failures within the short timeout
+    response = get_session(retries=0).get(url, headers=SINA_HEADERS, timeout=timeout)
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}")
+    return parse_sina_response(response.text)
+
+def from_sina_code(code):
+    """
+    Reverse of to_sina_code: sh600036 -> 600036.SS, sz000001 -> 000001.SZ, bj430047 -> 430047.BJ.
+    """
+    suffix = {'sh': '.SS', 'sz': '.SZ', 'bj': '.BJ'}.get(code[:2])
+    return code[2:] + suffix if suffix else None
+
+def _listing_float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value else None
+
+def fetch_sina_listing(node='hs_a', timeout=5, page_size=SINA_LISTING_PAGE_SIZE, limiter=None):
+    """
+    Walk Sina's market listing for one node and return
+    {ticker: {"name", "price", "pe", "pb", "market_cap"}} for every listed symbol.
+    A few dozen requests cover the whole A-share market.
+    An optional limiter (TokenBucket) is acquired before each page request.
+    """
+    results = {}
+    page = 1
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        params = {"page": page, "num": page_size, "sort": "symbol", "asc": 1, "node": node}
+        response = get_session().get(SINA_LISTING_URL, params=params, headers=SINA_HEADERS, timeout=timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        rows = response.json() or []
+        for row in rows:
+            ticker = from_sina_code(row.get('symbol', ''))
+            if not ticker:
+                continue
+            market_cap = _listing_float(row.get('mktcap'))
+            results[ticker] = {
+                "name": row.get('name'),
+                "price": _listing_float(row.get('trade')) or _listing_float(row.get('settlement')),
+                "pe": _listing_float(row.get('per')),
+                "pb": _listing_float(row.get('pb')),
+                # mktcap is quoted in units of 10k CNY
+                "market_cap": market_cap * 10000 if market_cap else None
+            }
+        if len(rows) < page_size:
+            break
+        page += 1
+    return results
@@ -0,0 +1,121 @@
+import threading
+from bisect import bisect_left, insort
+
+# 排行指标: 名称 -> (增量估值输出中的字段, 是否降序)
+# pr 越低越便宜；股息率、PB-ROE 安全边际、老唐买点折价 (买点高于现价的百分比) 越高越靠前
+RANKING_METRICS = {
+    "pr": ("pr", False),
+    "dividend_yield": ("dividend_yield", True),
+    "pb_roe_margin": ("pb_roe_margin", True),
+    "tang_margin": ("tang_margin", True)
+}
+
+class RankingIndex:
+    """
+    单个指标的有序索引: 按 (排序键, ticker) 维护有序列表，另用字典记录每个 ticker 当前的键。
+    更新某只股票只移动它自己的位置 (bisect)，读取前 k 名只需切片。
+    """
+    def __init__(self, descending=False):
+        self.descending = descending
+        self._order = []  # [(sort_key, ticker)]，升序
+        self._keys = {}   # ticker -> sort_key
+
+    def __len__(self):
+        return len(self._order)
+
+    def update(self, ticker, value):
+        """
+        value 为 None 时从索引中移除。返回位置是否发生变化。
+        """
+        key = None if value is None else (-value if self.descending else value)
+        old = self._keys.get(ticker)
+        if old == key:
+            return False
+        if old is not None:
+            del self._order[bisect_left(self._order, (old, ticker))]
+            del self._keys[ticker]
+        if key is not None:
+            insort(self._order, (key, ticker))
+            self._keys[ticker] = key
+        return True
+
+    def discard(self, ticker):
+        return self.update(ticker, None)
+
+    def top(self, k):
+        """
+        前 k 名 [(ticker, value)]。
+        """
+        sign = -1 if self.descending else 1
+        return [(ticker, key * sign) for key, ticker in self._order[:k]]
+
+    def rank(self, ticker):
+        key = self._keys.get(ticker)
+        if key is None:
+            return None
+        return bisect_left(self._order, (key, ticker)) + 1
+
+class Rankings:
+    """
+    跟踪股票的估值排行 (PR、股息率、PB-ROE 安全边际、老唐买点折价)。
+    由行情刷新器在每轮增量估值后喂入变化的输出，请求只读取各索引的前 k 名，不再逐只重新估值。
+    """
+    def __init__(self, metrics=None):
+        self.metrics = metrics or RANKING_METRICS
+        self._lock = threading.Lock()
+        self._indexes = {name: RankingIndex(descending) for name, (_, descending) in self.metrics.items()}
+        self._entries = {}  # ticker -> {"name", "price", 信号字段}，用于组装返回结果
+
+    def update(self, valuations, names=None):
+        """
+        valuations: {ticker: IncrementalValuator 的价格相关输出}。
+        输出与上次相同的 ticker 在各索引中的位置不变，不产生移动。
+        """
+        names = names or {}
+        with self._lock:
+            for ticker, outputs in valuations.items():
+                for name, (field, _) in self.metrics.items():
+                    self._indexes[name].update(ticker, outputs.get(field))
+                self._entries[ticker] = {
+                    "name": names.get(ticker) or ticker,
+                    "price": outputs.get("price"),
+                    "pr_result_type": outputs.get("pr_result_type"),
+                    "pb_roe_signal": outputs.get("pb_roe_signal"),
+                    "tang_signal": outputs.get("tang_signal")
+                }
+
+    def retain(self, tickers):
+        """
+        移除已不再跟踪的 ticker。
+        """
+        tracked = set(tickers)
+        with self._lock:
+            for ticker in [t for t in self._entries if t not in tracked]:
+                for index in self._indexes.values():
+                    index.discard(ticker)
+                del self._entries[ticker]
+
+    def top(self, metric, limit=20):
+        """
+        返回指标 metric 的前 limit 名；未知指标返回 None。
+        """
+        index = self._indexes.get(metric)
+        if index is None:
+            return None
+        with self._lock:
+            return {
+                "metric": metric,
+                "descending": index.descending,
+                "total": len(index),
+                "results": [
+                    {"rank": i + 1, "ticker": ticker, "value": value, **self._entries.get(ticker, {})}
+                    for i, (ticker, value) in enumerate(index.top(limit))
+                ]
+            }
+
+    def rank(self, ticker):
+        """
+        ticker 在各指标中的名次，不在索引中的为 None。
+        """
+        with self._lock:
+            return {name: index.rank(ticker) for name, index in self._indexes.items()}
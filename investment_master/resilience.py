@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+
+# 各上游的默认限速 (每秒请求数)，可用 RATE_LIMIT_<NAME> 覆盖，0 表示不限速
+DEFAULT_RATE_LIMITS = {
+    'yfinance': 2.0,
+    'sina': 5.0
+}
+
+class NegativeCache:
+    """
+    记录无法解析的 key (例如 yfinance 不支持的 .BJ 代码)。
+    连续失败后按指数退避屏蔽一段时间，期间直接跳过，不再等待上游超时。
+    """
+    def __init__(self, base_delay=60, max_delay=3600):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (failures, blocked_until)
+
+    def is_blocked(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry is not None and time.time() < entry[1]
+
+    def record_failure(self, key):
+        with self._lock:
+            failures = self._entries.get(key, (0, 0))[0] + 1
+            delay = min(self.max_delay, self.base_delay * 2 ** (failures - 1))
+            self._entries[key] = (failures, time.time() + delay)
+
+    def record_success(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+class CircuitOpenError(Exception):
+    pass
+
+def is_upstream_error(exc):
+    """
+    是否是上游本身的故障: 网络错误/超时、HTTP 5xx 或 429 限流。
+    单个代码的错误 (404、返回数据解析失败等) 不说明上游不可用，不应计入熔断。
+    """
+    status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    # yfinance 的 YFRateLimitError
+    if 'RateLimit' in type(exc).__name__:
+        return True
+    return isinstance(exc, OSError)
+
+class CircuitBreaker:
+    """
+    单个上游的熔断器。
+    连续失败 failure_threshold 次后断开 (open)，期间调用直接抛 CircuitOpenError；
+    reset_timeout 秒后进入半开 (half-open)，只放行一次试探请求，成功则恢复。
+    is_failure(exc) 决定 call 中的异常是否计为失败 (默认全部计入)；
+    不计入的异常说明上游正常应答，按成功处理后原样抛出。
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30, is_failure=None):
+        self.name = name
+        self.is_failure = is_failure
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.time() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    print(f"熔断器 {self.name} 断开 (连续失败 {self._failures} 次)")
+                self._opened_at = time.time()
+            self._probing = False
+
+    def call(self, fn, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} 熔断中，暂停请求")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if self.is_failure is None or self.is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+class TokenBucket:
+    """
+    令牌桶限流: 平均每秒 rate 个请求，最多允许 capacity 个突发。
+    acquire 阻塞直到拿到令牌；rate <= 0 时不限速。
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def acquire(self, tokens=1, timeout=None):
+        if self.rate <= 0:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(name):
+    """
+    返回上游 name 的共享令牌桶，同一进程内所有调用方共用一个限速。
+    """
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(name)
+        if limiter is None:
+            rate = float(os.environ.get(f"RATE_LIMIT_{name.upper()}", DEFAULT_RATE_LIMITS.get(name, 0)))
+            limiter = _rate_limiters[name] = TokenBucket(rate)
+        return limiter
@@ -0,0 +1,200 @@
+import threading
+from .batch_valuation import (
+    PR_UNDERVALUED, PR_OVERVALUED, PEG_UNDERVALUED, PEG_OVERVALUED,
+    DDM_COST_OF_EQUITY, DDM_GROWTH, dcf_fair_value
+)
+from .memo import ModelMemo
+
+# 价格无关部分依赖的字段: 这些字段不变时，行情变化只需要重算价格相关的输出。
+# 随价格变化的字段 (trailingPE、forwardPE、marketCap) 不在其中:
+# DDM 的 "价格 x 股息率" 和 DCF 的 "市值 x 3%" 兜底放在价格相关的一半里计算
+BASE_FIELDS = (
+    'trailingEps', 'bookValue', 'returnOnEquity', 'payoutRatio', 'pegRatio',
+    'earningsGrowth', 'revenueGrowth', 'dividendRate', 'trailingAnnualDividendRate', 'dividendYield',
+    'netIncomeToCommon', 'sharesOutstanding', 'debtToEquity', 'freeCashflow'
+)
+# DCF 兜底 (没有 freeCashflow 时 FCF = 市值 x 3%) 下，每股价值 = 价格 x 该系数
+DCF_MARKET_CAP_FCF_RATIO = 0.03
+
+class IncrementalValuator:
+    """
+    增量估值。
+    把每只股票的估值拆成两部分:
+    - 价格无关的中间结果 (base): 合理 PB 对应的价格区间、格雷厄姆内在价值、老唐买卖点、
+      每股收益/净资产、PR 的 N 系数、PEG 的增长率、DDM 股息和 DCF 的 FCF 来源，只在基本面快照变化时重算；
+    - 价格相关的输出: PE/PB/PR/PEG、各模型的安全边际和买卖信号，每个行情 tick 只重算这部分。
+    """
+    def __init__(self, valuator):
+        self.valuator = valuator
+        self._lock = threading.Lock()
+        self._bases = {}    # ticker -> (fingerprint, base)
+        self._outputs = {}  # ticker -> (price, outputs)
+
+    def base(self, ticker, info=None):
+        """
+        返回价格无关的中间结果。info 为空时只使用内存中已有的基本面快照，不请求上游。
+        """
+        if info is None:
+            info = self.valuator.fundamentals.peek(ticker)
+        if not info:
+            return None
+
+        fingerprint = ModelMemo.fingerprint('base', info, BASE_FIELDS)
+        with self._lock:
+            cached = self._bases.get(ticker)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+
+        base = self._build_base(ticker, info)
+        with self._lock:
+            self._bases[ticker] = (fingerprint, base)
+            self._outputs.pop(ticker, None)
+        return base
+
+    def _build_base(self, ticker, info):
+        v = self.valuator
+        pb = v.calculate_pb_roe(ticker, info=info)
+        pr = v.calculate_pr(ticker, info=info)
+        peg = v.calculate_peg(ticker, info=info)
+        graham = v.calculate_graham(ticker, info=info)
+        tang = v.calculate_tang(ticker, info=info)
+
+        def ok(result):
+            return result and "error" not in result
+
+        # 股息率的两个来源，与 Valuator._get_best_dividend_yield 一致: TTM 分红随价格变化，数据源股息率固定
+        raw_yield = info.get('dividendYield') or 0
+
+        # 有 freeCashflow 时 DCF 与价格无关；否则按 calculate_dcf 的兜底用市值估算 FCF，随价格线性变化
+        dcf_value = dcf_price_ratio = None
+        if info.get('freeCashflow'):
+            dcf = v.calculate_dcf(ticker, info=info)
+            dcf_value = dcf["result"]["fair_value_per_share"] if ok(dcf) else None
+        elif info.get('marketCap') and info.get('sharesOutstanding'):
+            dcf_price_ratio = DCF_MARKET_CAP_FCF_RATIO * float(dcf_fair_value(1.0, 1.0))
+
+        return {
+            "eps": info.get('trailingEps') or None,
+            "dividend_rate": info.get('trailingAnnualDividendRate') or None,
+            "dividend_yield": raw_yield / 100.0 if raw_yield > 1 else raw_yield,
+            "bps": info.get('bookValue') or None,
+            "roe": info.get('returnOnEquity') or None,
+            "n_factor": pr["n_factor"] if ok(pr) else None,
+            "peg_growth": peg["growth_rate"] if ok(peg) and peg["growth_rate"] > 0 else None,
+            "pb_fair_value": pb["fair_value"] if ok(pb) else None,
+            "pb_buy_price": pb["buy_range_price"][1] if ok(pb) else None,
+            "pb_sell_price": pb["sell_range_price"][0] if ok(pb) else None,
+            "graham_value": graham["intrinsic_value_adj"] if ok(graham) else None,
+            # calculate_ddm 优先使用 dividendRate，没有时用 价格 x 最佳股息率
+            "ddm_dividend_rate": info.get('dividendRate') or None,
+            "dcf_value": dcf_value,
+            "dcf_price_ratio": dcf_price_ratio,
+            "tang_buy_price": tang["buy_price"] if ok(tang) else None,
+            "tang_sell_price": tang["sell_price"] if ok(tang) else None
+        }
+
+    def reprice(self, ticker, price, info=None):
+        """
+        用新价格重算价格相关的输出；价格没变时直接返回上次的结果。
+        """
+        if not price:
+            return None
+        base = self.base(ticker, info)
+        if base is None:
+            return None
+        with self._lock:
+            cached = self._outputs.get(ticker)
+        if cached and cached[0] == price:
+            return cached[1]
+
+        outputs = price_outputs(base, price)
+        with self._lock:
+            self._outputs[ticker] = (price, outputs)
+        return outputs
+
+    def update_prices(self, quotes):
+        """
+        行情刷新回调: 返回 {ticker: 价格相关输出}，没有基本面快照的 ticker 跳过。
+        """
+        results = {}
+        for ticker, quote in quotes.items():
+            try:
+                outputs = self.reprice(ticker, quote.get('current_price'))
+            except Exception as e:
+                print(f"增量估值 {ticker} 失败: {e}")
+                continue
+            if outputs is not None:
+                results[ticker] = outputs
+        return results
+
+def _margin(value, price):
+    if not value:
+        return None
+    return round((value - price) / value * 100, 2)
+
+def _round(value, digits=3):
+    return round(value, digits) if value is not None else None
+
+def pr_result_type(pr):
+    if pr < PR_UNDERVALUED:
+        return "严重低估 (买入)"
+    if pr > PR_OVERVALUED:
+        return "高估 (卖出)"
+    return "合理/持有"
+
+def peg_result_type(peg):
+    if peg < PEG_UNDERVALUED:
+        return "低估 (买入)"
+    if peg > PEG_OVERVALUED:
+        return "高估 (卖出)"
+    return "合理"
+
+def zone_signal(price, buy_price, sell_price):
+    if buy_price is None or sell_price is None:
+        return None
+    if price <= buy_price:
+        return "买入区间"
+    if price >= sell_price:
+        return "卖出区间"
+    return "持有"
+
+def price_outputs(base, price):
+    """
+    只依赖价格和 base 的输出，纯算术，没有取数和异常分支。
+    """
+    # 亏损时 PE 无意义，与数据源不提供 trailingPE 的行为一致
+    pe = price / base["eps"] if base["eps"] and base["eps"] > 0 else None
+    pb = price / base["bps"] if base["bps"] else None
+    roe = base["roe"]
+
+    pr = pr_3 = None
+    if pe is not None and roe and base["n_factor"] is not None:
+        pr = base["n_factor"] * pe / (roe * 100)
+    if pb is not None and roe:
+        pr_3 = pb / (roe * roe * 100)
+    peg = pe / base["peg_growth"] if pe is not None and base["peg_growth"] else None
+    dividend_yield = max(base["dividend_rate"] / price if base["dividend_rate"] else 0.0, base["dividend_yield"])
+    ddm_rate = base["ddm_dividend_rate"] or price * dividend_yield
+    ddm_value = ddm_rate * (1 + DDM_GROWTH) / (DDM_COST_OF_EQUITY - DDM_GROWTH) if ddm_rate else None
+    dcf_value = base["dcf_value"]
+    if dcf_value is None and base["dcf_price_ratio"] is not None:
+        dcf_value = base["dcf_price_ratio"] * price
+
+    return {
+        "price": price,
+        "pe": _round(pe, 2),
+        "pb": _round(pb, 2),
+        "pr": _round(pr),
+        "pr_3": _round(pr_3),
+        "pr_result_type": pr_result_type(pr) if pr is not None else None,
+        "peg": _round(peg, 2),
+        "peg_result_type": peg_result_type(peg) if peg is not None else None,
+        "dividend_yield": round(dividend_yield, 4) if dividend_yield > 0 else None,
+        "pb_roe_margin": _margin(base["pb_fair_value"], price),
+        "pb_roe_signal": zone_signal(price, base["pb_buy_price"], base["pb_sell_price"]),
+        "graham_margin": _margin(base["graham_value"], price),
+        "ddm_margin": _margin(ddm_value, price),
+        "dcf_margin": _margin(dcf_value, price),
+        "tang_margin": _margin(base["tang_buy_price"], price),
+        "tang_signal": zone_signal(price, base["tang_buy_price"], base["tang_sell_price"])
+    }
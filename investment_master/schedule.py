@@ -0,0 +1,32 @@
+import os
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import numpy as np
+
+# 定时任务按 A 股交易所所在时区判断日期和到点时间，与服务器 (Docker 中通常是 UTC) 的本地时区无关
+MARKET_TIMEZONE = ZoneInfo(os.environ.get("MARKET_TIMEZONE", "Asia/Shanghai"))
+
+def market_now():
+    return datetime.now(MARKET_TIMEZONE)
+
+def parse_run_at(value):
+    """
+    解析定时任务的执行时间 'HH:MM'，返回 (hour, minute)；空值返回 None (关闭)，格式错误抛 ValueError。
+    """
+    if not value:
+        return None
+    try:
+        hour, minute = (int(x) for x in value.split(':'))
+    except ValueError:
+        raise ValueError(f"执行时间应为 HH:MM: {value!r}") from None
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"执行时间应为 HH:MM: {value!r}")
+    return hour, minute
+
+def is_due(now, run_at):
+    """
+    now 是否是工作日且已到 run_at ((hour, minute))。
+    """
+    if not np.is_busday(np.datetime64(now.date(), 'D')):
+        return False
+    return (now.hour, now.minute) >= run_at
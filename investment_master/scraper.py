@@ -1,9 +1,9 @@
-import requests
 from bs4 import BeautifulSoup
 import re
 import time
 import os
 import uuid
+from .http_client import get_session
 
 try:
     from playwright.sync_api import sync_playwright
@@ -30,7 +30,7 @@ class ArticleScraper:
             return self._scrape_with_playwright(url)
             
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = get_session().get(url, headers=self.headers, timeout=10)
             response.raise_for_status()
             response.encoding = response.apparent_encoding
             
@@ -161,7 +161,7 @@ class ArticleScraper:
             
             # Download
             print(f"Downloading image: {img_url}")
-            resp = requests.get(img_url, headers=self.headers, timeout=10)
+            resp = get_session().get(img_url, headers=self.headers, timeout=10)
             if resp.status_code == 200:
                 with open(filepath, 'wb') as f:
                     f.write(resp.content)
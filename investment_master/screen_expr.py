@@ -0,0 +1,186 @@
+import ast
+from functools import lru_cache
+import numpy as np
+
+class ScreenError(ValueError):
+    pass
+
+_COMPARE_OPS = {
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal
+}
+_ARITH_OPS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide
+}
+
+class Screen:
+    """
+    编译后的筛选表达式: 一棵由 NumPy 运算组成的闭包树，对整张表一次求值得到布尔掩码。
+    names 为表达式引用到的列名。
+    """
+    def __init__(self, expr, fn, names):
+        self.expr = expr
+        self._fn = fn
+        self.names = names
+
+    def mask(self, columns):
+        with np.errstate(all='ignore'):
+            result = self._fn(columns)
+        if np.ndim(result) == 0:
+            # 不引用任何列的表达式 (例如 True)
+            n = len(next(iter(columns.values()))) if columns else 0
+            return np.full(n, bool(result))
+        return np.asarray(result, dtype=bool)
+
+@lru_cache(maxsize=256)
+def compile_screen(expr, numeric_columns, text_columns):
+    """
+    解析并编译筛选表达式，例如:
+        pr_2 < 0.6 and dividend_yield > 0.04 and sector == "Financial Services"
+    支持 and / or / not、比较 (含链式 0 < pe < 15)、+ - * /、in / not in 列表。
+    只允许白名单中的语法节点和已知列名，不会执行任意代码。
+    同一表达式只编译一次 (lru_cache)，保存的筛选条件重复运行几乎没有开销。
+    """
+    try:
+        tree = ast.parse(expr, mode='eval')
+    except SyntaxError as e:
+        raise ScreenError(f"表达式语法错误: {e.msg}")
+    compiler = _Compiler(set(numeric_columns), set(text_columns))
+    fn, kind = compiler.visit(tree.body)
+    if kind != 'bool':
+        raise ScreenError("表达式结果必须是条件 (比较或 and/or 组合)")
+    return Screen(expr, fn, frozenset(compiler.names))
+
+class _Compiler:
+    def __init__(self, numeric_columns, text_columns):
+        self.numeric_columns = numeric_columns
+        self.text_columns = text_columns
+        self.names = set()
+
+    def visit(self, node):
+        """
+        返回 (fn, kind)，fn(columns) 计算该节点的值，kind 为 'num' / 'text' / 'bool'。
+        """
+        method = getattr(self, f'visit_{type(node).__name__}', None)
+        if method is None:
+            raise ScreenError(f"不支持的语法: {type(node).__name__}")
+        return method(node)
+
+    def visit_Name(self, node):
+        name = node.id
+        if name in ('True', 'False'):
+            value = name == 'True'
+            return (lambda cols: value), 'bool'
+        if name in self.numeric_columns:
+            kind = 'num'
+        elif name in self.text_columns:
+            kind = 'text'
+        else:
+            raise ScreenError(f"未知字段: {name}")
+        self.names.add(name)
+        return (lambda cols: cols[name]), kind
+
+    def visit_Constant(self, node):
+        value = node.value
+        if isinstance(value, bool):
+            return (lambda cols: value), 'bool'
+        if isinstance(value, (int, float)):
+            return (lambda cols: value), 'num'
+        if isinstance(value, str):
+            return (lambda cols: value), 'text'
+        raise ScreenError(f"不支持的常量: {value!r}")
+
+    def visit_UnaryOp(self, node):
+        operand, kind = self.visit(node.operand)
+        if isinstance(node.op, ast.Not):
+            self._expect(kind, 'bool', 'not')
+            return (lambda cols: np.logical_not(operand(cols))), 'bool'
+        if isinstance(node.op, (ast.USub, ast.UAdd)):
+            self._expect(kind, 'num', '正负号')
+            if isinstance(node.op, ast.USub):
+                return (lambda cols: np.negative(operand(cols))), 'num'
+            return operand, 'num'
+        raise ScreenError("不支持的一元运算")
+
+    def visit_BoolOp(self, node):
+        operands = []
+        for value in node.values:
+            fn, kind = self.visit(value)
+            self._expect(kind, 'bool', 'and/or')
+            operands.append(fn)
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+
+        def fn(cols):
+            result = operands[0](cols)
+            for operand in operands[1:]:
+                result = combine(result, operand(cols))
+            return result
+        return fn, 'bool'
+
+    def visit_BinOp(self, node):
+        op = _ARITH_OPS.get(type(node.op))
+        if op is None:
+            raise ScreenError("只支持 + - * / 运算")
+        left, left_kind = self.visit(node.left)
+        right, right_kind = self.visit(node.right)
+        self._expect(left_kind, 'num', '算术运算')
+        self._expect(right_kind, 'num', '算术运算')
+        return (lambda cols: op(left(cols), right(cols))), 'num'
+
+    def visit_Compare(self, node):
+        terms = [self.visit(node.left)] + [None] * len(node.comparators)
+        parts = []
+        for i, (op, comparator) in enumerate(zip(node.ops, node.comparators)):
+            left, left_kind = terms[i]
+            if isinstance(op, (ast.In, ast.NotIn)):
+                parts.append(self._membership(left, left_kind, op, comparator))
+                terms[i + 1] = (None, None)
+                continue
+            right, right_kind = terms[i + 1] = self.visit(comparator)
+            compare = _COMPARE_OPS.get(type(op))
+            if compare is None:
+                raise ScreenError("不支持的比较运算")
+            if left_kind != right_kind or left_kind == 'bool':
+                raise ScreenError("比较两边类型不一致 (数值只能和数值比较，文本只能和文本比较)")
+            if left_kind == 'text' and compare not in (np.equal, np.not_equal):
+                raise ScreenError("文本字段只支持 == 和 !=")
+            parts.append(self._compare(compare, left, right))
+
+        def fn(cols):
+            result = parts[0](cols)
+            for part in parts[1:]:
+                result = np.logical_and(result, part(cols))
+            return result
+        return fn, 'bool'
+
+    @staticmethod
+    def _compare(compare, left, right):
+        return lambda cols: compare(left(cols), right(cols))
+
+    def _membership(self, left, left_kind, op, comparator):
+        if not isinstance(comparator, (ast.List, ast.Tuple, ast.Set)):
+            raise ScreenError("in 的右边必须是常量列表，例如 sector in [\"Utilities\", \"Energy\"]")
+        values = []
+        for element in comparator.elts:
+            if not isinstance(element, ast.Constant) or isinstance(element.value, bool):
+                raise ScreenError("in 列表中只能是常量")
+            values.append(element.value)
+        kinds = {'text' if isinstance(v, str) else 'num' for v in values}
+        if values and kinds != {left_kind}:
+            raise ScreenError("in 列表的类型必须和字段一致")
+        values = np.array(values, dtype=object if left_kind == 'text' else float)
+        negate = isinstance(op, ast.NotIn)
+        return lambda cols: np.isin(left(cols), values, invert=negate)
+
+    @staticmethod
+    def _expect(kind, expected, where):
+        if kind != expected:
+            names = {'num': '数值', 'text': '文本', 'bool': '条件'}
+            raise ScreenError(f"{where} 需要{names[expected]}，得到{names[kind]}")
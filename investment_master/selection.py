@@ -1,22 +1,32 @@
-import yfinance as yf
+from .market_data import get_market_data_provider
+from .universe import UniverseTable
 
 class StockSelector:
-    def __init__(self):
-        pass
+    def __init__(self, provider=None, universe=None):
+        self.provider = provider or get_market_data_provider()
+        self.universe = universe if universe is not None else UniverseTable()
 
-    def select(self, criteria, tickers=None):
+    def select(self, criteria, tickers=None, sort=None, descending=False, limit=None):
         """
         根据标准筛选股票。
-        如果提供了 tickers 列表，则实时获取数据进行筛选。
-        否则返回模拟数据。
+        criteria 可以是 {'min_pe', 'max_pe', 'min_roe'} 字典，也可以是筛选表达式字符串，
+        例如 'pr_2 < 0.6 and dividend_yield > 0.04 and sector == "Financial Services"'。
+        如果提供了 tickers 列表 (仅字典标准)，则实时获取数据进行筛选。
+        否则在本地全市场基本面表 (UniverseTable) 中筛选。
         """
+        if isinstance(criteria, str):
+            self.universe.reload_if_changed()
+            if not len(self.universe):
+                print("本地股票池为空，请先运行刷新任务: python -m investment_master.universe")
+                return []
+            return self.universe.query(criteria, sort=sort, descending=descending, limit=limit)
+
         if tickers:
             print(f"正在筛选 {len(tickers)} 只股票...")
             results = []
             for ticker in tickers:
                 try:
-                    stock = yf.Ticker(ticker)
-                    info = stock.info
+                    info = self.provider.get_info(ticker)
                     pe = info.get('trailingPE')
                     roe = info.get('returnOnEquity')
                     
@@ -34,10 +44,27 @@ class StockSelector:
                     continue
             return results
 
-        # 模拟返回
-        print(f"未提供股票列表，返回模拟演示数据 (标准: {criteria})")
-        return [
-            {"symbol": "600519.SS", "name": "贵州茅台", "pe": 30, "roe": 25},
-            {"symbol": "000858.SZ", "name": "五粮液", "pe": 25, "roe": 20},
-            {"symbol": "AAPL", "name": "Apple Inc.", "pe": 28, "roe": 35}
-        ]
+        self.universe.reload_if_changed()
+        if not len(self.universe):
+            print("本地股票池为空，请先运行刷新任务: python -m investment_master.universe")
+            return []
+
+        print(f"在本地股票池 ({len(self.universe)} 只) 中筛选 (标准: {criteria})")
+        rows = self.universe.screen(self.to_table_criteria(criteria), sort=sort or 'pe', descending=descending, limit=limit)
+        for row in rows:
+            # 与实时筛选的输出保持一致: ROE 用百分比
+            row["roe"] = round(row["roe"] * 100, 2) if row["roe"] is not None else None
+        return rows
+
+    @staticmethod
+    def to_table_criteria(criteria):
+        """
+        选股标准 -> UniverseTable 筛选条件。min_roe 等百分比标准转换为小数。
+        """
+        table_criteria = {}
+        for key, value in criteria.items():
+            if key in ('min_roe', 'max_roe', 'min_payout_ratio', 'max_payout_ratio',
+                       'min_dividend_yield', 'max_dividend_yield'):
+                value = value / 100
+            table_criteria[key] = value
+        return table_criteria
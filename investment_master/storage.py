@@ -9,6 +9,13 @@ class StorageBackend:
     def save(self, data):
         raise NotImplementedError
 
+    def revision(self):
+        """
+        Return the stored document's "revision" field so callers holding the
+        data in memory can tell whether another process has written since.
+        """
+        return (self.load() or {}).get("revision")
+
 class JsonFileStorage(StorageBackend):
     def __init__(self, file_path):
         self.file_path = file_path
@@ -54,6 +61,15 @@ class MongoStorage(StorageBackend):
             print(f"Error loading from Mongo: {e}")
             return {}
 
+    def revision(self):
+        try:
+            # Only the revision field, not the whole document
+            doc = self.collection.find_one({"_id": "root_data"}, {"data.revision": 1})
+            return (doc or {}).get("data", {}).get("revision")
+        except Exception as e:
+            print(f"Error loading revision from Mongo: {e}")
+            return None
+
     def save(self, data):
         try:
             self.collection.update_one(
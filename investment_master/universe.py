@@ -0,0 +1,489 @@
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from . import batch_valuation
+from .market_data import get_market_data_provider
+from .quotes import fetch_sina_listing
+from .resilience import CircuitOpenError, get_rate_limiter
+from .schedule import parse_run_at, is_due, market_now
+from .screen_expr import compile_screen
+
+try:
+    import fcntl
+except ImportError:  # Windows: 只有进程内锁
+    fcntl = None
+
+UNIVERSE_PATH = os.environ.get("UNIVERSE_PATH", "data/universe.npz")
+# 额外的股票池 (例如港股)，每行一个代码，# 开头为注释；这些代码的数据全部来自 provider.get_info
+UNIVERSE_FILE = os.environ.get("UNIVERSE_FILE", "data/universe.txt")
+# 新浪行情中心的板块节点，逗号分隔
+UNIVERSE_NODES = os.environ.get("UNIVERSE_NODES", "hs_a")
+# 每拉取多少只股票的基本面落盘一次 (同时写检查点)
+UNIVERSE_SAVE_EVERY = 200
+# 刷新进度检查点，中断后从这里继续
+UNIVERSE_CHECKPOINT = os.environ.get("UNIVERSE_CHECKPOINT", "data/universe_refresh.json")
+# 拉取基本面的并发数，总速率另受 RATE_LIMIT_YFINANCE 限制
+UNIVERSE_REFRESH_WORKERS = int(os.environ.get("UNIVERSE_REFRESH_WORKERS", 4))
+# provider.get_info 对应的上游 (决定使用哪个令牌桶)
+UNIVERSE_INFO_UPSTREAM = os.environ.get("UNIVERSE_INFO_UPSTREAM", "yfinance")
+# 定时刷新时间 (HH:MM，MARKET_TIMEZONE 时区，默认北京时间；工作日)；默认关闭，全量刷新需要较长时间
+UNIVERSE_REFRESH_AT = os.environ.get("UNIVERSE_REFRESH_AT", "")
+UNIVERSE_CHECK_INTERVAL = 60
+
+# 数值列，全部为 float64，缺失为 NaN；roe / payout_ratio / dividend_yield 为小数
+COLUMNS = ('price', 'pe', 'pb', 'roe', 'payout_ratio', 'dividend_yield', 'pr',
+           'eps', 'bvps', 'market_cap')
+# 行情列表 (新浪) 能提供的列
+LISTING_COLUMNS = ('price', 'pe', 'pb', 'market_cap')
+# 只能逐只从 provider.get_info 获取的列
+INFO_COLUMNS = ('roe', 'payout_ratio', 'dividend_yield', 'eps', 'bvps')
+# 筛选表达式中可用的别名 (与 Valuator.calculate_pr 的输出字段同名)
+COLUMN_ALIASES = {'pr_2': 'pr', 'pr_value': 'pr'}
+# 筛选表达式中可用的文本字段; market 由代码后缀得出 (SS / SZ / BJ / HK)
+TEXT_COLUMNS = ('symbol', 'name', 'sector', 'market')
+
+class UniverseTable:
+    """
+    全市场基本面表，列式存储在 NumPy 数组中，持久化为单个 .npz 文件。
+    筛选只是对几千行数组做一次向量化比较；文件被其他进程 (刷新任务) 更新后自动重新加载。
+    """
+    def __init__(self, path=None):
+        self.path = path or UNIVERSE_PATH
+        self._lock = threading.RLock()
+        self._mtime = None
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.tickers = np.array([], dtype=object)
+        self.names = np.array([], dtype=object)
+        self.sectors = np.array([], dtype=object)
+        self.updated_at = np.array([], dtype=float)
+        self.columns = {c: np.array([], dtype=float) for c in COLUMNS}
+        self._index = {}
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        mtime = os.path.getmtime(self.path)
+        with np.load(self.path, allow_pickle=False) as data:
+            self.tickers = data['tickers'].astype(object)
+            self.names = data['names'].astype(object)
+            self.updated_at = data['updated_at']
+            n = len(self.tickers)
+            self.sectors = data['sectors'].astype(object) if 'sectors' in data else np.array([''] * n, dtype=object)
+            self.columns = {c: data[c] if c in data else np.full(n, np.nan) for c in COLUMNS}
+        self._index = {t: i for i, t in enumerate(self.tickers)}
+        self._mtime = mtime
+
+    def reload_if_changed(self):
+        with self._lock:
+            if os.path.exists(self.path) and os.path.getmtime(self.path) != self._mtime:
+                self._load()
+
+    def save(self):
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    tickers=self.tickers.astype(str),
+                    names=self.names.astype(str),
+                    sectors=self.sectors.astype(str),
+                    updated_at=self.updated_at,
+                    **self.columns
+                )
+            os.replace(tmp_path, self.path)
+            self._mtime = os.path.getmtime(self.path)
+
+    def upsert(self, rows, columns=COLUMNS):
+        """
+        rows: {ticker: {"name": ..., 列名: 值}}。只更新 columns 中的列，值为 None 的列保持原样。
+        """
+        with self._lock:
+            new_tickers = [t for t in rows if t not in self._index]
+            if new_tickers:
+                n_new = len(new_tickers)
+                self.tickers = np.concatenate([self.tickers, np.array(new_tickers, dtype=object)])
+                self.names = np.concatenate([self.names, np.array([''] * n_new, dtype=object)])
+                self.sectors = np.concatenate([self.sectors, np.array([''] * n_new, dtype=object)])
+                self.updated_at = np.concatenate([self.updated_at, np.zeros(n_new)])
+                for c in COLUMNS:
+                    self.columns[c] = np.concatenate([self.columns[c], np.full(n_new, np.nan)])
+                for t in new_tickers:
+                    self._index[t] = len(self._index)
+
+            now = time.time()
+            for ticker, row in rows.items():
+                i = self._index[ticker]
+                if row.get('name'):
+                    self.names[i] = row['name']
+                if row.get('sector'):
+                    self.sectors[i] = row['sector']
+                for c in columns:
+                    value = row.get(c)
+                    if value is not None:
+                        self.columns[c][i] = value
+                self.updated_at[i] = now
+            self._derive()
+
+    def _derive(self):
+        # 市赚率 (修正公式): PR = N * PE / (ROE * 100)，N 由分红率决定，与 Valuator.calculate_pr 一致
+        pe = self.columns['pe']
+        roe = self.columns['roe']
+        dpr = self.columns['payout_ratio']
+        with np.errstate(all='ignore'):
+            n = np.where(np.isnan(dpr), 1.0, np.where(dpr >= 0.5, 1.0, np.where(dpr <= 0.25, 2.0, 0.5 / dpr)))
+            pr = n * pe / (roe * 100)
+        self.columns['pr'] = np.where((pe > 0) & (roe > 0), pr, np.nan)
+
+    def mask(self, criteria):
+        """
+        criteria: {"min_<列>": 值, "max_<列>": 值}，缺失值 (NaN) 一律不满足条件。
+        """
+        self.reload_if_changed()
+        with self._lock:
+            mask = np.ones(len(self.tickers), dtype=bool)
+            for key, value in criteria.items():
+                if value is None:
+                    continue
+                bound, _, column = key.partition('_')
+                if column not in self.columns or bound not in ('min', 'max'):
+                    raise ValueError(f"未知的筛选条件: {key}")
+                values = self.columns[column]
+                with np.errstate(invalid='ignore'):
+                    mask &= values >= value if bound == 'min' else values <= value
+            return mask
+
+    def rows(self, mask=None, sort=None, descending=False, limit=None):
+        """
+        把满足 mask 的行转成字典列表，可按某列排序 (NaN 排在最后)。
+        同时指定 sort 和 limit 时先用 argpartition 选出前 N 行再排序，不对全表排序；负的 limit 按 0 处理。
+        """
+        if limit is not None:
+            limit = max(limit, 0)
+        with self._lock:
+            idx = np.arange(len(self.tickers)) if mask is None else np.flatnonzero(mask)
+            if sort:
+                sort = COLUMN_ALIASES.get(sort, sort)
+                if sort not in self.columns:
+                    raise ValueError(f"未知的排序字段: {sort}")
+                keys = self.columns[sort][idx]
+                keys = -keys if descending else keys
+                if limit is not None and limit < len(idx):
+                    top = np.argpartition(keys, limit)[:limit]
+                    idx, keys = idx[top], keys[top]
+                idx = idx[np.argsort(keys, kind='stable')]
+            if limit is not None:
+                idx = idx[:limit]
+            return [self._row(i) for i in idx]
+
+    def expression_columns(self):
+        """
+        筛选表达式可引用的列: 数值列 + 别名 + 文本列。
+        """
+        columns = dict(self.columns)
+        for alias, column in COLUMN_ALIASES.items():
+            columns[alias] = self.columns[column]
+        columns['symbol'] = self.tickers
+        columns['name'] = self.names
+        columns['sector'] = self.sectors
+        columns['market'] = np.array([t.rsplit('.', 1)[-1] if '.' in t else '' for t in self.tickers], dtype=object)
+        return columns
+
+    def query(self, expr, sort=None, descending=False, limit=None):
+        """
+        用筛选表达式选股，例如 'pr_2 < 0.6 and dividend_yield > 0.04 and sector == "Financial Services"'。
+        表达式按字符串缓存编译结果，语法错误抛 ScreenError (ValueError 子类)。
+        """
+        screen = compile_screen(expr, COLUMNS + tuple(COLUMN_ALIASES), TEXT_COLUMNS)
+        self.reload_if_changed()
+        with self._lock:
+            mask = screen.mask(self.expression_columns())
+            return self.rows(mask, sort=sort, descending=descending, limit=limit)
+
+    def _row(self, i):
+        row = {"symbol": self.tickers[i], "name": self.names[i], "sector": self.sectors[i] or None}
+        for c in COLUMNS:
+            value = self.columns[c][i]
+            row[c] = None if np.isnan(value) else round(float(value), 4)
+        return row
+
+    def screen(self, criteria, sort=None, descending=False, limit=None):
+        return self.rows(self.mask(criteria), sort=sort, descending=descending, limit=limit)
+
+def load_universe_file(path=None):
+    path = path or UNIVERSE_FILE
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+def info_rows(infos):
+    """
+    把一批 info 转成表的行，dividend_yield 用与 Valuator 相同的取值逻辑。
+    """
+    tickers = list(infos)
+    table = batch_valuation.build_table([infos[t] for t in tickers])
+    dividend_yield = batch_valuation.best_dividend_yield(table)
+    price = np.where(np.isnan(table['currentPrice']), table['previousClose'], table['currentPrice'])
+    values = {
+        'price': price,
+        'pe': table['trailingPE'],
+        'pb': table['priceToBook'],
+        'roe': table['returnOnEquity'],
+        'payout_ratio': table['payoutRatio'],
+        'dividend_yield': dividend_yield,
+        'eps': table['trailingEps'],
+        'bvps': table['bookValue'],
+        'market_cap': table['marketCap']
+    }
+    rows = {}
+    for i, ticker in enumerate(tickers):
+        row = {c: (None if np.isnan(v[i]) else float(v[i])) for c, v in values.items()}
+        row['name'] = infos[ticker].get('shortName') or infos[ticker].get('longName')
+        row['sector'] = infos[ticker].get('sector')
+        rows[ticker] = row
+    return rows
+
+class UniverseRefreshJob:
+    """
+    全市场基本面刷新任务 (独立于 Web 请求运行):
+    1. 新浪行情列表批量更新 A 股的价格/PE/PB/市值，几十个请求覆盖全市场；
+    2. 逐只通过 provider.get_info 补齐 ROE、分红率、股息率等列，股票池文件中的代码 (港股等) 全部列都来自这一步。
+    第 2 步按 持仓 -> 自选 -> 全市场 的顺序排队，有限并发、按上游令牌桶限速；
+    每批结果落盘后写检查点，进程中断或上游熔断后再次运行会从断点继续。
+    """
+    def __init__(self, table, provider=None, nodes=None, extra_tickers=None, priority=None,
+                 checkpoint_path=None, workers=None, batch_size=None, run_at=None):
+        self.table = table
+        self.provider = provider or get_market_data_provider()
+        self.nodes = nodes or [n for n in UNIVERSE_NODES.split(',') if n]
+        self.extra_tickers = extra_tickers
+        # 返回优先刷新的代码 (持仓在前、自选在后) 的函数，例如 InvestmentMaster.tracked_tickers
+        self.priority = priority
+        self.checkpoint_path = checkpoint_path or UNIVERSE_CHECKPOINT
+        self.workers = workers or UNIVERSE_REFRESH_WORKERS
+        self.batch_size = batch_size or UNIVERSE_SAVE_EVERY
+        # 格式错误时在这里报出并关闭定时刷新，而不是让后台线程在第一次检查时退出
+        try:
+            self.run_at = parse_run_at(UNIVERSE_REFRESH_AT if run_at is None else run_at)
+        except ValueError as e:
+            print(f"UNIVERSE_REFRESH_AT 无效，定时刷新已关闭: {e}")
+            self.run_at = None
+        self.info_limiter = get_rate_limiter(UNIVERSE_INFO_UPSTREAM)
+        self.listing_limiter = get_rate_limiter('sina')
+        # 检查点和 npz 由所有 worker 共享，同一时间只允许一个进程刷新
+        self._run_lock = _RunLock(self.checkpoint_path + '.lock')
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not self.run_at or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="universe-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _due(self, now):
+        return is_due(now, self.run_at)
+
+    def _run(self):
+        last_run = None
+        while not self._stop.is_set():
+            now = market_now()
+            if last_run != now.date() and self._due(now):
+                try:
+                    # 中断 (熔断、出错) 时不记为已完成，下一轮检查从断点继续
+                    if self.run().get("status") == "finished":
+                        last_run = now.date()
+                except Exception as e:
+                    print(f"Universe refresh failed: {e}")
+            self._stop.wait(UNIVERSE_CHECK_INTERVAL)
+
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取刷新检查点失败，重新开始: {e}")
+            return None
+
+    def _save_checkpoint(self, state):
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def run(self, with_info=True, restart=False):
+        """
+        执行一次刷新，返回 {"status", "listed", "info", "failed", "remaining"}。
+        上次未完成时 (检查点存在且未结束) 跳过已完成的部分继续；restart=True 强制从头开始。
+        """
+        if not self._run_lock.acquire():
+            return {"status": "running"}
+        try:
+            return self._refresh(with_info, restart)
+        finally:
+            self._run_lock.release()
+
+    def _refresh(self, with_info, restart):
+        state = None if restart else self.load_checkpoint()
+        if state and state.get("finished_at"):
+            state = None
+        if state:
+            print(f"从检查点继续: 已完成 {len(state['done'])}/{len(state['queue'])}")
+        else:
+            state = self._start_state()
+            self._save_checkpoint(state)
+
+        listed = set(state["listed"])
+        summary = {"status": "finished", "listed": len(listed), "info": 0, "failed": 0}
+        if not with_info:
+            summary["remaining"] = 0
+            return summary
+
+        done = set(state["done"])
+        pending = [t for t in state["queue"] if t not in done]
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="universe")
+        try:
+            for start in range(0, len(pending), self.batch_size):
+                if self._stop.is_set():
+                    summary["status"] = "stopped"
+                    break
+                batch = pending[start:start + self.batch_size]
+                results = list(executor.map(self._fetch, batch))
+
+                infos = {}
+                interrupted = False
+                for ticker, (status, info) in zip(batch, results):
+                    if status == 'circuit_open':
+                        # 熔断中没有真正请求，留在队列里下次重试
+                        interrupted = True
+                        continue
+                    if status == 'ok' and info:
+                        infos[ticker] = info
+                    else:
+                        state["failed"].append(ticker)
+                    state["done"].append(ticker)
+
+                summary["info"] += _apply_infos(self.table, infos, listed)
+                self._save_checkpoint(state)
+                if interrupted:
+                    summary["status"] = "interrupted"
+                    print("上游熔断，刷新已暂停；再次运行将从检查点继续")
+                    break
+        finally:
+            executor.shutdown(wait=True)
+
+        summary["failed"] = len(state["failed"])
+        summary["remaining"] = len(state["queue"]) - len(state["done"])
+        if summary["status"] == "finished":
+            state["finished_at"] = time.time()
+            self._save_checkpoint(state)
+        return summary
+
+    def _start_state(self):
+        listed = {}
+        for node in self.nodes:
+            try:
+                listing = fetch_sina_listing(node, limiter=self.listing_limiter)
+                listed.update(listing)
+                print(f"行情列表 {node}: {len(listing)} 只")
+            except Exception as e:
+                print(f"获取行情列表 {node} 失败: {e}")
+        if listed:
+            self.table.upsert(listed, columns=LISTING_COLUMNS)
+            self.table.save()
+
+        extra_tickers = load_universe_file() if self.extra_tickers is None else self.extra_tickers
+        priority = []
+        if self.priority is not None:
+            try:
+                priority = list(self.priority())
+            except Exception as e:
+                print(f"获取持仓/自选列表失败: {e}")
+        # 持仓、自选在前，其后是全市场和股票池文件，去重保序
+        queue = list(dict.fromkeys(priority + list(listed) + list(extra_tickers)))
+        return {"started_at": time.time(), "listed": list(listed), "queue": queue, "done": [], "failed": []}
+
+    def _fetch(self, ticker):
+        self.info_limiter.acquire()
+        try:
+            return 'ok', self.provider.get_info(ticker)
+        except CircuitOpenError:
+            return 'circuit_open', None
+        except Exception as e:
+            print(f"获取 {ticker} 基本面失败: {e}")
+            return 'error', None
+
+class _RunLock:
+    """
+    非阻塞的刷新锁: 进程内用 threading.Lock，进程间用 fcntl 文件锁。
+    拿不到锁说明本进程或其他 worker 正在刷新。
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def acquire(self):
+        if not self._lock.acquire(blocking=False):
+            return False
+        if fcntl is None:
+            return True
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._lock.release()
+            return False
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
+
+def _apply_infos(table, infos, listed):
+    if not infos:
+        return 0
+    rows = info_rows(infos)
+    # A 股的名称和价格/PE/PB 以行情列表为准 (中文简称)，只用 info 补其余列
+    table.upsert({t: {**r, 'name': None} for t, r in rows.items() if t in listed}, columns=INFO_COLUMNS)
+    table.upsert({t: r for t, r in rows.items() if t not in listed})
+    table.save()
+    return len(infos)
+
+if __name__ == "__main__":
+    # python -m investment_master.universe [--listing-only] [--restart]
+    from .core import InvestmentMaster
+    master = InvestmentMaster()
+    result = master.refresh_universe(with_info='--listing-only' not in sys.argv, restart='--restart' in sys.argv)
+    print(f"股票池已更新: {result}，共 {len(master.universe)} 只")
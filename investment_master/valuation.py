@@ -1,18 +1,63 @@
-import yfinance as yf
 import random
+import numpy as np
+from . import batch_valuation, monte_carlo
+from .fundamentals import FundamentalsCache
+from .fundamentals_store import get_fundamentals_store
+from .market_data import get_market_data_provider
+from .batch_valuation import PR_UNDERVALUED, PR_OVERVALUED, PEG_UNDERVALUED, PEG_OVERVALUED
+from .memo import ModelMemo, memoize_model
+
+# _get_best_dividend_yield 读取的字段
+DIVIDEND_FIELDS = ('currentPrice', 'previousClose', 'trailingAnnualDividendRate', 'dividendYield')
+
+# 可由用户覆盖的模型假设 (默认值)
+TANG_RATIONAL_PE = 25
+TANG_YEARS = 3
+TANG_LEVERAGE_HAIRCUT = 0.7
+PB_ROE_DIVISOR = 7.0
 
 class Valuator:
-    def __init__(self):
-        pass
+    def __init__(self, fundamentals=None, provider=None):
+        if fundamentals is None:
+            provider = provider or get_market_data_provider()
+            # 回放/录制模式绕过 SQLite 缓存，否则结果取决于缓存里残留的上一次数据
+            store = get_fundamentals_store() if getattr(provider, 'cacheable', True) else None
+            fundamentals = FundamentalsCache(store=store, provider=provider)
+        self.fundamentals = fundamentals
+        self.memo = ModelMemo()
+
+    def get_info(self, ticker, info=None):
+        """
+        获取基本面快照。调用方已持有 info 时直接复用，否则从共享缓存读取。
+        """
+        if info:
+            return info
+        return self.fundamentals.get(ticker)
 
-    def get_current_price(self, ticker):
+    def value_batch(self, tickers, infos=None, models=None):
+        """
+        批量估值: 一次性对多只股票计算所有模型 (向量化)，
+        返回 {ticker: {model: {...} 或 {"error": ...}}}。
+        """
+        if infos is None:
+            infos = []
+            for ticker in tickers:
+                try:
+                    infos.append(self.get_info(ticker))
+                except Exception as e:
+                    print(f"获取 {ticker} 基本面失败: {e}")
+                    infos.append({})
+        results = batch_valuation.value_batch(infos, models)
+        return batch_valuation.to_records(tickers, results)
+
+    def get_current_price(self, ticker, info=None):
         """
         获取当前股价，如果获取失败则返回None或模拟值
         """
         try:
-            stock = yf.Ticker(ticker)
+            info = self.get_info(ticker, info)
             # 尝试获取实时价格，如果市场关闭可能是 previousClose
-            price = stock.info.get('currentPrice') or stock.info.get('previousClose')
+            price = info.get('currentPrice') or info.get('previousClose')
             if price:
                 return price
         except Exception as e:
@@ -20,13 +65,14 @@ class Valuator:
         
         return None
 
-    def calculate_pe(self, ticker):
+    @memoize_model('trailingPE', 'forwardPE', 'trailingEps', 'forwardEps', 'sector', 'priceToBook',
+                   'returnOnEquity', 'bookValue', *DIVIDEND_FIELDS)
+    def calculate_pe(self, ticker, info=None):
         """
         获取市盈率详情
         """
         try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
+            info = self.get_info(ticker, info)
             
             pe_data = {
                 "trailing_pe": info.get('trailingPE'),
@@ -44,14 +90,13 @@ class Valuator:
             pass
         return None
 
+    @memoize_model('trailingEps', 'earningsGrowth', 'revenueGrowth')
     def calculate_graham(self, ticker, info=None):
         """
         格雷厄姆成长股估值公式 (V = EPS * (8.5 + 2g))
         """
         try:
-            if not info:
-                stock = yf.Ticker(ticker)
-                info = stock.info
+            info = self.get_info(ticker, info)
             
             eps = info.get('trailingEps')
             if not eps:
@@ -88,14 +133,13 @@ class Valuator:
         except Exception as e:
             return {"error": f"Graham 计算出错: {e}"}
 
+    @memoize_model('trailingPE', 'forwardPE', 'pegRatio', 'earningsGrowth', 'revenueGrowth')
     def calculate_peg(self, ticker, info=None):
         """
         PEG 估值法 (PEG = PE / Growth)
         """
         try:
-            if not info:
-                stock = yf.Ticker(ticker)
-                info = stock.info
+            info = self.get_info(ticker, info)
                 
             pe = info.get('trailingPE')
             if not pe:
@@ -126,9 +170,9 @@ class Valuator:
                 peg = pe / growth_rate
             
             result_type = "合理"
-            if peg < 0.8:
+            if peg < PEG_UNDERVALUED:
                 result_type = "低估 (买入)"
-            elif peg > 1.5:
+            elif peg > PEG_OVERVALUED:
                 result_type = "高估 (卖出)"
                 
             return {
@@ -140,15 +184,14 @@ class Valuator:
         except Exception as e:
             return {"error": f"PEG 计算出错: {e}"}
 
+    @memoize_model('dividendRate', *DIVIDEND_FIELDS)
     def calculate_ddm(self, ticker, info=None):
         """
         股息贴现模型 (Gordon Growth Model)
         P = D1 / (r - g)
         """
         try:
-            if not info:
-                stock = yf.Ticker(ticker)
-                info = stock.info
+            info = self.get_info(ticker, info)
                 
             # 1. 获取股息
             dividend_rate = info.get('dividendRate') # 年化股息金额
@@ -187,17 +230,19 @@ class Valuator:
         except Exception as e:
             return {"error": f"DDM 计算出错: {e}"}
 
-    def calculate_tang(self, ticker, info=None):
+    @memoize_model('netIncomeToCommon', 'trailingEps', 'sharesOutstanding', 'earningsGrowth',
+                   'revenueGrowth', 'debtToEquity')
+    def calculate_tang(self, ticker, info=None, rational_pe=TANG_RATIONAL_PE, years=TANG_YEARS,
+                       leverage_haircut=TANG_LEVERAGE_HAIRCUT):
         """
         老唐估值法
         核心逻辑：三年后以 25 倍市盈率卖出能赚 100% (即翻倍) 的位置买入。
         买点 = (三年后净利润 * 合理PE) / 2
         如果是高杠杆企业，打七折。
+        合理 PE、年数和高杠杆折扣可通过参数覆盖。
         """
         try:
-            if not info:
-                stock = yf.Ticker(ticker)
-                info = stock.info
+            info = self.get_info(ticker, info)
             
             # 1. 获取当前利润 (Net Income)
             # 使用 trailingEarnings (TTM)
@@ -223,11 +268,10 @@ class Valuator:
             # 限制增长率范围，避免过于激进
             g = max(0, min(g, 0.25)) # 0% - 25%
 
-            # 3. 估算三年后净利润
-            future_profit = net_income * ((1 + g) ** 3)
+            # 3. 估算 N 年后净利润 (默认三年)
+            future_profit = net_income * ((1 + g) ** years)
             
             # 4. 合理 PE (默认为 25)
-            rational_pe = 25
             
             # 5. 三年后合理市值
             future_market_cap = future_profit * rational_pe
@@ -244,7 +288,7 @@ class Valuator:
             dte = info.get('debtToEquity')
             if dte and dte > 100:
                 is_high_leverage = True
-                buy_point_cap = buy_point_cap * 0.7
+                buy_point_cap = buy_point_cap * leverage_haircut
             
             # 8. 转换为股价
             shares = info.get('sharesOutstanding')
@@ -261,14 +305,16 @@ class Valuator:
             return {
                 "current_profit": net_income,
                 "growth_rate": g,
-                "future_profit_3y": future_profit,
+                "future_profit": future_profit,
                 "rational_pe": rational_pe,
+                "years": years,
+                "leverage_haircut": leverage_haircut,
                 "future_market_cap": future_market_cap,
                 "buy_price": round(buy_price, 2),
                 "sell_price": round(sell_price, 2),
                 "is_high_leverage": is_high_leverage,
                 "leverage_ratio": dte,
-                "formula": "买点 = (3年后利润 x 25) / 2" + (" x 0.7 (高杠杆)" if is_high_leverage else "")
+                "formula": f"买点 = ({years}年后利润 x {rational_pe:g}) / 2" + (f" x {leverage_haircut:g} (高杠杆)" if is_high_leverage else "")
             }
 
         except Exception as e:
@@ -318,14 +364,13 @@ class Valuator:
             return val / 100.0
         return val
 
-    def calculate_pb_roe(self, ticker, info=None):
+    @memoize_model('priceToBook', 'returnOnEquity', 'bookValue', 'currentPrice', 'previousClose')
+    def calculate_pb_roe(self, ticker, info=None, divisor=PB_ROE_DIVISOR):
         """
-        根据 ROE-PB 锚定法计算估值
+        根据 ROE-PB 锚定法计算估值 (合理 PB = ROE / divisor)
         """
         try:
-            if not info:
-                stock = yf.Ticker(ticker)
-                info = stock.info
+            info = self.get_info(ticker, info)
             
             current_pb = info.get('priceToBook')
             roe = info.get('returnOnEquity') # 小数，例如 0.15
@@ -336,9 +381,9 @@ class Valuator:
                 return {"error": "缺少必要数据 (ROE/BPS/Price)"}
                 
             # ROE 锚定法 (公式法: PB = ROE / 7)
-            # 使用 7 作为保守分母因子
+            # 默认使用 7 作为保守分母因子
             roe_percent = roe * 100
-            target_pb = roe_percent / 7.0
+            target_pb = roe_percent / divisor
             
             fair_value = target_pb * bps
             margin = ((fair_value - price) / fair_value) * 100
@@ -359,6 +404,7 @@ class Valuator:
                 "current_roe": roe,
                 "current_pb": current_pb,
                 "bps": bps,
+                "divisor": divisor,
                 "target_pb": round(target_pb, 2),
                 "fair_value": round(fair_value, 2),
                 "margin": round(margin, 2),
@@ -371,17 +417,17 @@ class Valuator:
         except Exception as e:
             return {"error": f"PB 计算出错: {e}"}
 
-    def calculate_pr(self, ticker, info=None):
+    @memoize_model('trailingPE', 'returnOnEquity', 'priceToBook', 'payoutRatio')
+    def calculate_pr(self, ticker, info=None, undervalued=PR_UNDERVALUED, overvalued=PR_OVERVALUED):
         """
         市赚率 (PR) 估值法 - 包含三个变种公式
         1. 标准公式: PR = PE / (ROE * 100)
         2. 修正公式 (含分红): PR = (PE * N) / (ROE * 100)
         3. PB推导公式: PR = PB / (ROE * ROE * 100)
+        PR < undervalued 为低估，PR > overvalued 为高估。
         """
         try:
-            if not info:
-                stock = yf.Ticker(ticker)
-                info = stock.info
+            info = self.get_info(ticker, info)
             
             # 1. 获取基础数据
             pe = info.get('trailingPE')
@@ -437,9 +483,9 @@ class Valuator:
             result_type = "合理/持有"
             main_pr = pr2
             
-            if main_pr < 0.6:
+            if main_pr < undervalued:
                 result_type = "严重低估 (买入)"
-            elif main_pr > 1.0:
+            elif main_pr > overvalued:
                 result_type = "高估 (卖出)"
             
             return {
@@ -452,35 +498,24 @@ class Valuator:
                 "pr_1": round(pr1, 3),
                 "pr_2": round(pr2, 3),
                 "pr_3": round(pr3, 3),
+                "thresholds": (undervalued, overvalued),
                 "result_type": result_type
             }
             
         except Exception as e:
             return {"error": f"PR 计算出错: {e}"}
 
-    def calculate_dcf(self, ticker):
+    @memoize_model('freeCashflow', 'marketCap', 'sharesOutstanding')
+    def calculate_dcf(self, ticker, info=None):
         """
         简化的 DCF 估值模型，返回详细计算步骤
         """
         try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
+            info = self.get_info(ticker, info)
             
-            # 尝试获取自由现金流
-            fcf = info.get('freeCashflow')
+            fcf = self._get_fcf(ticker, info)
             if not fcf:
-                # 尝试计算 FCF = Operating Cashflow - CapEx
-                ocf = info.get('operatingCashflow')
-                capex = info.get('capitalExpenditures') # 注意：有时候是负数，有时候是正数，yfinance通常返回负数
-                
-                # yfinance API 变动较大，如果拿不到直接数据，这里做一个模拟逻辑以便展示流程
-                # 仅用于演示：如果没有FCF，假设 FCF 为市值的 3% (粗略假设)
-                market_cap = info.get('marketCap')
-                if market_cap:
-                    fcf = market_cap * 0.03
-                    print(f"Warning: 无法直接获取 {ticker} 的 FCF，使用市值 3% 进行模拟演示: {fcf}")
-                else:
-                    return {"error": "无法获取基础财务数据 (FCF/MarketCap)"}
+                return {"error": "无法获取基础财务数据 (FCF/MarketCap)"}
 
             # 假设参数 (实际应用中应基于历史增长率预测)
             growth_rate = 0.05
@@ -543,3 +578,92 @@ class Valuator:
             
         except Exception as e:
             return {"error": f"计算过程出错: {e}"}
+
+    def calculate_dcf_monte_carlo(self, ticker, paths=monte_carlo.DEFAULT_PATHS, seed=42, info=None, **params):
+        """
+        蒙特卡洛 DCF: 对增长率、WACC、FCF 利润率抽样，返回每股价值的分位数和直方图。
+        params 可覆盖 monte_carlo.DEFAULT_PARAMS 中的分布假设。
+        """
+        try:
+            info = self.get_info(ticker, info)
+
+            fcf = self._get_fcf(ticker, info)
+            if not fcf:
+                return {"error": "无法获取基础财务数据 (FCF/MarketCap)"}
+            shares = info.get('sharesOutstanding')
+            if not shares:
+                return {"error": "缺少股本数据"}
+
+            result = monte_carlo.simulate_dcf(fcf, shares, revenue=info.get('totalRevenue'), paths=paths, seed=seed, **params)
+            current_price = self.get_current_price(ticker, info=info)
+            if current_price:
+                # 以当前价格买入时公允价值低于买入价的概率
+                result["prob_overvalued"] = round(monte_carlo.probability_below(result, current_price), 4)
+                result["margin_p50"] = round((result["percentiles"]["p50"] - current_price) / result["percentiles"]["p50"] * 100, 2) if result["percentiles"]["p50"] else None
+            result.pop("_quantiles")
+            result["current_price"] = current_price
+            return result
+        except Exception as e:
+            return {"error": f"蒙特卡洛 DCF 计算出错: {e}"}
+
+    def _get_fcf(self, ticker, info):
+        """
+        DCF 的起始自由现金流，拿不到时返回 None
+        """
+        # 尝试获取自由现金流
+        fcf = info.get('freeCashflow')
+        if not fcf:
+            # yfinance API 变动较大，如果拿不到直接数据，这里做一个模拟逻辑以便展示流程
+            # 仅用于演示：如果没有FCF，假设 FCF 为市值的 3% (粗略假设)
+            market_cap = info.get('marketCap')
+            if market_cap:
+                fcf = market_cap * 0.03
+                print(f"Warning: 无法直接获取 {ticker} 的 FCF，使用市值 3% 进行模拟演示: {fcf}")
+        return fcf or None
+
+    def calculate_dcf_sensitivity(self, ticker, waccs, growth_rates, terminal_growths, years=5, info=None):
+        """
+        DCF 敏感性矩阵: 对 WACC x 增长率 x 永续增长率的每个组合计算每股价值。
+        使用闭式解在广播数组上一次算完，fair_value[i][j][k] 对应
+        (waccs[i], growth_rates[j], terminal_growths[k])，WACC <= 永续增长率的组合为 None。
+        矩阵可达数十万格且重算很快，不进 ModelMemo。
+        """
+        try:
+            info = self.get_info(ticker, info)
+
+            fcf = self._get_fcf(ticker, info)
+            if not fcf:
+                return {"error": "无法获取基础财务数据 (FCF/MarketCap)"}
+            shares = info.get('sharesOutstanding')
+            if not shares:
+                return {"error": "缺少股本数据"}
+
+            w = np.asarray(waccs, dtype=float)
+            g = np.asarray(growth_rates, dtype=float)
+            tg = np.asarray(terminal_growths, dtype=float)
+            grid = batch_valuation.dcf_fair_value(
+                fcf, shares,
+                growth_rate=g[np.newaxis, :, np.newaxis],
+                wacc=w[:, np.newaxis, np.newaxis],
+                terminal_growth=tg[np.newaxis, np.newaxis, :],
+                years=years
+            )
+            grid = np.round(grid, 2)
+            finite = np.isfinite(grid)
+
+            return {
+                "parameters": {
+                    "initial_fcf": fcf,
+                    "shares_outstanding": shares,
+                    "years": years
+                },
+                "wacc": w.tolist(),
+                "growth_rate": g.tolist(),
+                "terminal_growth": tg.tolist(),
+                "fair_value": np.where(finite, grid, None).tolist(),
+                "min": float(grid[finite].min()) if finite.any() else None,
+                "max": float(grid[finite].max()) if finite.any() else None,
+                "current_price": self.get_current_price(ticker, info=info)
+            }
+        except Exception as e:
+            return {"error": f"DCF 敏感性计算出错: {e}"}
@@ -0,0 +1,190 @@
+import threading
+import warnings
+from datetime import date
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+TRADING_DAYS_PER_YEAR = 252
+# 滚动窗口: 名称 -> 交易日数
+BAND_WINDOWS = {
+    "3y": 3 * TRADING_DAYS_PER_YEAR,
+    "5y": 5 * TRADING_DAYS_PER_YEAR,
+    "10y": 10 * TRADING_DAYS_PER_YEAR
+}
+METRICS = ('pe', 'pb', 'pr')
+# 财报期末到数据可用之间的滞后 (天)，避免用到当时还没披露的年报 (A 股年报最晚 4 月底披露)
+REPORT_LAG_DAYS = 120
+# 窗口内有效数据点太少时不给分位
+MIN_POINTS = 60
+# 分位带序列的采样步长 (交易日)，控制返回体积和计算量
+BAND_STEP = 5
+BAND_QUANTILES = (10, 50, 90)
+
+def as_of_series(report_dates, values, dates, lag_days=REPORT_LAG_DAYS):
+    """
+    把按报告期的财报值展开成日频序列: 每天取当时最近一期已披露的值，之前为 NaN。
+    """
+    if not len(report_dates):
+        return np.full(len(dates), np.nan)
+    available = report_dates + np.timedelta64(lag_days, 'D')
+    order = np.argsort(available)
+    idx = np.searchsorted(available[order], dates, side='right') - 1
+    result = np.asarray(values, dtype=float)[order][np.clip(idx, 0, None)]
+    return np.where(idx >= 0, result, np.nan)
+
+def daily_metrics(dates, close, reported):
+    """
+    日频 PE / PB / PR: PE = 收盘价 / EPS，PB = 收盘价 / 每股净资产，PR = PE / (ROE * 100)。
+    EPS、净资产或 ROE 非正时对应指标为 NaN。
+    """
+    eps = as_of_series(reported.get('date', []), reported.get('eps', []), dates)
+    bvps = as_of_series(reported.get('date', []), reported.get('bvps', []), dates)
+    roe = as_of_series(reported.get('date', []), reported.get('roe', []), dates)
+    with np.errstate(all='ignore'):
+        pe = np.where(eps > 0, close / eps, np.nan)
+        pb = np.where(bvps > 0, close / bvps, np.nan)
+        pr = np.where(roe > 0, pe / (roe * 100), np.nan)
+    return {"pe": pe, "pb": pb, "pr": pr}
+
+def first_valid_index(series):
+    """
+    第一个有效值的位置，全为 NaN 时为 None。
+    yfinance 的年报只有最近 4 期左右，更早的日子没有 EPS/净资产，指标为 NaN。
+    """
+    valid = np.flatnonzero(~np.isnan(series))
+    return int(valid[0]) if len(valid) else None
+
+def percentile_rank(series, window):
+    """
+    最新值在最近 window 个交易日中的分位 (0-100)。
+    窗口没有被有效数据完整覆盖 (例如财报历史不足 window 对应的年数) 或有效点不足时为 None，
+    不把较短的历史当作完整窗口报告。
+    """
+    start = first_valid_index(series)
+    if start is None or len(series) - start < window:
+        return None
+    values = series[-window:]
+    current = values[-1]
+    valid = values[~np.isnan(values)]
+    if np.isnan(current) or len(valid) < MIN_POINTS:
+        return None
+    return round(float((valid <= current).mean() * 100), 1)
+
+def rolling_bands(dates, series, window, step=BAND_STEP, quantiles=BAND_QUANTILES):
+    """
+    滚动窗口分位带: 每 step 个交易日取一次过去 window 天的 quantiles 分位，
+    以及当天值在窗口中的分位。返回各序列的列表。
+    只输出被有效数据完整覆盖的窗口，当天值为 NaN (亏损等) 时分位为 None。
+    """
+    start = first_valid_index(series)
+    if len(series) < window or start is None:
+        return None
+    windows = sliding_window_view(series, window)[::-1][::step][::-1]
+    ends = np.arange(window - 1, len(series))[::-1][::step][::-1]
+    counts = np.sum(~np.isnan(windows), axis=1)
+    enough = (counts >= MIN_POINTS) & (ends - window + 1 >= start)
+
+    with np.errstate(all='ignore'), warnings.catch_warnings():
+        # 全为 NaN 的窗口 (财报还没覆盖到的年份) 会触发 "All-NaN slice" 警告
+        warnings.simplefilter('ignore', RuntimeWarning)
+        bands = np.nanpercentile(windows, quantiles, axis=1)
+        current = windows[:, -1]
+        rank = np.sum(windows <= current[:, None], axis=1) / counts * 100
+        rank = np.where(np.isnan(current), np.nan, rank)
+
+    def to_list(values):
+        values = np.where(enough & np.isfinite(values), np.round(values, 3), np.nan)
+        return [None if np.isnan(v) else float(v) for v in values]
+
+    result = {"date": [str(d) for d in dates[ends]], "value": to_list(current), "percentile": to_list(rank)}
+    for q, band in zip(quantiles, bands):
+        result[f"p{q}"] = to_list(band)
+    return result
+
+class ValuationBands:
+    """
+    历史估值分位: 用本地日线 (HistoryStore) 和历年财报计算日频 PE/PB/PR，
+    报告当前值在 3/5/10 年滚动窗口中的分位。结果按 (ticker, 当天日期) 缓存。
+    """
+    def __init__(self, history, provider):
+        self.history = history
+        self.provider = provider
+        self._lock = threading.Lock()
+        self._cache = {}  # (ticker, date) -> (dates, metrics)
+
+    def metrics(self, ticker):
+        """
+        返回 (dates, {metric: 日频数组})，同一天内只计算一次。
+        """
+        key = (ticker, date.today())
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached:
+            return cached
+
+        failed = False
+        try:
+            self.history.sync(ticker, self.provider)
+        except Exception as e:
+            print(f"同步 {ticker} 日线失败，使用本地数据: {e}")
+            failed = True
+        history = self.history.read(ticker)
+        dates = np.array(history['date'])
+        close = np.array(history['close'])
+        try:
+            reported = self.provider.get_reported_fundamentals(ticker) or {}
+        except Exception as e:
+            print(f"获取 {ticker} 财报失败: {e}")
+            reported = {}
+            failed = True
+
+        result = (dates, daily_metrics(dates, close, reported))
+        if failed:
+            # 上游出错: 不缓存，下次请求重试。上游正常但没有数据 (ETF 没有财报等) 照常缓存到当天结束
+            return result
+        with self._lock:
+            # 只保留当天的缓存
+            self._cache = {k: v for k, v in self._cache.items() if k[1] == key[1]}
+            self._cache[key] = result
+        return result
+
+    def summary(self, ticker, windows=None):
+        """
+        当前 PE/PB/PR 及其在各窗口中的历史分位。
+        coverage 给出每个指标实际可用的历史 (第一个有效日期和年数)；
+        "all" 为在全部可用历史中的分位，历史不足的窗口为 None。
+        """
+        dates, metrics = self.metrics(ticker)
+        if not len(dates):
+            return {"ticker": ticker, "error": "无历史行情数据"}
+        windows = windows or list(BAND_WINDOWS)
+        result = {"ticker": ticker, "as_of": str(dates[-1]), "current": {}, "percentiles": {}, "coverage": {}}
+        for metric in METRICS:
+            series = metrics[metric]
+            current = series[-1]
+            result["current"][metric] = None if np.isnan(current) else round(float(current), 3)
+            percentiles = {w: percentile_rank(series, BAND_WINDOWS[w]) for w in windows}
+            start = first_valid_index(series)
+            if start is None:
+                result["coverage"][metric] = None
+                percentiles["all"] = None
+            else:
+                result["coverage"][metric] = {
+                    "start": str(dates[start]),
+                    "years": round((len(series) - start) / TRADING_DAYS_PER_YEAR, 1)
+                }
+                percentiles["all"] = percentile_rank(series, len(series) - start)
+            result["percentiles"][metric] = percentiles
+        return result
+
+    def bands(self, ticker, window="3y", step=BAND_STEP):
+        """
+        单只股票的滚动分位带序列，用于画图。
+        """
+        dates, metrics = self.metrics(ticker)
+        result = self.summary(ticker)
+        if "error" in result:
+            return result
+        result["window"] = window
+        result["series"] = {m: rolling_bands(dates, metrics[m], BAND_WINDOWS[window], step) for m in METRICS}
+        return result
@@ -0,0 +1,254 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import numpy as np
+from .schedule import parse_run_at, is_due, market_now
+
+# 每日估值快照的执行时间 (HH:MM，MARKET_TIMEZONE 时区，默认北京时间，A 股收盘后)；设置为空字符串关闭
+VALUATION_SNAPSHOT_AT = os.environ.get("VALUATION_SNAPSHOT_AT", "15:30")
+# 后台线程检查是否到点的间隔 (秒)
+SNAPSHOT_CHECK_INTERVAL = 60
+# 认领当天任务的 worker 超过这个时间 (秒) 仍未完成，视为已退出，其他 worker 可以接手
+SNAPSHOT_RUN_TIMEOUT = 3600
+
+# 快照中保存的模型: 模型名 -> Valuator 方法名
+SNAPSHOT_MODELS = {
+    "pe": "calculate_pe",
+    "pb_roe": "calculate_pb_roe",
+    "pr": "calculate_pr",
+    "dcf": "calculate_dcf",
+    "graham": "calculate_graham",
+    "peg": "calculate_peg",
+    "ddm": "calculate_ddm",
+    "tang": "calculate_tang"
+}
+
+class ValuationHistoryStore:
+    """
+    每日估值快照 (SQLite, WAL)，按 (ticker, model, date) 建索引，只追加不修改:
+    同一天重复写入会被忽略，多个 worker 同时跑任务也不会产生重复数据。
+    """
+    def __init__(self, db_path='data/valuation_history.db'):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+
+    def _conn(self):
+        # sqlite3 连接不能跨线程共享，每个线程一个连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS valuation_snapshots ("
+            "ticker TEXT NOT NULL, model TEXT NOT NULL, date TEXT NOT NULL, "
+            "price REAL, data TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (ticker, model, date))"
+        )
+        # 每天一行的运行标记: 多个 worker 中只有认领成功的那个执行定时任务
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshot_runs ("
+            "date TEXT PRIMARY KEY, worker TEXT NOT NULL, started_at REAL NOT NULL, finished_at REAL)"
+        )
+
+    def claim_run(self, day, worker, timeout=SNAPSHOT_RUN_TIMEOUT):
+        """
+        认领 day 的定时任务，成功返回 True。
+        已被其他 worker 认领且未超时、或已经完成时返回 False；认领者超时未完成时由本 worker 接手。
+        """
+        now = time.time()
+        conn = self._conn()
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO snapshot_runs (date, worker, started_at) VALUES (?, ?, ?)",
+            (str(day), worker, now)
+        )
+        if cursor.rowcount:
+            return True
+        cursor = conn.execute(
+            "UPDATE snapshot_runs SET worker = ?, started_at = ? "
+            "WHERE date = ? AND finished_at IS NULL AND started_at < ?",
+            (worker, now, str(day), now - timeout)
+        )
+        return cursor.rowcount > 0
+
+    def finish_run(self, day, worker):
+        self._conn().execute(
+            "UPDATE snapshot_runs SET finished_at = ? WHERE date = ? AND worker = ?", (time.time(), str(day), worker)
+        )
+
+    def release_run(self, day, worker):
+        """
+        放弃认领 (任务出错)，下一次检查时任意 worker 都可以重新认领。
+        """
+        self._conn().execute(
+            "DELETE FROM snapshot_runs WHERE date = ? AND worker = ? AND finished_at IS NULL", (str(day), worker)
+        )
+
+    def run_finished(self, day):
+        row = self._conn().execute("SELECT finished_at FROM snapshot_runs WHERE date = ?", (str(day),)).fetchone()
+        return bool(row and row[0])
+
+    def append(self, ticker, day, price, results):
+        """
+        写入 ticker 在 day 的各模型结果 {model: dict}，返回实际新增的行数。
+        """
+        now = time.time()
+        rows = [(ticker, model, str(day), price, json.dumps(data, ensure_ascii=False, default=_json_default), now)
+                for model, data in results.items()]
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO valuation_snapshots (ticker, model, date, price, data, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            added = conn.total_changes - before
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def recorded_tickers(self, day):
+        rows = self._conn().execute(
+            "SELECT DISTINCT ticker FROM valuation_snapshots WHERE date = ?", (str(day),)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def query(self, ticker, model, start=None, end=None):
+        """
+        按日期升序返回 [{"date", "price", "data"}]。
+        """
+        sql = "SELECT date, price, data FROM valuation_snapshots WHERE ticker = ? AND model = ?"
+        params = [ticker, model]
+        if start:
+            sql += " AND date >= ?"
+            params.append(str(start))
+        if end:
+            sql += " AND date <= ?"
+            params.append(str(end))
+        sql += " ORDER BY date"
+        return [{"date": d, "price": price, "data": json.loads(data)}
+                for d, price, data in self._conn().execute(sql, params)]
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+def get_valuation_history_store():
+    """
+    VALUATION_HISTORY_PATH 指定快照文件位置；设置为空字符串关闭。
+    """
+    db_path = os.environ.get("VALUATION_HISTORY_PATH", "data/valuation_history.db")
+    if not db_path:
+        return None
+    try:
+        return ValuationHistoryStore(db_path)
+    except Exception as e:
+        print(f"Error opening valuation history {db_path}: {e}")
+        return None
+
+class DailyValuationJob:
+    """
+    每个交易日 (工作日) 到点后，对所有持仓和自选股跑一遍全部估值模型并写入快照。
+    已经写过当天快照的 ticker 会跳过，进程重启或中途失败后补跑即可。
+    每个 worker 都会启动这个任务，通过 store 中的运行标记保证每天只有一个 worker 执行。
+    """
+    def __init__(self, get_tickers, valuator, store, run_at=None):
+        self.get_tickers = get_tickers
+        self.valuator = valuator
+        self.store = store
+        try:
+            self.run_at = parse_run_at(VALUATION_SNAPSHOT_AT if run_at is None else run_at)
+        except ValueError as e:
+            print(f"VALUATION_SNAPSHOT_AT 无效，每日快照已关闭: {e}")
+            self.run_at = None
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.store is None or not self.run_at or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="valuation-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _due(self, now):
+        return is_due(now, self.run_at)
+
+    def _run(self):
+        last_run = None
+        while not self._stop.is_set():
+            now = market_now()
+            if last_run != now.date() and self._due(now):
+                try:
+                    if self.run_scheduled(now.date()):
+                        last_run = now.date()
+                except Exception as e:
+                    print(f"Daily valuation snapshot failed: {e}")
+            self._stop.wait(SNAPSHOT_CHECK_INTERVAL)
+
+    def run_scheduled(self, day):
+        """
+        定时执行: 认领成功才运行。返回当天的任务是否已经完成 (由本 worker 或其他 worker)。
+        """
+        if not self.store.claim_run(day, self.worker):
+            return self.store.run_finished(day)
+        try:
+            self.run(day)
+        except Exception:
+            self.store.release_run(day, self.worker)
+            raise
+        self.store.finish_run(day, self.worker)
+        return True
+
+    def run(self, day=None):
+        """
+        生成 day (默认今天) 的快照，返回 {"written": 新写入的 ticker 数, "skipped": 已存在的数, "failed": [...]}。
+        """
+        day = day or market_now().date()
+        done = self.store.recorded_tickers(day)
+        summary = {"date": str(day), "written": 0, "skipped": 0, "failed": []}
+        for ticker in self.get_tickers():
+            if ticker in done:
+                summary["skipped"] += 1
+                continue
+            try:
+                info = self.valuator.get_info(ticker)
+            except Exception as e:
+                print(f"Snapshot: 获取 {ticker} 基本面失败: {e}")
+                summary["failed"].append(ticker)
+                continue
+
+            results = {}
+            for model, method in SNAPSHOT_MODELS.items():
+                result = getattr(self.valuator, method)(ticker, info=info)
+                if result and "error" not in result:
+                    results[model] = result
+            if not results:
+                summary["failed"].append(ticker)
+                continue
+            price = self.valuator.get_current_price(ticker, info=info)
+            self.store.append(ticker, day, price, results)
+            summary["written"] += 1
+        print(f"Valuation snapshot {day}: {summary['written']} written, {summary['skipped']} skipped, {len(summary['failed'])} failed")
+        return summary
@@ -10,6 +10,7 @@ def main():
         print("1. 选股 (Stock Selection)")
         print("2. 估值 (Valuation)")
         print("3. 公司/行业分析 (Analysis)")
+        print("4. 刷新全市场股票池 (Refresh Universe)")
         print("q. 退出")
         
         choice = input("请输入选项: ")
@@ -20,6 +21,9 @@ def main():
             master.run_valuation()
         elif choice == '3':
             master.run_analysis()
+        elif choice == '4':
+            result = master.refresh_universe()
+            print(f"股票池刷新结果: {result}，共 {len(master.universe)} 只")
         elif choice.lower() == 'q':
             print("感谢使用，再见！")
             break
@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+# app.py 在导入时创建全局 InvestmentMaster 并启动后台任务: 测试中关闭轮询和定时任务，缓存写到临时目录
+_tmp = tempfile.mkdtemp(prefix="investment-master-tests-")
+os.environ.setdefault("QUOTE_REFRESH_INTERVAL", "0")
+os.environ.setdefault("VALUATION_SNAPSHOT_AT", "")
+os.environ.setdefault("UNIVERSE_REFRESH_AT", "")
+os.environ.setdefault("MARKET_CACHE_PATH", "")
+os.environ.setdefault("VALUATION_HISTORY_PATH", "")
+os.environ.setdefault("UNIVERSE_PATH", os.path.join(_tmp, "universe.npz"))
+os.environ.setdefault("UNIVERSE_CHECKPOINT", os.path.join(_tmp, "universe_refresh.json"))
+os.environ.setdefault("HISTORY_DIR", os.path.join(_tmp, "history"))
+
+class StaticProvider:
+    """
+    所有 ticker 都返回同一份 info 的行情源，记录 get_info 调用次数；
+    传入 error 时每次调用都抛出该异常。
+    """
+    def __init__(self, info=None, error=None):
+        self.info = info if info is not None else {}
+        self.error = error
+        self.calls = 0
+
+    def get_info(self, ticker):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return dict(self.info)
+
+class InfoProvider:
+    """
+    按 ticker 返回各自 info 和报价的行情源，未知 ticker 没有报价
+    """
+    def __init__(self, infos):
+        self.infos = infos
+
+    def get_info(self, ticker):
+        return self.infos[ticker]
+
+    def get_quotes(self, tickers):
+        return {t: {"name": t, "current_price": self.infos[t]["currentPrice"], "pre_close": None,
+                    "day_change_percent": 0} for t in tickers if t in self.infos}
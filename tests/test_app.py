@@ -0,0 +1,71 @@
+import threading
+import pytest
+import app as web
+from conftest import StaticProvider
+from investment_master.fundamentals import FundamentalsCache
+from investment_master.universe import UniverseTable
+
+@pytest.fixture
+def client():
+    return web.app.test_client()
+
+def test_quote_streams_are_capped(client):
+    for _ in range(web.STREAM_MAX_CONNECTIONS):
+        assert web._stream_slots.acquire(blocking=False)
+    try:
+        assert client.get('/api/stream/quotes?tickers=600036').status_code == 503
+    finally:
+        for _ in range(web.STREAM_MAX_CONNECTIONS):
+            web._stream_slots.release()
+
+def test_closed_stream_releases_its_slot(client):
+    response = client.get('/api/stream/quotes?tickers=600036', buffered=False)
+    assert response.status_code == 200
+    assert web._stream_slots._value == web.STREAM_MAX_CONNECTIONS - 1
+    response.close()
+    assert web._stream_slots._value == web.STREAM_MAX_CONNECTIONS
+
+@pytest.mark.parametrize("query", ["tang_pe=nan", "tang_pe=inf", "pr_low=nan", "pr_high=inf", "pb_divisor=-1"])
+def test_model_params_reject_non_finite_values(query):
+    key, value = query.split("=")
+    with pytest.raises(ValueError):
+        web.parse_model_params({key: value})
+
+def test_model_params_check_pr_thresholds():
+    assert web.parse_model_params({"pr_low": "0.5", "pr_high": "1.2"})["pr"] == {"undervalued": 0.5, "overvalued": 1.2}
+    with pytest.raises(ValueError):
+        web.parse_model_params({"pr_low": "1.5"})
+
+def test_history_answers_from_the_store_when_sync_is_slow(client, monkeypatch):
+    release = threading.Event()
+
+    class SlowProvider:
+        def get_history(self, ticker, start=None):
+            release.wait(5)
+            return {}
+
+    monkeypatch.setattr(web.master, "market_data", SlowProvider())
+    monkeypatch.setattr(web, "HISTORY_SYNC_DEADLINE", 0.05)
+    try:
+        body = client.get('/api/history/slowtest.SS').get_json()
+        assert body["syncing"] is True
+        assert body["date"] == []
+    finally:
+        release.set()
+
+@pytest.mark.parametrize("limit, count", [("-2", 0), ("-50", 0), ("0", 0), ("2", 2)])
+def test_screener_limit_is_floored_at_zero(client, monkeypatch, tmp_path, limit, count):
+    universe = UniverseTable(path=str(tmp_path / "universe.npz"))
+    universe.upsert({f"60000{i}.SS": {"pe": 10.0 + i, "roe": 0.1} for i in range(8)})
+    monkeypatch.setattr(web.master, "universe", universe)
+    response = client.get(f'/api/screener?sort=pe&limit={limit}')
+    assert response.status_code == 200
+    assert response.get_json()["count"] == count
+
+def test_analyze_fetches_a_failing_ticker_once(client, monkeypatch):
+    provider = StaticProvider(error=RuntimeError("upstream down"))
+    monkeypatch.setattr(web.master.valuator, "fundamentals", FundamentalsCache(provider=provider))
+    response = client.get('/api/analyze/BAD.XX')
+    assert response.status_code == 502
+    assert "error" in response.get_json()
+    assert provider.calls == 1
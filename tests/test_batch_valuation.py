@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from conftest import StaticProvider
+from investment_master import batch_valuation
+from investment_master.fundamentals import FundamentalsCache
+from investment_master.valuation import Valuator
+
+N = 500
+
+# 单只估值方法 -> [(批量字段, 单只结果中的取值函数)]
+SCALAR = {
+    "graham": ("calculate_graham", {
+        "growth_rate": lambda r: r["growth_rate"],
+        "intrinsic_value": lambda r: r["intrinsic_value"],
+        "intrinsic_value_adj": lambda r: r["intrinsic_value_adj"]
+    }),
+    "peg": ("calculate_peg", {
+        "pe": lambda r: r["pe"],
+        "growth_rate": lambda r: r["growth_rate"],
+        "peg": lambda r: r["peg"]
+    }),
+    "ddm": ("calculate_ddm", {
+        "dividend_rate": lambda r: r["dividend_rate"],
+        "intrinsic_value": lambda r: r["intrinsic_value"]
+    }),
+    "tang": ("calculate_tang", {
+        "current_profit": lambda r: r["current_profit"],
+        "future_profit": lambda r: r["future_profit"],
+        "buy_price": lambda r: r["buy_price"],
+        "sell_price": lambda r: r["sell_price"],
+        "is_high_leverage": lambda r: r["is_high_leverage"]
+    }),
+    "pb_roe": ("calculate_pb_roe", {
+        "target_pb": lambda r: r["target_pb"],
+        "fair_value": lambda r: r["fair_value"],
+        "margin": lambda r: r["margin"],
+        "buy_price_low": lambda r: r["buy_range_price"][0],
+        "sell_price_high": lambda r: r["sell_range_price"][1]
+    }),
+    "pr": ("calculate_pr", {
+        "n_factor": lambda r: r["n_factor"],
+        "pr_1": lambda r: r["pr_1"],
+        "pr_2": lambda r: r["pr_2"],
+        "pr_3": lambda r: r["pr_3"]
+    }),
+    "dcf": ("calculate_dcf", {
+        "initial_fcf": lambda r: r["parameters"]["initial_fcf"],
+        "fair_value_per_share": lambda r: r["result"]["fair_value_per_share"]
+    })
+}
+
+RANGES = {
+    'currentPrice': (1, 200), 'previousClose': (1, 200), 'trailingPE': (-20, 80), 'forwardPE': (1, 60),
+    'trailingEps': (-2, 10), 'earningsGrowth': (-0.5, 0.6), 'revenueGrowth': (-0.3, 0.5),
+    'pegRatio': (0.2, 4), 'priceToBook': (0.3, 10), 'returnOnEquity': (-0.2, 0.4), 'bookValue': (1, 60),
+    'payoutRatio': (0, 1), 'dividendRate': (0.1, 5), 'trailingAnnualDividendRate': (0.1, 5),
+    'dividendYield': (0.001, 8), 'netIncomeToCommon': (-1e9, 5e10), 'sharesOutstanding': (1e8, 2e10),
+    'debtToEquity': (10, 300), 'freeCashflow': (-1e9, 3e10), 'marketCap': (1e9, 1e12)
+}
+
+def _random_infos(seed, n=N):
+    # 每个字段约 20% 缺失 (None)，5% 为 0 (单只估值里按缺失处理)
+    rng = np.random.default_rng(seed)
+    infos = []
+    for _ in range(n):
+        info = {}
+        for field, (low, high) in RANGES.items():
+            roll = rng.random()
+            if roll < 0.2:
+                info[field] = None
+            elif roll < 0.25:
+                info[field] = 0
+            else:
+                info[field] = float(rng.uniform(low, high))
+        infos.append(info)
+    return infos
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_batch_matches_scalar_models(seed):
+    infos = _random_infos(seed)
+    results = batch_valuation.value_batch(infos)
+    valuator = Valuator(fundamentals=FundamentalsCache(provider=StaticProvider(error=AssertionError("parity test passes info explicitly"))))
+
+    for model, (method, fields) in SCALAR.items():
+        values, errors = results[model]["values"], results[model]["errors"]
+        for i, info in enumerate(infos):
+            scalar = getattr(valuator, method)(f"T{i}", info=info)
+            if "error" in scalar:
+                assert errors[i] != batch_valuation.ERROR_NONE, (model, i, info)
+                continue
+            assert errors[i] == batch_valuation.ERROR_NONE, (model, i, info, scalar)
+            for field, pick in fields.items():
+                # 单只结果保留 2-3 位小数
+                assert values[field][i] == pytest.approx(pick(scalar), rel=1e-6, abs=0.006), (model, field, i)
+
+def test_batch_error_codes():
+    infos = [
+        {"trailingEps": None},
+        {"trailingPE": 20.0, "earningsGrowth": -0.1},
+        {"trailingPE": 20.0, "earningsGrowth": 0.1}
+    ]
+    results = batch_valuation.value_batch(infos, models=["graham", "peg"])
+    assert results["graham"]["errors"][0] == batch_valuation.ERROR_MISSING_DATA
+    assert np.isnan(results["graham"]["values"]["intrinsic_value"][0])
+    assert list(results["peg"]["errors"]) == [
+        batch_valuation.ERROR_MISSING_DATA, batch_valuation.ERROR_NOT_APPLICABLE, batch_valuation.ERROR_NONE
+    ]
+    assert results["peg"]["values"]["peg"][2] == pytest.approx(2.0)
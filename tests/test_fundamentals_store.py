@@ -0,0 +1,71 @@
+from conftest import StaticProvider
+from investment_master.fundamentals import FundamentalsCache
+from investment_master.fundamentals_store import FundamentalsStore
+
+def _age(store, ticker, seconds):
+    store._conn().execute(
+        "UPDATE fields SET fetched_at = fetched_at - ? WHERE ticker = ?", (seconds, ticker)
+    )
+
+def test_save_quotes_refreshes_all_quote_fields(tmp_path):
+    store = FundamentalsStore(str(tmp_path / "cache.db"))
+    store.save_snapshot("600036.SS", {
+        "currentPrice": 30.0, "previousClose": 29.5, "open": 29.8, "volume": 1000,
+        "returnOnEquity": 0.15
+    })
+    _age(store, "600036.SS", 120)
+    store.save_quotes({"600036.SS": {"current_price": 31.0, "pre_close": 30.0}})
+
+    info, stale = store.load("600036.SS")
+    assert stale == set()
+    assert info["currentPrice"] == 31.0
+
+def test_save_quotes_then_load_does_not_refetch(tmp_path):
+    store = FundamentalsStore(str(tmp_path / "cache.db"))
+    provider = StaticProvider({"currentPrice": 30.0, "previousClose": 29.5, "open": 29.8, "volume": 1000})
+    cache = FundamentalsCache(store=store, provider=provider)
+    cache.get("600036.SS")
+    assert provider.calls == 1
+
+    _age(store, "600036.SS", 120)
+    store.save_quotes({"600036.SS": {"current_price": 31.0, "pre_close": 30.0}})
+    cache.invalidate()
+
+    info = cache.get("600036.SS")
+    assert provider.calls == 1
+    assert info["currentPrice"] == 31.0
+
+def test_stale_price_without_quote_refetches(tmp_path):
+    store = FundamentalsStore(str(tmp_path / "cache.db"))
+    provider = StaticProvider({"currentPrice": 100.0, "previousClose": 99.0})
+    cache = FundamentalsCache(store=store, provider=provider)
+    cache.get("AAPL")
+    _age(store, "AAPL", 120)
+    cache.invalidate()
+
+    cache.get("AAPL")
+    assert provider.calls == 2
+
+def test_field_missing_from_new_snapshot_is_dropped(tmp_path):
+    store = FundamentalsStore(str(tmp_path / "cache.db"))
+    provider = StaticProvider({"currentPrice": 30.0, "previousClose": 29.5, "trailingPE": 12.0, "bookValue": 9.0})
+    cache = FundamentalsCache(store=store, provider=provider)
+    cache.get("600036.SS")
+
+    # 亏损后上游不再返回 trailingPE
+    del provider.info["trailingPE"]
+    _age(store, "600036.SS", 2 * 24 * 3600)
+    cache.invalidate()
+    info = cache.get("600036.SS")
+    assert provider.calls == 2
+    assert "trailingPE" not in info
+
+    info, stale = store.load("600036.SS")
+    assert "trailingPE" not in info
+    assert stale == set()
+
+    # 之后的读取直接使用磁盘缓存，不再因为旧字段过期而请求上游
+    for _ in range(3):
+        cache.invalidate()
+        assert "trailingPE" not in cache.get("600036.SS")
+    assert provider.calls == 2
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from investment_master import history_store
+from investment_master.history_store import HistoryStore, COLUMNS
+from investment_master.schedule import market_now
+
+def _bars(days):
+    dates = np.array([market_now().date() - timedelta(days=d) for d in days], dtype='datetime64[D]')
+    history = {'date': dates}
+    for i, column in enumerate(COLUMNS):
+        history[column] = np.arange(len(dates), dtype=float) + i
+    return history
+
+class FakeProvider:
+    def __init__(self, history):
+        self.history = history
+        self.starts = []
+
+    def get_history(self, ticker, start=None):
+        self.starts.append(start)
+        mask = self.history['date'] >= np.datetime64(start, 'D')
+        return {k: v[mask] for k, v in self.history.items()}
+
+def test_sync_skips_todays_partial_bar(tmp_path):
+    store = HistoryStore(root=str(tmp_path))
+    provider = FakeProvider(_bars([3, 2, 1, 0]))
+    assert store.sync("600036.SS", provider) == 3
+    assert str(store.read("600036.SS")['date'][-1]) == str(market_now().date() - timedelta(days=1))
+
+    # 今天的日线要等到明天同步时才写入，当天再次同步不会请求上游
+    assert store.sync("600036.SS", provider, force=True) == 0
+    assert len(provider.starts) == 1
+
+def test_today_follows_the_market_timezone(tmp_path, monkeypatch):
+    # 服务器还在 6 月 3 日时上海已经是 6 月 4 日: 6 月 3 日的日线已收盘，可以写入
+    monkeypatch.setattr(history_store, "market_now", lambda: datetime(2024, 6, 4, 9, 0))
+    dates = np.array(['2024-06-01', '2024-06-03', '2024-06-04'], dtype='datetime64[D]')
+    provider = FakeProvider({'date': dates, **{c: np.arange(3, dtype=float) for c in COLUMNS}})
+    store = HistoryStore(root=str(tmp_path))
+    assert store.sync("600036.SS", provider) == 2
+    assert str(store.read("600036.SS")['date'][-1]) == "2024-06-03"
+
+def test_append_read_round_trip(tmp_path):
+    store = HistoryStore(root=str(tmp_path))
+    history = _bars(range(30, 10, -1))
+    assert store.append("600036.SS", history) == 20
+    data = store.read("600036.SS")
+    for column in ('date',) + COLUMNS:
+        assert np.array_equal(data[column], history[column])
+
+    # 重叠、乱序和重复的数据只追加晚于最后日期的行
+    newer = _bars([12, 5, 11, 5, 3])
+    assert store.append("600036.SS", newer) == 2
+    dates = store.read("600036.SS")['date']
+    assert len(dates) == 22
+    assert np.all(np.diff(dates.astype(int)) > 0)
+
+    start, end = str(history['date'][5]), str(history['date'][9])
+    window = store.read("600036.SS", start, end)
+    assert np.array_equal(window['close'], history['close'][5:10])
+
+    # 新实例从磁盘读到同样的数据
+    again = HistoryStore(root=str(tmp_path)).read("600036.SS")
+    assert np.array_equal(again['date'], dates)
+
+def test_uncommitted_tail_is_ignored_and_truncated(tmp_path):
+    store = HistoryStore(root=str(tmp_path))
+    store.append("600036.SS", _bars([5, 4]))
+    # 模拟上次写入中途崩溃: 列文件多出字节，但 meta 的行数没有更新
+    with open(store._column_path("600036.SS", "close"), "ab") as f:
+        f.write(np.array([123.0]).tobytes())
+    assert len(store.read("600036.SS")['close']) == 2
+    assert store.append("600036.SS", _bars([3])) == 1
+    assert store.read("600036.SS")['close'].tolist() == pytest.approx([3.0, 4.0, 3.0])
+
+def test_unknown_ticker_reads_empty(tmp_path):
+    data = HistoryStore(root=str(tmp_path)).read("NONE")
+    assert all(len(values) == 0 for values in data.values())
@@ -0,0 +1,24 @@
+import json
+import os
+from conftest import StaticProvider
+from investment_master.market_data import ReplayProvider
+from investment_master.valuation import Valuator
+
+def _record(fixture_dir, ticker, info):
+    os.makedirs(os.path.join(fixture_dir, "info"), exist_ok=True)
+    with open(os.path.join(fixture_dir, "info", ticker + ".json"), "w", encoding="utf-8") as f:
+        json.dump(info, f)
+
+def test_replay_bypasses_the_fundamentals_store(tmp_path, monkeypatch):
+    monkeypatch.setenv("MARKET_CACHE_PATH", str(tmp_path / "cache.db"))
+    assert Valuator(provider=StaticProvider({"currentPrice": 1.0})).fundamentals.store is not None
+
+    fixtures = str(tmp_path / "fixtures")
+    _record(fixtures, "600036.SS", {"currentPrice": 30.0})
+    valuator = Valuator(provider=ReplayProvider(fixtures))
+    assert valuator.fundamentals.store is None
+    assert valuator.get_info("600036.SS")["currentPrice"] == 30.0
+
+    # 录制文件更新后，新的回放实例读到的是文件内容，而不是磁盘缓存里的旧值
+    _record(fixtures, "600036.SS", {"currentPrice": 31.0})
+    assert Valuator(provider=ReplayProvider(fixtures)).get_info("600036.SS")["currentPrice"] == 31.0
@@ -0,0 +1,67 @@
+from conftest import StaticProvider
+from investment_master.fundamentals import FundamentalsCache
+from investment_master.memo import ModelMemo
+from investment_master.valuation import Valuator
+
+INFO = {
+    "currentPrice": 30.0, "previousClose": 30.0, "trailingPE": 15.0, "returnOnEquity": 0.16,
+    "priceToBook": 2.5, "payoutRatio": 0.4, "bookValue": 12.0,
+    "freeCashflow": 5e9, "marketCap": 3e10, "sharesOutstanding": 1e9
+}
+
+def _valuator(info=INFO):
+    provider = StaticProvider(info)
+    return Valuator(fundamentals=FundamentalsCache(provider=provider)), provider
+
+def test_info_can_be_passed_positionally():
+    valuator, provider = _valuator()
+    positional = valuator.calculate_pr("600036.SS", INFO)
+    keyword = valuator.calculate_pr("600036.SS", info=INFO)
+    assert "error" not in positional
+    assert keyword == positional
+    assert provider.calls == 0
+    assert valuator.memo.stats()["hits"] == 1
+
+def test_explicit_default_shares_the_cache_entry():
+    valuator, _ = _valuator()
+    first = valuator.calculate_pr("600036.SS", info=INFO)
+    second = valuator.calculate_pr("600036.SS", INFO, 0.6, 1.0)
+    assert second == first
+    assert valuator.memo.stats()["hits"] == 1
+
+def test_sensitivity_grid_is_not_memoized():
+    valuator, provider = _valuator()
+    grid = valuator.calculate_dcf_sensitivity("600036.SS", [0.08, 0.1], [0.05], [0.02], 5, INFO)
+    again = valuator.calculate_dcf_sensitivity("600036.SS", [0.08, 0.1], [0.05], [0.02], info=INFO)
+    assert "error" not in grid
+    assert again == grid
+    assert provider.calls == 0
+    assert valuator.memo.stats()["hits"] == 0
+    assert valuator.memo.stats()["misses"] == 0
+
+def test_changed_inputs_recompute():
+    valuator, _ = _valuator()
+    first = valuator.calculate_pr("600036.SS", info=INFO)
+    second = valuator.calculate_pr("600036.SS", info={**INFO, "trailingPE": 20.0})
+    assert second != first
+    assert valuator.memo.stats()["misses"] == 2
+
+def test_fetch_failure_returns_error_without_refetching():
+    valuator, provider = _valuator()
+    provider.error = RuntimeError("upstream down")
+    result = valuator.calculate_pr("600036.SS")
+    assert "error" in result
+    assert provider.calls == 1
+    assert valuator.memo.stats()["size"] == 0
+
+def test_memo_is_bounded_by_size():
+    memo = ModelMemo(maxsize=100, maxbytes=80000)
+    memo.put("large", {"fair_value": [float(i) for i in range(5000)]})
+    assert memo.get("large") == (False, None)
+    for i in range(50):
+        memo.put(i, {"fair_value": [float(j) for j in range(50)]})
+    stats = memo.stats()
+    assert 0 < stats["size"] < 50
+    assert stats["bytes"] <= stats["maxbytes"]
+    assert memo.get(49)[0]
+    assert not memo.get(0)[0]
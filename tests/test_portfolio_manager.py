@@ -0,0 +1,124 @@
+import copy
+import json
+import os
+from investment_master.portfolio_manager import PortfolioManager
+from investment_master.storage import StorageBackend
+
+class MemoryStorage(StorageBackend):
+    """
+    模拟 MongoDB 这类没有文件修改时间的存储，多个 PortfolioManager 可共享同一个实例。
+    """
+    def __init__(self, data=None):
+        self.data = copy.deepcopy(data or {})
+
+    def load(self):
+        return copy.deepcopy(self.data)
+
+    def save(self, data):
+        self.data = copy.deepcopy(data)
+
+LEGACY = {
+    "holdings": [
+        {"ticker": "600036.SS", "shares": 100, "cost_basis": 30.0},
+        {"ticker": "000001.SZ", "shares": 200, "cost": 10.0, "group_id": "g1"}
+    ],
+    "watchlist": ["601398.SS", {"ticker": "600000.SS", "name": "浦发银行"}, "601398.SS"],
+    "groups": [{"id": "default", "name": "默认分组"}, {"id": "g1", "name": "银行"}]
+}
+
+def test_migration_runs_once_at_load():
+    storage = MemoryStorage(LEGACY)
+    pm = PortfolioManager(storage=storage)
+    holdings = pm.get_holdings()
+    assert holdings[0]["group_id"] == "default"
+    assert holdings[0]["cost"] == 30.0 and "cost_basis" not in holdings[0]
+    assert pm.get_watchlist() == ["601398.SS", "600000.SS"]
+    # 迁移结果已写回存储
+    assert storage.data["watchlist"] == ["601398.SS", "600000.SS"]
+
+def test_add_to_watchlist_after_legacy_entries():
+    pm = PortfolioManager(storage=MemoryStorage(LEGACY))
+    assert pm.add_to_watchlist("600519.SS")
+    assert pm.add_to_watchlist("600519.SS")
+    assert pm.get_watchlist().count("600519.SS") == 1
+    assert pm.remove_from_watchlist("600519.SS")
+    assert "600519.SS" not in pm.get_watchlist()
+
+def test_add_holding_merges_weighted_cost():
+    pm = PortfolioManager(storage=MemoryStorage(LEGACY))
+    pm.add_holding("600036.SS", 100, 40.0, "default")
+    h = [x for x in pm.get_holdings() if x["ticker"] == "600036.SS"]
+    assert len(h) == 1
+    assert h[0]["shares"] == 200 and h[0]["cost"] == 35.0
+
+def test_move_into_group_with_same_ticker_merges():
+    pm = PortfolioManager(storage=MemoryStorage(LEGACY))
+    pm.add_holding("600036.SS", 100, 40.0, "g1")
+    assert pm.move_holding("600036", "g1")
+    rows = [x for x in pm.get_holdings() if x["ticker"] == "600036.SS"]
+    assert rows == [{"ticker": "600036.SS", "shares": 200, "cost": 35.0, "group_id": "g1",
+                     "name": None, "note": ""}]
+    assert ("600036.SS", "default") not in pm._by_key
+    assert [h["ticker"] for h in pm._by_group["g1"]] == ["000001.SZ", "600036.SS"]
+    assert "default" not in pm._by_group
+    assert len(pm._by_base["600036"]) == 1
+
+def test_move_keeps_list_position_and_indexes():
+    pm = PortfolioManager(storage=MemoryStorage(LEGACY))
+    assert pm.move_holding("600036.SS", "g1")
+    assert [h["ticker"] for h in pm.get_holdings()] == ["600036.SS", "000001.SZ"]
+    assert pm._by_key[("600036.SS", "g1")]["group_id"] == "g1"
+    assert not pm.move_holding("999999.SS", "g1")
+
+def test_remove_and_delete_group_update_indexes():
+    pm = PortfolioManager(storage=MemoryStorage(LEGACY))
+    pm.remove_holding("600036")
+    assert [h["ticker"] for h in pm.get_holdings()] == ["000001.SZ"]
+    assert "600036" not in pm._by_base
+
+    pm.delete_group("g1")
+    assert pm.get_holdings()[0]["group_id"] == "default"
+    assert ("000001.SZ", "default") in pm._by_key
+    assert "g1" not in pm._by_group
+    assert [g["id"] for g in pm.get_groups()] == ["default"]
+
+def test_holding_name_uses_the_exact_ticker():
+    pm = PortfolioManager(storage=MemoryStorage(LEGACY))
+    pm.add_holding("600036.HK", 10, 30.0, name="招商银行(港)")
+    pm.add_holding("600036.SS", 100, 40.0, "g1", name="招商银行")
+    assert pm.get_holding_name("600036.SS") == "招商银行"
+    assert pm.get_holding_name("600036.HK") == "招商银行(港)"
+    assert pm.get_holding_name("000001.SZ") is None
+    assert pm.get_holding_name("600519.SS") is None
+
+def test_load_data_returns_a_copy():
+    pm = PortfolioManager(storage=MemoryStorage(LEGACY))
+    pm.load_data()["holdings"].clear()
+    assert len(pm.get_holdings()) == 2
+
+def test_reloads_changes_from_another_process_without_file():
+    storage = MemoryStorage(LEGACY)
+    web = PortfolioManager(storage=storage)
+    cli = PortfolioManager(storage=storage)
+    cli.add_holding("600519.SS", 10, 1500.0)
+
+    # web 的下一次写入不能覆盖 cli 的修改
+    web.add_to_watchlist("000002.SZ")
+    assert "600519.SS" in [h["ticker"] for h in web.get_holdings()]
+    assert "600519.SS" in [h["ticker"] for h in storage.data["holdings"]]
+    assert "000002.SZ" in storage.data["watchlist"]
+
+def test_reloads_file_changed_on_disk(tmp_path):
+    path = str(tmp_path / "portfolio.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(LEGACY, f)
+    pm = PortfolioManager(path)
+
+    data = json.load(open(path, encoding="utf-8"))
+    data["watchlist"].append("000002.SZ")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 1))
+
+    assert "000002.SZ" in pm.get_watchlist()
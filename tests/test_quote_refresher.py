@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from conftest import InfoProvider
+from investment_master.fundamentals import FundamentalsCache
+from investment_master import quote_refresher
+from investment_master.quote_refresher import QuoteRefresher
+from investment_master.rankings import Rankings
+from investment_master.revaluation import IncrementalValuator
+from investment_master.valuation import Valuator
+
+class StubFundamentals:
+    def __init__(self, infos):
+        self.infos = infos
+
+    def peek(self, ticker):
+        return self.infos.get(ticker)
+
+class StubValuator:
+    def __init__(self, infos):
+        self.fundamentals = StubFundamentals(infos)
+
+    def get_current_price(self, ticker, info=None):
+        info = self.fundamentals.peek(ticker) or {}
+        return info.get('currentPrice')
+
+def test_fallback_quote_uses_company_name():
+    valuator = StubValuator({"AAPL": {"currentPrice": 190.0, "longName": "Apple Inc."}})
+    refresher = QuoteRefresher(lambda: ["AAPL"], valuator=valuator, provider=InfoProvider({}), interval=0)
+    quotes = refresher.refresh()
+    assert quotes["AAPL"]["name"] == "Apple Inc."
+    assert quotes["AAPL"]["current_price"] == 190.0
+
+def test_fallback_quote_without_name_is_none():
+    valuator = StubValuator({"XYZ": {"currentPrice": 5.0}})
+    refresher = QuoteRefresher(lambda: ["XYZ"], valuator=valuator, provider=InfoProvider({}), interval=0)
+    assert refresher.refresh()["XYZ"]["name"] is None
+
+def test_warm_up_puts_every_tracked_ticker_in_the_rankings():
+    infos = {
+        t: {"currentPrice": price, "previousClose": price, "trailingPE": price / 2.0, "trailingEps": 2.0,
+            "returnOnEquity": 0.15, "priceToBook": 1.5, "bookValue": price / 1.5, "payoutRatio": 0.4}
+        for t, price in (("600036.SS", 30.0), ("000001.SZ", 12.0), ("601398.SS", 6.0))
+    }
+    provider = InfoProvider(infos)
+    valuator = Valuator(fundamentals=FundamentalsCache(provider=provider))
+    rankings = Rankings()
+    refresher = QuoteRefresher(lambda: list(infos), valuator=valuator, provider=provider,
+                               revaluator=IncrementalValuator(valuator), rankings=rankings, interval=0)
+
+    # 没有预热时基本面快照都不在内存中，排行为空
+    refresher.refresh(fallback=False)
+    assert rankings.top("pr")["total"] == 0
+
+    assert refresher.warm() == 3
+    refresher.refresh(fallback=False)
+    assert rankings.top("pr")["total"] == 3
+
+def test_bases_are_rewarmed_on_a_new_market_day(monkeypatch):
+    infos = {"600036.SS": {"currentPrice": 30.0, "previousClose": 30.0, "trailingEps": 2.0, "bookValue": 12.0,
+                           "returnOnEquity": 0.15, "priceToBook": 2.5, "trailingPE": 15.0, "payoutRatio": 0.4}}
+    provider = InfoProvider(infos)
+    valuator = Valuator(fundamentals=FundamentalsCache(provider=provider, ttl=0))
+    revaluator = IncrementalValuator(valuator)
+    refresher = QuoteRefresher(lambda: list(infos), valuator=valuator, provider=provider,
+                               revaluator=revaluator, interval=0)
+    day = [datetime(2024, 6, 3, 9, 0)]
+    monkeypatch.setattr(quote_refresher, "market_now", lambda: day[0])
+
+    refresher.warm_if_due().join()
+    first = revaluator.base("600036.SS")
+    infos["600036.SS"] = {**infos["600036.SS"], "returnOnEquity": 0.2}
+    assert refresher.warm_if_due() is None
+
+    day[0] += timedelta(days=1)
+    refresher.warm_if_due().join()
+    assert revaluator.base("600036.SS") is not first
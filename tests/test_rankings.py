@@ -0,0 +1,52 @@
+import random
+from investment_master.rankings import RankingIndex, Rankings
+
+def _expected(values, descending, k):
+    present = [(t, v) for t, v in values.items() if v is not None]
+    present.sort(key=lambda item: ((-item[1] if descending else item[1]), item[0]))
+    return present[:k]
+
+def test_index_matches_full_sort_after_random_updates():
+    rng = random.Random(7)
+    for descending in (False, True):
+        index = RankingIndex(descending)
+        values = {}
+        for _ in range(2000):
+            ticker = f"T{rng.randrange(60)}"
+            value = None if rng.random() < 0.1 else round(rng.uniform(-5, 5), 2)
+            index.update(ticker, value)
+            values[ticker] = value
+        assert index.top(20) == _expected(values, descending, 20)
+        assert len(index) == sum(v is not None for v in values.values())
+        for rank, (ticker, _) in enumerate(_expected(values, descending, len(values)), start=1):
+            assert index.rank(ticker) == rank
+
+def test_unchanged_value_does_not_move():
+    index = RankingIndex()
+    assert index.update("A", 1.0)
+    assert not index.update("A", 1.0)
+    assert index.update("A", 2.0)
+    assert index.discard("A")
+    assert index.rank("A") is None
+
+def test_rankings_update_and_retain():
+    rankings = Rankings()
+    rankings.update({
+        "A": {"pr": 0.5, "dividend_yield": 0.03, "price": 10.0},
+        "B": {"pr": 0.9, "dividend_yield": 0.06, "price": 20.0},
+        "C": {"pr": None, "dividend_yield": 0.01, "price": 5.0}
+    }, names={"A": "Alpha"})
+    top = rankings.top("pr")
+    assert top["total"] == 2
+    assert [(r["ticker"], r["name"], r["rank"]) for r in top["results"]] == [("A", "Alpha", 1), ("B", "B", 2)]
+    assert [r["ticker"] for r in rankings.top("dividend_yield", 2)["results"]] == ["B", "A"]
+
+    # 新的估值输出只移动变化的 ticker
+    rankings.update({"B": {"pr": 0.2, "dividend_yield": 0.06, "price": 8.0}})
+    assert rankings.rank("B")["pr"] == 1
+    assert rankings.top("pr")["results"][0]["price"] == 8.0
+
+    rankings.retain(["A", "C"])
+    assert rankings.rank("B") == {name: None for name in rankings.metrics}
+    assert rankings.top("pr")["total"] == 1
+    assert rankings.top("unknown") is None
@@ -0,0 +1,120 @@
+import threading
+import time
+import pytest
+import requests
+from investment_master.http_client import HTTP_RETRIES, get_session
+from investment_master.market_data import YFinanceProvider
+from investment_master.resilience import CircuitBreaker, CircuitOpenError, TokenBucket, is_upstream_error
+
+def _http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+@pytest.mark.parametrize("exc, expected", [
+    (requests.ConnectionError(), True),
+    (requests.Timeout(), True),
+    (_http_error(503), True),
+    (_http_error(429), True),
+    (_http_error(404), False),
+    (KeyError('regularMarketPrice'), False),
+    (ValueError("bad symbol"), False)
+])
+def test_upstream_error_classification(exc, expected):
+    assert is_upstream_error(exc) is expected
+
+class FlakyProvider(YFinanceProvider):
+    def __init__(self, errors):
+        super().__init__()
+        self.errors = errors
+
+    def _fetch_info(self, ticker):
+        if ticker in self.errors:
+            raise self.errors[ticker]
+        return {"quoteType": "EQUITY", "currentPrice": 10.0}
+
+def test_symbol_errors_do_not_open_the_breaker():
+    bad = {f"83{i:04d}.BJ": KeyError("quoteType") for i in range(10)}
+    provider = FlakyProvider(bad)
+    for ticker in bad:
+        with pytest.raises(KeyError):
+            provider.get_info(ticker)
+        assert provider.negative_cache.is_blocked(ticker)
+    assert provider.breaker.state == CircuitBreaker.CLOSED
+    assert provider.get_info("600036.SS")["currentPrice"] == 10.0
+
+def test_upstream_errors_open_the_breaker_without_blocking_symbols():
+    tickers = [f"60{i:04d}.SS" for i in range(5)]
+    provider = FlakyProvider({t: requests.ConnectionError() for t in tickers})
+    for ticker in tickers:
+        with pytest.raises(requests.ConnectionError):
+            provider.get_info(ticker)
+        assert not provider.negative_cache.is_blocked(ticker)
+    assert provider.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        provider.get_info("600036.SS")
+
+def _fail():
+    raise requests.ConnectionError()
+
+def test_breaker_opens_after_threshold_and_recovers_through_half_open(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+    for _ in range(3):
+        with pytest.raises(requests.ConnectionError):
+            breaker.call(_fail)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "skipped")
+
+    # 半开状态只放行一个试探请求，失败后重新断开
+    now[0] += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    now[0] += 30
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_breaker_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=3)
+    for _ in range(10):
+        with pytest.raises(requests.ConnectionError):
+            breaker.call(_fail)
+        breaker.call(lambda: None)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_token_bucket_allows_a_burst_then_waits():
+    bucket = TokenBucket(rate=50, capacity=5)
+    start = time.monotonic()
+    for _ in range(5):
+        assert bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0)
+    assert bucket.acquire(timeout=1)
+    assert 0.01 < time.monotonic() - start < 1
+
+def test_token_bucket_limits_the_rate_across_threads():
+    bucket = TokenBucket(rate=100, capacity=1)
+    start = time.monotonic()
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(10)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 40 个令牌、突发 1 个: 至少需要约 0.39 秒
+    assert time.monotonic() - start >= 0.35
+
+def test_token_bucket_without_rate_never_blocks():
+    bucket = TokenBucket(rate=0)
+    assert all(bucket.acquire(timeout=0) for _ in range(1000))
+
+def test_quote_session_does_not_retry():
+    quote_adapter = get_session(retries=0).get_adapter("http://hq.sinajs.cn/list=sh600036")
+    default_adapter = get_session().get_adapter("http://hq.sinajs.cn/list=sh600036")
+    assert quote_adapter.max_retries.total == 0
+    assert default_adapter.max_retries.total == HTTP_RETRIES
+    assert get_session(retries=0) is get_session(retries=0)
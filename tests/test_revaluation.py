@@ -0,0 +1,52 @@
+import pytest
+from conftest import StaticProvider
+from investment_master.fundamentals import FundamentalsCache
+from investment_master.revaluation import IncrementalValuator
+from investment_master.valuation import Valuator
+
+SHARES = 1e9
+
+def _info(price, **extra):
+    info = {
+        "currentPrice": price, "previousClose": price, "trailingEps": 2.0, "bookValue": 12.0,
+        "returnOnEquity": 0.16, "payoutRatio": 0.4, "earningsGrowth": 0.1,
+        "trailingAnnualDividendRate": 0.8, "dividendYield": 2.5,
+        "netIncomeToCommon": 2e9, "sharesOutstanding": SHARES, "marketCap": price * SHARES,
+        "trailingPE": price / 2.0, "priceToBook": price / 12.0
+    }
+    info.update(extra)
+    return info
+
+def _margin(value, price):
+    return round((value - price) / value * 100, 2)
+
+@pytest.mark.parametrize("new_price", [20.0, 30.0, 45.0])
+def test_price_derived_fallbacks_follow_the_price(new_price):
+    valuator = Valuator(fundamentals=FundamentalsCache(provider=StaticProvider(_info(30.0))))
+    revaluator = IncrementalValuator(valuator)
+    outputs = revaluator.reprice("600036.SS", new_price, info=_info(30.0))
+
+    # 与在新价格下完整重算的结果一致
+    fresh = _info(new_price)
+    ddm = valuator.calculate_ddm("600036.SS", info=fresh)
+    dcf = valuator.calculate_dcf("600036.SS", info=fresh)
+    assert outputs["ddm_margin"] == pytest.approx(_margin(ddm["intrinsic_value"], new_price), abs=0.1)
+    assert outputs["dcf_margin"] == pytest.approx(
+        _margin(dcf["result"]["fair_value_per_share"], new_price), abs=0.1)
+
+def test_base_is_not_rebuilt_for_price_only_fields():
+    valuator = Valuator(fundamentals=FundamentalsCache(provider=StaticProvider(_info(30.0))))
+    revaluator = IncrementalValuator(valuator)
+    base = revaluator.base("600036.SS", info=_info(30.0))
+    assert revaluator.base("600036.SS", info=_info(35.0)) is base
+    assert revaluator.base("600036.SS", info=_info(30.0, dividendRate=1.5)) is not base
+
+def test_fixed_inputs_stay_fixed():
+    valuator = Valuator(fundamentals=FundamentalsCache(provider=StaticProvider(_info(30.0))))
+    revaluator = IncrementalValuator(valuator)
+    info = _info(30.0, dividendRate=1.0, freeCashflow=3e9)
+    ddm = valuator.calculate_ddm("600036.SS", info=info)
+    dcf = valuator.calculate_dcf("600036.SS", info=info)
+    outputs = revaluator.reprice("600036.SS", 40.0, info=info)
+    assert outputs["ddm_margin"] == pytest.approx(_margin(ddm["intrinsic_value"], 40.0), abs=0.1)
+    assert outputs["dcf_margin"] == pytest.approx(_margin(dcf["result"]["fair_value_per_share"], 40.0), abs=0.1)
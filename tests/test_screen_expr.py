@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from investment_master.screen_expr import ScreenError, compile_screen
+
+NUMERIC = ('pe', 'pr', 'roe', 'dividend_yield')
+TEXT = ('sector', 'symbol')
+COLUMNS = {
+    'pe': np.array([8.0, 15.0, np.nan, 30.0]),
+    'pr': np.array([0.4, 0.7, 0.5, 1.2]),
+    'roe': np.array([0.12, 0.2, 0.08, 0.25]),
+    'dividend_yield': np.array([0.05, 0.02, np.nan, 0.01]),
+    'sector': np.array(['Financial Services', 'Technology', 'Utilities', 'Technology'], dtype=object),
+    'symbol': np.array(['600036.SS', '000063.SZ', '600900.SS', '00700.HK'], dtype=object)
+}
+
+def _mask(expr):
+    return compile_screen(expr, NUMERIC, TEXT).mask(COLUMNS).tolist()
+
+@pytest.mark.parametrize("expr, expected", [
+    ("pr < 0.6 and dividend_yield > 0.04", [True, False, False, False]),
+    ("0 < pe < 20", [True, True, False, False]),
+    ("not (pe < 20) or sector == \"Utilities\"", [False, False, True, True]),
+    ("sector in [\"Technology\", \"Utilities\"] and roe * 100 >= 20", [False, True, False, True]),
+    ("symbol not in (\"00700.HK\",)", [True, True, True, False]),
+    ("pe / -1 < -10", [False, True, False, True]),
+    ("True", [True, True, True, True])
+])
+def test_whitelisted_expressions(expr, expected):
+    assert _mask(expr) == expected
+
+def test_missing_values_never_match():
+    assert _mask("pe > 0 or pe <= 0") == [True, True, False, True]
+
+@pytest.mark.parametrize("expr", [
+    "__import__('os').system('true')",
+    "pe.__class__",
+    "[c for c in pe]",
+    "lambda: 1",
+    "open('x') == 'x'",
+    "pe[0] > 1",
+    "pe ** 2 > 1",
+    "pe if pe else roe",
+    "unknown_column > 1",
+    "pe",
+    "pe + 1",
+    "sector > \"A\"",
+    "pe == \"Technology\"",
+    "sector in [1, 2]",
+    "pe in roe",
+    "pe < ",
+    "b'x' == sector"
+])
+def test_rejected_expressions(expr):
+    with pytest.raises(ScreenError):
+        compile_screen(expr, NUMERIC, TEXT)
+
+def test_compiled_once_per_expression():
+    first = compile_screen("pr < 0.6", NUMERIC, TEXT)
+    assert compile_screen("pr < 0.6", NUMERIC, TEXT) is first
+    assert first.names == frozenset({'pr'})
@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+from datetime import datetime
+from conftest import StaticProvider
+from investment_master.universe import LISTING_COLUMNS, UniverseRefreshJob, UniverseTable, _apply_infos
+
+def _job(tmp_path, **kwargs):
+    table = UniverseTable(path=str(tmp_path / "universe.npz"))
+    return UniverseRefreshJob(table, provider=StaticProvider(), nodes=[], extra_tickers=[],
+                              checkpoint_path=str(tmp_path / "refresh.json"), **kwargs)
+
+def test_invalid_refresh_time_disables_the_schedule(tmp_path):
+    job = _job(tmp_path, run_at="25:99")
+    assert job.run_at is None
+    job.start()
+    assert job._thread is None
+
+def test_refresh_time_is_parsed_once(tmp_path):
+    job = _job(tmp_path, run_at="16:05")
+    assert job.run_at == (16, 5)
+    assert job._due(datetime(2024, 6, 3, 16, 5))
+    assert not job._due(datetime(2024, 6, 3, 16, 4))
+    assert not job._due(datetime(2024, 6, 1, 18, 0))  # 周六
+
+def test_run_is_exclusive_across_processes(tmp_path):
+    job = _job(tmp_path, run_at="")
+    # 另一个进程持有检查点旁边的文件锁
+    holder = subprocess.Popen(
+        [sys.executable, "-c",
+         "import fcntl, sys, time\n"
+         f"f = open({job.checkpoint_path + '.lock'!r}, 'a')\n"
+         "fcntl.flock(f, fcntl.LOCK_EX)\n"
+         "print('locked', flush=True)\n"
+         "sys.stdin.readline()\n"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        assert job.run() == {"status": "running"}
+        assert not os.path.exists(job.checkpoint_path)
+    finally:
+        holder.communicate("\n")
+    assert job.run()["status"] == "finished"
+
+def test_info_keeps_the_listing_name_of_listed_tickers(tmp_path):
+    table = UniverseTable(path=str(tmp_path / "universe.npz"))
+    table.upsert({"600036.SS": {"name": "招商银行", "pe": 6.0}}, columns=LISTING_COLUMNS)
+    infos = {
+        "600036.SS": {"shortName": "CHINA MERCHANTS BANK", "returnOnEquity": 0.15},
+        "AAPL": {"shortName": "Apple Inc.", "trailingPE": 30.0}
+    }
+    _apply_infos(table, infos, {"600036.SS"})
+    names = dict(zip(table.tickers, table.names))
+    assert names == {"600036.SS": "招商银行", "AAPL": "Apple Inc."}
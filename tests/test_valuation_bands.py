@@ -0,0 +1,58 @@
+import numpy as np
+from investment_master.valuation_bands import (
+    BAND_WINDOWS, ValuationBands, percentile_rank, rolling_bands
+)
+
+def _dates(n):
+    return np.arange(np.datetime64('2015-01-01'), np.datetime64('2015-01-01') + n)
+
+def test_rolling_bands_nan_current_has_no_percentile():
+    series = np.linspace(10, 20, 400)
+    series[-1] = np.nan
+    bands = rolling_bands(_dates(400), series, 200, step=1)
+    assert bands["value"][-1] is None
+    assert bands["percentile"][-1] is None
+    assert bands["percentile"][-2] == 100.0
+
+def test_windows_longer_than_coverage_are_not_reported():
+    # 4 年的有效数据放在 10 年的行情后面
+    n = 10 * 252
+    series = np.full(n, np.nan)
+    series[-4 * 252:] = np.linspace(5, 15, 4 * 252)
+    assert percentile_rank(series, BAND_WINDOWS["3y"]) == 100.0
+    assert percentile_rank(series, BAND_WINDOWS["5y"]) is None
+    bands = rolling_bands(_dates(n), series, BAND_WINDOWS["5y"], step=20)
+    assert all(p is None for p in bands["percentile"])
+
+class EmptyHistory:
+    def sync(self, ticker, provider):
+        pass
+
+    def read(self, ticker):
+        return {"date": np.array([], dtype='datetime64[D]'), "close": np.array([])}
+
+class CountingProvider:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+
+    def get_reported_fundamentals(self, ticker):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return {}
+
+def test_failed_metrics_are_not_cached():
+    provider = CountingProvider(error=ConnectionError("upstream down"))
+    bands = ValuationBands(EmptyHistory(), provider)
+    assert "error" in bands.summary("600036.SS")
+    bands.summary("600036.SS")
+    assert provider.calls == 2
+
+def test_empty_metrics_are_cached_for_the_day():
+    # ETF 等没有财报的代码: 上游正常返回空数据，当天不再重复请求
+    provider = CountingProvider()
+    bands = ValuationBands(EmptyHistory(), provider)
+    assert "error" in bands.summary("510300.SS")
+    bands.summary("510300.SS")
+    assert provider.calls == 1
@@ -0,0 +1,58 @@
+from datetime import date, datetime, timezone
+from investment_master import schedule
+from investment_master.valuation_history import DailyValuationJob, ValuationHistoryStore
+
+DAY = date(2024, 6, 3)
+
+class StubValuator:
+    def __init__(self):
+        self.calls = 0
+
+    def get_info(self, ticker):
+        self.calls += 1
+        return {"currentPrice": 10.0}
+
+    def get_current_price(self, ticker, info=None):
+        return 10.0
+
+    def __getattr__(self, name):
+        return lambda ticker, info=None: {"value": 1.0}
+
+def _jobs(tmp_path, count):
+    path = str(tmp_path / "history.db")
+    jobs = []
+    for i in range(count):
+        job = DailyValuationJob(lambda: ["600036.SS"], StubValuator(), ValuationHistoryStore(path), run_at="15:30")
+        job.worker = f"worker-{i}"
+        jobs.append(job)
+    return jobs
+
+def test_only_one_worker_runs_the_daily_snapshot(tmp_path):
+    first, second = _jobs(tmp_path, 2)
+    assert first.run_scheduled(DAY)
+    assert second.run_scheduled(DAY)  # 已由 first 完成
+    assert first.valuator.calls == 1
+    assert second.valuator.calls == 0
+
+def test_stale_claim_is_taken_over(tmp_path):
+    first, second = _jobs(tmp_path, 2)
+    assert first.store.claim_run(DAY, first.worker)
+    assert not second.run_scheduled(DAY)
+    assert second.store.claim_run(DAY, second.worker, timeout=-1)
+
+def test_failed_run_releases_the_claim(tmp_path):
+    first, second = _jobs(tmp_path, 2)
+    first.run = lambda day: 1 / 0
+    try:
+        first.run_scheduled(DAY)
+    except ZeroDivisionError:
+        pass
+    assert second.run_scheduled(DAY)
+    assert second.valuator.calls == 1
+
+def test_schedule_uses_the_market_timezone():
+    # UTC 07:45 是北京时间 15:45，已过 15:30
+    now = datetime(2024, 6, 3, 7, 45, tzinfo=timezone.utc).astimezone(schedule.MARKET_TIMEZONE)
+    assert str(schedule.MARKET_TIMEZONE) == "Asia/Shanghai"
+    assert schedule.is_due(now, (15, 30))
+    assert not schedule.is_due(now, (16, 0))